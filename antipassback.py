@@ -0,0 +1,110 @@
+"""Regla anti-passback: el mismo vehículo o persona no ingresa dos veces en N minutos.
+
+Un segundo ingreso del mismo identificador poco después del primero suele
+ser una doble confirmación del guardia o una tarjeta que se pasó a otra
+persona. Al confirmar un ingreso, la pestaña Validar Entrada y la API
+consultan ``ingreso_reciente`` y piden una autorización explícita.
+
+La consulta no recorre el registro: cada proceso mantiene en memoria una
+ventana con el último ingreso de cada (tipo_registro, identificador
+canónico) de los últimos ``MINUTOS``, ordenada por llegada, y descarta por
+el frente lo que vence. Al crearse la ventana se carga desde
+idx_registro_instante (solo los ingresos de la ventana) y en cada consulta
+se agregan los ingresos que otros procesos escribieron desde la última, por
+id. Los ingresos de este proceso se anotan al registrarlos, aunque sigan en
+la cola de ingresos.
+
+``CONTROL_ACCESO_ANTIPASSBACK_MIN=0`` desactiva la regla.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import db
+import ocupacion
+
+MINUTOS = float(os.environ.get('CONTROL_ACCESO_ANTIPASSBACK_MIN', '5'))
+
+_lock = threading.Lock()
+_ventanas = {}  # ruta -> _Ventana
+
+
+class _Ventana:
+    """Último ingreso de cada identificador dentro de la ventana, del más antiguo al más reciente."""
+
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self.ultimos = OrderedDict()  # (tipo_registro, clave) -> instante
+        self.ultimo_id = 0            # último id de registro_ingresos ya visto
+        self.lock = threading.Lock()
+
+    def anotar(self, tipo_registro, clave, instante):
+        llave = (tipo_registro, clave)
+        anterior = self.ultimos.pop(llave, None)
+        self.ultimos[llave] = instante if anterior is None else max(anterior, instante)
+
+    def podar(self, ahora):
+        limite = ahora - self.segundos
+        while self.ultimos:
+            llave, instante = next(iter(self.ultimos.items()))
+            if instante >= limite:
+                break
+            del self.ultimos[llave]
+
+    def leer(self, filas):
+        for id_, tipo_registro, identificador, instante in filas:
+            if instante is not None:
+                self.anotar(tipo_registro, ocupacion.clave(tipo_registro, identificador), instante)
+            self.ultimo_id = max(self.ultimo_id, id_)
+
+    def cargar(self, conn, ahora):
+        """Llena la ventana con los ingresos de los últimos `segundos`."""
+        self.ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM registro_ingresos").fetchone()[0]
+        self.leer(conn.execute('''SELECT id, tipo_registro, identificador, instante FROM registro_ingresos
+                                  WHERE instante >= ? AND id <= ? ORDER BY instante''',
+                               (ahora - self.segundos, self.ultimo_id)).fetchall())
+
+    def actualizar(self, conn):
+        """Agrega los ingresos escritos desde la última lectura (por cualquier proceso)."""
+        self.leer(conn.execute('''SELECT id, tipo_registro, identificador, instante FROM registro_ingresos
+                                  WHERE id > ? ORDER BY id''', (self.ultimo_id,)).fetchall())
+
+
+def _ventana():
+    ruta = os.path.abspath(db.obtener_ruta())
+    ventana = _ventanas.get(ruta)
+    if ventana is None:
+        with _lock:
+            ventana = _ventanas.get(ruta)
+            if ventana is None:
+                ventana = _Ventana(int(MINUTOS * 60))
+                ventana.cargar(db.conexion(), int(time.time()))
+                _ventanas[ruta] = ventana
+    return ventana
+
+
+def ingreso_reciente(tipo_registro, identificador):
+    """Instante UTC del último ingreso del mismo vehículo o persona en los últimos MINUTOS, o None."""
+    if MINUTOS <= 0:
+        return None
+    ventana = _ventana()
+    ahora = int(time.time())
+    with ventana.lock:
+        ventana.actualizar(db.conexion())
+        ventana.podar(ahora)
+        instante = ventana.ultimos.get((tipo_registro, ocupacion.clave(tipo_registro, identificador)))
+    # Los ingresos leídos por id no llegan en orden de instante: podar() puede
+    # detenerse antes de un ingreso ya vencido que quedó detrás de uno vigente
+    return instante if instante is not None and instante >= ahora - ventana.segundos else None
+
+
+def anotar(tipo_registro, identificador, instante):
+    """Agrega un ingreso recién registrado por este proceso."""
+    if MINUTOS <= 0:
+        return
+    ventana = _ventana()
+    with ventana.lock:
+        ventana.anotar(tipo_registro, ocupacion.clave(tipo_registro, identificador), instante)
+
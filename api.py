@@ -0,0 +1,248 @@
+"""API HTTP/JSON para barreras y cámaras lectoras de patentes.
+
+Expone las mismas funciones de datos.py que usa la interfaz (búsqueda en el
+padrón, registro de ingresos, consultas de Registros) sin pasar por
+Streamlit. Es un servicio ASGI (Starlette sobre uvicorn, que ya vienen con
+Streamlit): el bucle de eventos atiende muchas conexiones a la vez y cada
+llamada a la base corre en el pool de hilos, donde db.py mantiene una
+conexión por hilo.
+
+Rutas:
+    GET  /salud
+    GET  /vehiculos/{patente}             decisión de portería para la patente
+    GET  /personas/{rut}                  decisión de portería para el RUT
+    POST /ingresos                        registra un ingreso (JSON)
+    GET  /ingresos?desde=&hasta=&limite=  ingresos entre dos fechas AAAA-MM-DD
+    GET  /ingresos/resumen?desde=&hasta=
+    POST /salidas                         registra la salida de quien está dentro (JSON)
+    GET  /presentes                       ocupación actual y visitas abiertas
+    GET  /metricas                        latencias de este proceso
+
+Si CONTROL_ACCESO_API_CLAVE está definida, cada pedido debe traerla en el
+encabezado X-API-Key.
+
+Uso:
+    python api.py --host 0.0.0.0 --port 8600
+"""
+
+import argparse
+import hmac
+import os
+import sys
+from datetime import datetime
+
+try:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Route
+except ImportError:
+    raise RuntimeError("Para la API se necesitan starlette y uvicorn (pip install starlette uvicorn)")
+
+import datos
+import db
+import metricas
+
+CLAVE_API = os.environ.get('CONTROL_ACCESO_API_CLAVE', '')
+# Máximo de ingresos por respuesta de /ingresos
+LIMITE_INGRESOS = 5000
+
+TIPOS_REGISTRO = ('VEHICULO', 'PERSONA')
+
+
+class ErrorPedido(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _error(estado, mensaje):
+    return JSONResponse({'error': mensaje}, status_code=estado)
+
+
+def _ruta(funcion, camino, metodo='GET'):
+    """Route que valida la clave, mide la latencia y traduce ErrorPedido a JSON."""
+    nombre = f"api:{metodo} {camino}"
+
+    async def punto(request):
+        if CLAVE_API and not hmac.compare_digest(request.headers.get('x-api-key', '').encode(), CLAVE_API.encode()):
+            return _error(401, "Falta la clave de la API o es incorrecta")
+        with metricas.medir(nombre):
+            try:
+                return await funcion(request)
+            except ErrorPedido as e:
+                return _error(e.estado, str(e))
+    return Route(camino, punto, methods=[metodo])
+
+
+def _decision(registro):
+    """Estado de autorización tal como lo muestra la pestaña Validar Entrada."""
+    if registro is None:
+        return "NO REGISTRADO"
+    return registro.estado_autorizacion or "AUTORIZADO"
+
+
+def _fecha(request, parametro):
+    valor = request.query_params.get(parametro, "")
+    try:
+        datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        raise ErrorPedido(400, f"'{parametro}' debe ser una fecha AAAA-MM-DD")
+    return valor
+
+# ==================== RUTAS ====================
+
+async def salud(request):
+    return JSONResponse({'estado': 'ok', 'base': db.obtener_ruta()})
+
+
+async def vehiculo(request):
+    patente = request.path_params['patente']
+    if not datos.validar_patente(patente):
+        raise ErrorPedido(400, "Formato de patente inválido")
+    encontrado = await run_in_threadpool(datos.buscar_vehiculo, patente)
+    return JSONResponse({'decision': _decision(encontrado),
+                         'vehiculo': encontrado.como_dict() if encontrado else None})
+
+
+async def persona(request):
+    rut = request.path_params['rut']
+    if not datos.validar_rut(rut):
+        raise ErrorPedido(400, "RUT inválido")
+    encontrada = await run_in_threadpool(datos.buscar_persona, rut)
+    return JSONResponse({'decision': _decision(encontrada),
+                         'persona': encontrada.como_dict() if encontrada else None})
+
+
+def _registrar(cuerpo):
+    """Aplica las mismas reglas que la interfaz y registra el ingreso."""
+    tipo = str(cuerpo.get('tipo_registro', '')).upper()
+    if tipo not in TIPOS_REGISTRO:
+        raise ErrorPedido(400, "tipo_registro debe ser VEHICULO o PERSONA")
+    guardia = cuerpo.get('guardia', '')
+    if guardia not in datos.obtener_guardias_activos():
+        raise ErrorPedido(400, f"El guardia '{guardia}' no existe o no está activo")
+
+    identificador = str(cuerpo.get('identificador', ''))
+    if tipo == 'VEHICULO':
+        registro = datos.buscar_vehiculo(identificador)
+        clave, nombre = (registro.patente, registro.propietario) if registro else (None, None)
+    else:
+        registro = datos.buscar_persona(identificador)
+        clave, nombre = (registro.rut, registro.nombre) if registro else (None, None)
+
+    decision = _decision(registro)
+    if decision == "NO REGISTRADO":
+        raise ErrorPedido(404, f"{identificador} no está registrado")
+    if decision == "NO AUTORIZADO":
+        raise ErrorPedido(403, f"{clave} no está autorizado")
+    observaciones = cuerpo.get('observaciones', '')
+    if decision == "RESTRINGIDO":
+        if not cuerpo.get('excepcional'):
+            raise ErrorPedido(409, f"{clave} está restringido: enviar excepcional=true para autorizarlo")
+        observaciones = f"RESTRINGIDO: {registro.observaciones or ''}"
+    anterior = datos.ingreso_reciente(tipo, clave)
+    if anterior is not None and not cuerpo.get('reingreso'):
+        hora = datetime.fromtimestamp(anterior, datos.CHILE_TZ).strftime('%H:%M')
+        raise ErrorPedido(409, f"{clave} ya ingresó a las {hora} (anti-passback): enviar reingreso=true para autorizarlo")
+
+    return datos.registrar_ingreso(tipo, clave, nombre, registro.depto, guardia, datos.determinar_turno(),
+                                   cuerpo.get('tipo_ingreso', ''), observaciones)
+
+
+async def crear_ingreso(request):
+    try:
+        cuerpo = await request.json()
+    except ValueError:
+        raise ErrorPedido(400, "El cuerpo debe ser JSON")
+    if not isinstance(cuerpo, dict):
+        raise ErrorPedido(400, "El cuerpo debe ser un objeto JSON")
+    ingreso = await run_in_threadpool(_registrar, cuerpo)
+    # Sin id: quedó en la cola de ingresos y se escribe en el próximo lote
+    return JSONResponse(ingreso.como_dict(), status_code=201 if ingreso.id is not None else 202)
+
+
+def _registrar_salida(cuerpo):
+    tipo = str(cuerpo.get('tipo_registro', '')).upper()
+    if tipo not in TIPOS_REGISTRO:
+        raise ErrorPedido(400, "tipo_registro debe ser VEHICULO o PERSONA")
+    guardia = cuerpo.get('guardia', '')
+    if guardia not in datos.obtener_guardias_activos():
+        raise ErrorPedido(400, f"El guardia '{guardia}' no existe o no está activo")
+    identificador = str(cuerpo.get('identificador', ''))
+    salida = datos.registrar_salida(tipo, identificador, guardia)
+    if salida is None:
+        raise ErrorPedido(404, f"{identificador} no tiene un ingreso abierto")
+    return salida
+
+
+async def crear_salida(request):
+    try:
+        cuerpo = await request.json()
+    except ValueError:
+        raise ErrorPedido(400, "El cuerpo debe ser JSON")
+    if not isinstance(cuerpo, dict):
+        raise ErrorPedido(400, "El cuerpo debe ser un objeto JSON")
+    salida = await run_in_threadpool(_registrar_salida, cuerpo)
+    return JSONResponse(salida.como_dict(), status_code=201)
+
+
+async def presentes(request):
+    visitas = await run_in_threadpool(datos.obtener_presentes)
+    vehiculos = sum(visita.tipo_registro == 'VEHICULO' for visita in visitas)
+    return JSONResponse({'VEHICULO': vehiculos, 'PERSONA': len(visitas) - vehiculos,
+                         'visitas': [visita.como_dict() for visita in visitas]})
+
+
+async def ingresos(request):
+    desde, hasta = _fecha(request, 'desde'), _fecha(request, 'hasta')
+    try:
+        limite = max(0, min(int(request.query_params.get('limite', LIMITE_INGRESOS)), LIMITE_INGRESOS))
+    except ValueError:
+        raise ErrorPedido(400, "'limite' debe ser un número")
+    registros = await run_in_threadpool(datos.obtener_registros_rango_fechas, desde, hasta, limite)
+    # to_json convierte los valores faltantes de pandas en null
+    return Response(f'{{"limite": {limite}, "ingresos": {registros.to_json(orient="records", force_ascii=False)}}}',
+                    media_type='application/json')
+
+
+async def resumen(request):
+    desde, hasta = _fecha(request, 'desde'), _fecha(request, 'hasta')
+    return JSONResponse(await run_in_threadpool(datos.resumen_registros, desde, hasta))
+
+
+async def latencias(request):
+    return JSONResponse(metricas.resumen())
+
+
+app = Starlette(routes=[
+    _ruta(salud, '/salud'),
+    _ruta(vehiculo, '/vehiculos/{patente}'),
+    _ruta(persona, '/personas/{rut}'),
+    _ruta(crear_ingreso, '/ingresos', 'POST'),
+    _ruta(ingresos, '/ingresos'),
+    _ruta(resumen, '/ingresos/resumen'),
+    _ruta(crear_salida, '/salidas', 'POST'),
+    _ruta(presentes, '/presentes'),
+    _ruta(latencias, '/metricas'),
+])
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP/JSON de portería.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--db', help="ruta de la base de datos (por defecto CONTROL_ACCESO_DB)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.configurar(args.db)
+    datos.init_db()
+    uvicorn.run(app, host=args.host, port=args.port, access_log=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,28 +1,51 @@
+import hmac
+import os
 import streamlit as st
-import pandas as pd
-import sqlite3
 from datetime import datetime, timedelta
-import re
-import pytz
-
-# Configurar zona horaria de Chile
-CHILE_TZ = pytz.timezone('America/Santiago')
-
-# Configuración de la página
-st.set_page_config(
-    page_title="Control de Acceso - Raúl Seguridad",
-    page_icon="🚗",
-    layout="wide",
-    initial_sidebar_state="expanded",  # Siempre expandido
-    menu_items={
-        'Get Help': None,
-        'Report a bug': None,
-        'About': "Control de Acceso Integral v3.0\nDesarrollado por Raúl Seguridad S.A."
-    }
+
+from datos import (
+    CHILE_TZ, init_db,
+    validar_patente, validar_rut, formatear_rut, determinar_turno,
+    agregar_guardia, obtener_guardias_activos, obtener_guardias, desactivar_guardia, reactivar_guardia,
+    agregar_persona, buscar_persona, desactivar_persona, reactivar_persona,
+    agregar_vehiculo, buscar_vehiculo, desactivar_vehiculo, reactivar_vehiculo,
+    listar_vehiculos, listar_personas, consulta_vehiculos_filtrados, consulta_personas_filtradas,
+    registrar_ingreso, ingreso_reciente, registrar_salida, obtener_presentes,
+    obtener_registros_hoy, obtener_registros_rango_fechas,
+    consulta_registros_rango, fuentes_registros, resumen_registros,
+    estadisticas_cache, invalidar_cache,
 )
+from archivado import archivar, meses_archivados
+from validacion import digito_verificador
+from exportacion import archivo_csv, archivo_parquet
+import cola_ingresos
+import metricas
+from importacion import importar
+
+metricas.iniciar_rerun()
+
+# try/finally: los reruns que terminan en st.rerun() o st.stop() también se miden
+try:
+    # Filas de registros que se muestran en pantalla para un rango; el CSV trae todas
+    MAX_FILAS_PANTALLA = 1000
+    # Cada cuánto se redibujan el reloj, el turno, la ocupación y los ingresos de hoy
+    INTERVALO_REFRESCO = "30s"
+
+    # Configuración de la página
+    st.set_page_config(
+        page_title="Control de Acceso - Raúl Seguridad",
+        page_icon="🚗",
+        layout="wide",
+        initial_sidebar_state="expanded",  # Siempre expandido
+        menu_items={
+            'Get Help': None,
+            'Report a bug': None,
+            'About': "Control de Acceso Integral v3.0\nDesarrollado por Raúl Seguridad S.A."
+        }
+    )
 
-# CSS personalizado  
-st.markdown("""
+    # CSS personalizado  
+    st.markdown("""
     <style>
     #MainMenu {visibility: hidden;}
     footer {visibility: hidden;}
@@ -55,936 +78,905 @@ st.markdown("""
     </script>
     """, unsafe_allow_html=True)
 
-# Lista de guardias iniciales
-GUARDIAS_INICIALES = [
-    "BECERRA VALDIVIA MARTHA CECILIA", "BRIZUELA MATURANA CAROLINA MAGDALENA",
-    "CARO CATILLO CAROLINA ALEJANDRA", "CASTILLO ARAYA CAMILA JAVIERA",
-    "CEBALLOS VELASQUEZ FRANCESCA PILAR", "DE LA CRUZ NUÑEZ CAROLINE",
-    "FERREIRA VARGAS LAUDENI", "LOPEZ ALCOCER MARIA NEIDY",
-    "LOPEZ LADINO LINA MARCELA", "PEREZ LOPEZ LAURA",
-    "RAMIREZ MORALES RODRIGO ALEJANDRO", "SALINAS MORA ALEJANDRA JAVIERA",
-    "BRIZUELA VERONICA", "OLAVE CATALINA"
-]
-
-# ==================== FUNCIONES DE BASE DE DATOS ====================
-
-def init_db():
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS vehiculos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, patente TEXT UNIQUE NOT NULL,
-        propietario TEXT NOT NULL, rut TEXT, depto TEXT, marca TEXT, modelo TEXT, color TEXT,
-        telefono TEXT, fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        activo INTEGER DEFAULT 1, observaciones TEXT)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS personas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, rut TEXT UNIQUE NOT NULL,
-        nombre TEXT NOT NULL, depto TEXT, telefono TEXT, tipo TEXT,
-        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        activo INTEGER DEFAULT 1, observaciones TEXT)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS guardias (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT UNIQUE NOT NULL,
-        telefono TEXT, activo INTEGER DEFAULT 1)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS registro_ingresos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT, tipo_registro TEXT NOT NULL,
-        identificador TEXT NOT NULL, nombre_persona TEXT, depto TEXT,
-        fecha_hora TEXT NOT NULL, guardia TEXT NOT NULL, turno TEXT NOT NULL,
-        tipo_ingreso TEXT, observaciones TEXT)''')
-    
-    # MIGRACIÓN: Agregar columna RUT a tabla vehiculos si no existe
-    try:
-        c.execute("SELECT rut FROM vehiculos LIMIT 1")
-    except sqlite3.OperationalError:
-        # La columna no existe, agregarla
-        c.execute("ALTER TABLE vehiculos ADD COLUMN rut TEXT")
-    
-    # MIGRACIÓN: Agregar columna estado_autorizacion a vehiculos
-    try:
-        c.execute("SELECT estado_autorizacion FROM vehiculos LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE vehiculos ADD COLUMN estado_autorizacion TEXT DEFAULT 'AUTORIZADO'")
-    
-    # MIGRACIÓN: Agregar columna estado_autorizacion a personas
-    try:
-        c.execute("SELECT estado_autorizacion FROM personas LIMIT 1")
-    except sqlite3.OperationalError:
-        c.execute("ALTER TABLE personas ADD COLUMN estado_autorizacion TEXT DEFAULT 'AUTORIZADO'")
-    
-    conn.commit()
-    conn.close()
-
-def cargar_guardias_iniciales():
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    for nombre in GUARDIAS_INICIALES:
-        try:
-            c.execute('INSERT OR IGNORE INTO guardias (nombre, telefono) VALUES (?, ?)', (nombre, ""))
-        except:
-            pass
-    conn.commit()
-    conn.close()
-
-# ==================== VALIDACIÓN ====================
-
-def validar_patente(patente):
-    patente = patente.replace("-", "").replace(" ", "").upper()
-    return any(re.match(p, patente) for p in [r'^[A-Z]{4}\d{2}$', r'^[A-Z]{2}\d{4}$', r'^[A-Z]{2}\d{2}\d{2}$'])
-
-def validar_rut(rut):
-    """Valida formato RUT chileno con dígito verificador"""
-    rut = rut.replace(".", "").replace("-", "").upper()
-    if len(rut) < 2:
-        return False
-    
-    rut_num = rut[:-1]
-    dv = rut[-1]
-    
-    if not rut_num.isdigit():
+    # ==================== INICIALIZAR ====================
+
+    init_db()
+
+    if 'vehiculo_encontrado' not in st.session_state:
+        st.session_state.vehiculo_encontrado = None
+    if 'persona_encontrada' not in st.session_state:
+        st.session_state.persona_encontrada = None
+    if 'mostrar_confirmacion_vehiculo' not in st.session_state:
+        st.session_state.mostrar_confirmacion_vehiculo = False
+    if 'mostrar_confirmacion_persona' not in st.session_state:
+        st.session_state.mostrar_confirmacion_persona = False
+
+    # ==================== PAGINACIÓN ====================
+
+    def pagina_actual(clave, firma):
+        """Página visible del listado; vuelve a la primera si cambian vista o filtros."""
+        if st.session_state.get(f"{clave}_firma") != firma:
+            st.session_state[f"{clave}_firma"] = firma
+            st.session_state[f"{clave}_pagina"] = 1
+        return st.session_state[f"{clave}_pagina"]
+
+    def ir_a_pagina(clave, pagina):
+        st.session_state[f"{clave}_pagina"] = pagina
+
+    def total_paginas(total, por_pagina):
+        return max(1, -(-total // por_pagina))
+
+    def controles_paginacion(clave, pagina, total, por_pagina):
+        paginas = total_paginas(total, por_pagina)
+        col_ant, col_info, col_sig = st.columns([1, 3, 1])
+        with col_ant:
+            st.button("◀ Anterior", key=f"{clave}_anterior", disabled=pagina <= 1,
+                      on_click=ir_a_pagina, args=(clave, pagina - 1), width="stretch")
+        with col_info:
+            st.caption(f"Página {pagina} de {paginas} · {total} resultado(s)")
+        with col_sig:
+            st.button("Siguiente ▶", key=f"{clave}_siguiente", disabled=pagina >= paginas,
+                      on_click=ir_a_pagina, args=(clave, pagina + 1), width="stretch")
+
+    # ==================== DESCARGAS ====================
+
+    # Formato -> (extensión, MIME)
+    FORMATOS_DESCARGA = {
+        "CSV": ("csv", "text/csv"),
+        "CSV (gzip)": ("csv.gz", "application/gzip"),
+        "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    }
+
+    def boton_descarga(etiqueta, consulta, nombre_base, formato="CSV", key=None, fuentes=None):
+        """Botón de descarga que genera el archivo por lotes solo al hacer clic.
+
+        `fuentes` es una función sin argumentos que entrega las conexiones a
+        recorrer (por ejemplo la base y los meses archivados).
+        """
+        sql, params = consulta
+        extension, mime = FORMATOS_DESCARGA[formato]
+
+        def generar():
+            conexiones = fuentes() if fuentes else None
+            if formato == "Parquet":
+                return archivo_parquet(sql, params, conexiones)
+            return archivo_csv(sql, params, formato == "CSV (gzip)", conexiones)
+
+        st.download_button(etiqueta, generar, f"{nombre_base}.{extension}", mime, key=key)
+
+    # ==================== IMPORTACIÓN ====================
+
+    def importador(tipo, columnas):
+        """Carga masiva desde CSV o Excel dentro de un expander."""
+        with st.expander("📤 Importar desde CSV/Excel", expanded=False):
+            st.caption(f"Columnas: {columnas}. La primera fila debe ser el encabezado.")
+            archivo = st.file_uploader("Archivo", type=["csv", "xlsx"], key=f"importar_{tipo}")
+            if archivo is not None and st.button("📥 IMPORTAR", key=f"btn_importar_{tipo}", type="primary"):
+                with st.spinner("Importando..."):
+                    resultado = importar(tipo, archivo, archivo.name)
+                if resultado.importadas:
+                    st.success(f"✅ {resultado.importadas} de {resultado.leidas} filas importadas")
+                if resultado.errores:
+                    st.error(f"❌ {len(resultado.errores)} filas con errores")
+                    st.dataframe(
+                        [{"Fila": numero, "Error": mensaje} for numero, mensaje in resultado.errores[:500]],
+                        width="stretch", hide_index=True)
+
+    # ==================== ADMINISTRACIÓN ====================
+
+    # La pestaña Administración pide esta clave; sin clave definida queda cerrada
+    CLAVE_ADMINISTRACION = os.environ.get('CONTROL_ACCESO_ADMIN_CLAVE', '')
+
+    def acceso_administracion():
+        """True si la sesión puede ver la pestaña Administración."""
+        if not CLAVE_ADMINISTRACION:
+            st.info("🔒 Administración deshabilitada: definir CONTROL_ACCESO_ADMIN_CLAVE para habilitarla")
+            return False
+        if st.session_state.get('admin_autorizado'):
+            return True
+        with st.form("clave_administracion"):
+            clave = st.text_input("Clave de administración", type="password")
+            if st.form_submit_button("🔓 Ingresar"):
+                if hmac.compare_digest(clave.encode(), CLAVE_ADMINISTRACION.encode()):
+                    st.session_state.admin_autorizado = True
+                    st.rerun()
+                st.error("❌ Clave incorrecta")
         return False
-    
-    # Calcular dígito verificador con algoritmo módulo 11
-    suma = 0
-    multiplo = 2
-    for r in reversed(rut_num):
-        suma += int(r) * multiplo
-        multiplo += 1
-        if multiplo == 8:
-            multiplo = 2
-    
-    resto = suma % 11
-    dvr = 11 - resto
-    
-    if dvr == 11:
-        dvr = '0'
-    elif dvr == 10:
-        dvr = 'K'
-    else:
-        dvr = str(dvr)
-    
-    return dv == dvr
-
-def formatear_rut(rut):
-    rut = rut.replace(".", "").replace("-", "").upper()
-    if len(rut) < 2:
-        return rut
-    rut_num, dv = rut[:-1], rut[-1]
-    rut_formateado = ""
-    for i, digito in enumerate(reversed(rut_num)):
-        if i > 0 and i % 3 == 0:
-            rut_formateado = "." + rut_formateado
-        rut_formateado = digito + rut_formateado
-    return f"{rut_formateado}-{dv}"
-
-def determinar_turno():
-    return "Día (8:00-20:00)" if 8 <= datetime.now(CHILE_TZ).hour < 20 else "Noche (20:00-8:00)"
-
-# ==================== GUARDIAS ====================
-
-def agregar_guardia(nombre, telefono=""):
-    try:
-        conn = sqlite3.connect('control_acceso.db')
-        c = conn.cursor()
-        c.execute('INSERT INTO guardias (nombre, telefono) VALUES (?, ?)', (nombre.strip().upper(), telefono.strip()))
-        conn.commit()
-        conn.close()
-        return True, f"Guardia {nombre} agregado correctamente"
-    except sqlite3.IntegrityError:
-        return False, f"El guardia {nombre} ya existe"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-
-def obtener_guardias_activos():
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT nombre FROM guardias WHERE activo = 1 ORDER BY nombre', conn)
-    conn.close()
-    return df['nombre'].tolist() if not df.empty else []
-
-def obtener_todos_guardias():
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM guardias ORDER BY activo DESC, nombre', conn)
-    conn.close()
-    return df
-
-def desactivar_guardia(guardia_id):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    c.execute('UPDATE guardias SET activo = 0 WHERE id = ?', (guardia_id,))
-    conn.commit()
-    conn.close()
-
-def reactivar_guardia(guardia_id):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    c.execute('UPDATE guardias SET activo = 1 WHERE id = ?', (guardia_id,))
-    conn.commit()
-    conn.close()
-
-# ==================== PERSONAS ====================
-
-def agregar_persona(rut, nombre, depto, telefono, tipo, estado_autorizacion="AUTORIZADO", observaciones=""):
-    try:
-        conn = sqlite3.connect('control_acceso.db')
-        c = conn.cursor()
-        fecha_registro_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d %H:%M:%S')
-        c.execute('''INSERT INTO personas (rut, nombre, depto, telefono, tipo, fecha_registro, estado_autorizacion, observaciones)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (rut.upper(), nombre.upper(), depto, telefono, tipo, fecha_registro_chile, estado_autorizacion, observaciones))
-        conn.commit()
-        conn.close()
-        return True, f"Persona {nombre} agregada correctamente"
-    except sqlite3.IntegrityError:
-        return False, f"El RUT {rut} ya está registrado"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-
-def buscar_persona(rut):
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM personas WHERE rut = ? AND activo = 1', conn, params=[rut.upper()])
-    conn.close()
-    return df
-
-def obtener_personas():
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM personas WHERE activo = 1 ORDER BY nombre', conn)
-    conn.close()
-    return df
-
-def obtener_todas_personas():
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM personas ORDER BY activo DESC, nombre', conn)
-    conn.close()
-    return df
-
-def desactivar_persona(persona_id):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    c.execute('UPDATE personas SET activo = 0 WHERE id = ?', (persona_id,))
-    conn.commit()
-    conn.close()
-
-def reactivar_persona(persona_id):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    c.execute('UPDATE personas SET activo = 1 WHERE id = ?', (persona_id,))
-    conn.commit()
-    conn.close()
-
-# ==================== VEHÍCULOS ====================
-
-def agregar_vehiculo(patente, propietario, rut="", depto="", marca="", modelo="", color="", telefono="", estado_autorizacion="AUTORIZADO", observaciones=""):
-    try:
-        conn = sqlite3.connect('control_acceso.db')
-        c = conn.cursor()
-        fecha_registro_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d %H:%M:%S')
-        c.execute('''INSERT INTO vehiculos (patente, propietario, rut, depto, marca, modelo, color, telefono, fecha_registro, estado_autorizacion, observaciones)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (patente.upper(), propietario.upper(), rut.upper(), depto, marca, modelo, color, telefono, fecha_registro_chile, estado_autorizacion, observaciones))
-        conn.commit()
-        conn.close()
-        return True, f"Vehículo {patente.upper()} agregado correctamente"
-    except sqlite3.IntegrityError:
-        return False, f"La patente {patente.upper()} ya está registrada"
-    except Exception as e:
-        return False, f"Error: {str(e)}"
-
-def buscar_vehiculo(patente):
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM vehiculos WHERE patente = ? AND activo = 1', conn, params=[patente.upper()])
-    conn.close()
-    return df
-
-def obtener_vehiculos():
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM vehiculos WHERE activo = 1 ORDER BY fecha_registro DESC', conn)
-    conn.close()
-    return df
-
-def obtener_todos_vehiculos():
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('SELECT * FROM vehiculos ORDER BY activo DESC, fecha_registro DESC', conn)
-    conn.close()
-    return df
-
-def desactivar_vehiculo(vehiculo_id):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    c.execute('UPDATE vehiculos SET activo = 0 WHERE id = ?', (vehiculo_id,))
-    conn.commit()
-    conn.close()
-
-def reactivar_vehiculo(vehiculo_id):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    c.execute('UPDATE vehiculos SET activo = 1 WHERE id = ?', (vehiculo_id,))
-    conn.commit()
-    conn.close()
-
-# ==================== REGISTROS ====================
-
-def registrar_ingreso(tipo_registro, identificador, nombre_persona, depto, guardia, turno, tipo_ingreso="", observaciones=""):
-    conn = sqlite3.connect('control_acceso.db')
-    c = conn.cursor()
-    fecha_hora_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d %H:%M:%S')
-    c.execute('''INSERT INTO registro_ingresos (tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso, observaciones)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (tipo_registro, identificador, nombre_persona, depto, fecha_hora_chile, guardia, turno, tipo_ingreso, observaciones))
-    conn.commit()
-    conn.close()
-
-def obtener_registros_hoy():
-    fecha_hoy_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d')
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('''SELECT tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso
-                              FROM registro_ingresos WHERE DATE(fecha_hora) = ? ORDER BY fecha_hora DESC''',
-                           conn, params=[fecha_hoy_chile])
-    conn.close()
-    return df
-
-def obtener_registros_rango_fechas(fecha_inicio, fecha_fin):
-    conn = sqlite3.connect('control_acceso.db')
-    df = pd.read_sql_query('''SELECT tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso
-                              FROM registro_ingresos WHERE DATE(fecha_hora) BETWEEN ? AND ? ORDER BY fecha_hora DESC''',
-                           conn, params=[fecha_inicio, fecha_fin])
-    conn.close()
-    return df
-
-# ==================== INICIALIZAR ====================
-
-init_db()
-cargar_guardias_iniciales()
-
-if 'vehiculo_encontrado' not in st.session_state:
-    st.session_state.vehiculo_encontrado = None
-if 'persona_encontrada' not in st.session_state:
-    st.session_state.persona_encontrada = None
-if 'mostrar_confirmacion_vehiculo' not in st.session_state:
-    st.session_state.mostrar_confirmacion_vehiculo = False
-if 'mostrar_confirmacion_persona' not in st.session_state:
-    st.session_state.mostrar_confirmacion_persona = False
-if 'auto_refresh' not in st.session_state:
-    st.session_state.auto_refresh = True
-if 'last_refresh_time' not in st.session_state:
-    st.session_state.last_refresh_time = datetime.now(CHILE_TZ)
-
-if st.session_state.auto_refresh:
-    tiempo_transcurrido = (datetime.now(CHILE_TZ) - st.session_state.last_refresh_time).total_seconds()
-    if tiempo_transcurrido > 30:
-        st.session_state.last_refresh_time = datetime.now(CHILE_TZ)
-        st.rerun()
-
-# ==================== INTERFAZ ====================
-
-st.markdown('<p class="big-font">🏢 Control de Acceso Integral</p>', unsafe_allow_html=True)
-st.markdown("### Sistema de Seguridad - Vehículos y Personas")
-
-# SELECTOR DE GUARDIA EN LA PÁGINA PRINCIPAL (no en sidebar)
-st.subheader("👤 Selecciona Guardia en Turno")
-
-guardias_disponibles = obtener_guardias_activos()
-
-col_guard, col_turno, col_hora = st.columns([2, 1, 1])
-
-with col_guard:
-    if guardias_disponibles:
-        # Mantener guardia seleccionado después de rerun
-        if 'guardia_actual' in st.session_state and st.session_state.guardia_actual in guardias_disponibles:
-            default_index = guardias_disponibles.index(st.session_state.guardia_actual) + 1
-        else:
-            default_index = 0
-        
-        nombre_guardia = st.selectbox(
-            "Guardia:",
-            options=[""] + guardias_disponibles,
-            index=default_index,
-            key="guardia_select_main"
-        )
-        
-        # Guardar en session_state
-        if nombre_guardia:
-            st.session_state.guardia_actual = nombre_guardia
-    else:
-        st.warning("⚠️ No hay guardias registrados")
-        nombre_guardia = st.text_input("Nombre del Guardia:", key="guardia_nombre_manual_main")
 
-with col_turno:
-    if nombre_guardia:
+    # ==================== ANTI-PASSBACK ====================
+
+    def control_antipassback(tipo_registro, identificador, key):
+        """Dentro del formulario de confirmación: retorna si el ingreso se puede registrar.
+
+        Si el mismo vehículo o persona ingresó hace poco (ver antipassback.py),
+        muestra el aviso y exige marcar la autorización de reingreso.
+        """
+        anterior = ingreso_reciente(tipo_registro, identificador)
+        if anterior is None:
+            return True
+        hora = datetime.fromtimestamp(anterior, CHILE_TZ)
+        minutos = int((datetime.now(CHILE_TZ) - hora).total_seconds() // 60)
+        st.error(f"⛔ ANTI-PASSBACK: {identificador} ya ingresó a las {hora.strftime('%H:%M')} (hace {minutos} min). "
+                 "Puede ser una doble confirmación o una tarjeta prestada.")
+        return st.checkbox("Autorizar reingreso (obligatorio para confirmar)", key=key)
+
+    # ==================== ACTUALIZACIÓN PERIÓDICA ====================
+    # Fragmentos con su propio temporizador: al vencer solo se re-ejecuta la
+    # función, no el script completo con las consultas de todas las pestañas.
+
+    @st.fragment(run_every=INTERVALO_REFRESCO)
+    def indicador_turno():
         turno_actual = determinar_turno()
         if "Día" in turno_actual:
             st.success(f"☀️ {turno_actual}")
         else:
             st.info(f"🌙 {turno_actual}")
 
-with col_hora:
-    if nombre_guardia:
-        # Placeholder para el reloj que se actualiza
-        reloj_placeholder = st.empty()
-        hora_actual = datetime.now(CHILE_TZ).strftime('%H:%M:%S')
-        fecha_actual = datetime.now(CHILE_TZ).strftime('%d/%m/%Y')
-        
-        with reloj_placeholder.container():
-            st.metric("🕐 Hora Chile", hora_actual)
-            st.caption(f"📅 {fecha_actual}")
-        
-        # Auto-refresh cada 30 segundos para actualizar el reloj
-        if 'last_refresh_time' not in st.session_state:
-            st.session_state.last_refresh_time = datetime.now(CHILE_TZ)
-        
-        tiempo_transcurrido = (datetime.now(CHILE_TZ) - st.session_state.last_refresh_time).total_seconds()
-        if tiempo_transcurrido >= 30:
-            st.session_state.last_refresh_time = datetime.now(CHILE_TZ)
-            st.rerun()
-
-if nombre_guardia:
-    st.success(f"✅ Guardia activo: **{nombre_guardia}**")
-
-st.divider()
-
-# TABS
-tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔍 Validar Entrada", "🚗 Vehículos", "👤 Personas", "👮 Guardias", "📈 Registros"])
-
-# TAB 1: VALIDAR ENTRADA
-with tab1:
-    st.header("🔍 Validación de Entrada")
-    
-    if not nombre_guardia:
-        st.warning("⚠️ Debes seleccionar un guardia para continuar")
-    else:
-        col_veh, col_per = st.columns(2)
-        
-        with col_veh:
-            st.subheader("🚗 Validar Vehículo")
-            with st.form("validar_vehiculo_form"):
-                patente_buscar = st.text_input("Patente del Vehículo", max_chars=8).upper()
-                tipo_ingreso_veh = st.selectbox("Tipo de Ingreso", ["Residente", "Visita", "Servicio"], key="tipo_veh")
-                buscar_vehiculo_btn = st.form_submit_button("🔍 BUSCAR VEHÍCULO", use_container_width=True, type="primary")
-                
-                if buscar_vehiculo_btn and patente_buscar:
-                    if not validar_patente(patente_buscar):
-                        st.error("❌ Formato de patente inválido")
+    @st.fragment(run_every=INTERVALO_REFRESCO)
+    def reloj():
+        ahora = datetime.now(CHILE_TZ)
+        st.metric("🕐 Hora Chile", ahora.strftime('%H:%M:%S'))
+        st.caption(f"📅 {ahora.strftime('%d/%m/%Y')}")
+
+    @st.fragment(run_every=INTERVALO_REFRESCO)
+    def panel_ingresos_hoy():
+        st.subheader(f"Ingresos de Hoy - {datetime.now(CHILE_TZ).strftime('%d/%m/%Y')}")
+        fecha_hoy = datetime.now(CHILE_TZ).strftime('%Y-%m-%d')
+        resumen_hoy = resumen_registros(fecha_hoy, fecha_hoy)
+
+        if resumen_hoy['total']:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Total", resumen_hoy['total'])
+            with col2:
+                st.metric("🚗 Vehículos", resumen_hoy['VEHICULO'])
+            with col3:
+                st.metric("👤 Personas", resumen_hoy['PERSONA'])
+            with col4:
+                st.metric("☀️ Turno Día", resumen_hoy['turno_dia'])
+
+            st.divider()
+            st.dataframe(obtener_registros_hoy(), width="stretch", hide_index=True)
+
+            boton_descarga("📥 Descargar CSV", consulta_registros_rango(fecha_hoy, fecha_hoy),
+                           f"registros_{datetime.now(CHILE_TZ).strftime('%Y%m%d')}", key="descargar_registros_hoy")
+        else:
+            st.info("No hay registros para hoy")
+
+    @st.fragment(run_every=INTERVALO_REFRESCO)
+    def panel_ocupacion(nombre_guardia):
+        # Visitas abiertas (tabla presentes): no recorre el registro de ingresos
+        visitas = obtener_presentes()
+        vehiculos = sum(visita.tipo_registro == "VEHICULO" for visita in visitas)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("🚗 Vehículos dentro", vehiculos)
+        with col2:
+            st.metric("👤 Personas dentro", len(visitas) - vehiculos)
+
+        with st.expander(f"🏠 Visitas abiertas ({len(visitas)})"):
+            if not visitas:
+                st.info("No hay nadie registrado dentro")
+                return
+            st.dataframe([{"Tipo": visita.tipo_registro, "Identificador": visita.identificador,
+                           "Nombre": visita.nombre_persona, "Depto": visita.depto,
+                           "Ingreso": visita.fecha_hora, "Guardia": visita.guardia} for visita in visitas],
+                         width="stretch", hide_index=True)
+            opciones = {f"{'🚗' if visita.tipo_registro == 'VEHICULO' else '👤'} {visita.identificador} - "
+                        f"{visita.nombre_persona or ''} (desde {visita.fecha_hora[:16]})": visita for visita in visitas}
+            with st.form("registrar_salida_form"):
+                elegida = st.selectbox("Registrar salida de", list(opciones))
+                if st.form_submit_button("🚪 REGISTRAR SALIDA", width="stretch"):
+                    visita = opciones[elegida]
+                    if registrar_salida(visita.tipo_registro, visita.identificador, nombre_guardia):
+                        st.toast(f"🚪 Salida de {visita.identificador} registrada")
                     else:
-                        df_vehiculo = buscar_vehiculo(patente_buscar)
-                        if not df_vehiculo.empty:
-                            st.session_state.vehiculo_encontrado = df_vehiculo.iloc[0]
-                            st.session_state.mostrar_confirmacion_vehiculo = True
-                        else:
-                            st.error("❌ VEHÍCULO NO AUTORIZADO")
-                            st.session_state.vehiculo_encontrado = None
-            
-            if st.session_state.vehiculo_encontrado is not None and st.session_state.mostrar_confirmacion_vehiculo:
-                veh = st.session_state.vehiculo_encontrado
-                
-                # Verificar estado de autorización
-                estado_aut = veh.get('estado_autorizacion', 'AUTORIZADO')
-                
-                if estado_aut == "NO AUTORIZADO":
-                    st.error("🚫 ¡ATENCIÓN! VEHÍCULO NO AUTORIZADO - NO PERMITIR INGRESO")
-                    st.write(f"**Patente:** {veh['patente']}")
-                    st.write(f"**Propietario:** {veh['propietario']}")
-                    st.write(f"**Depto:** {veh['depto']}")
-                    if veh['observaciones']:
-                        st.warning(f"**Motivo:** {veh['observaciones']}")
-                    st.info("👮 Contactar al administrador o supervisor si intenta ingresar")
-                    
-                elif estado_aut == "RESTRINGIDO":
-                    st.warning("⚠️ VEHÍCULO RESTRINGIDO - VERIFICAR ANTES DE AUTORIZAR")
-                    st.write(f"**Patente:** {veh['patente']}")
-                    st.write(f"**Propietario:** {veh['propietario']}")
-                    st.write(f"**Depto:** {veh['depto']}")
-                    if veh['marca'] or veh['modelo']:
-                        st.write(f"**Vehículo:** {veh['marca']} {veh['modelo']} ({veh['color']})")
-                    if veh['observaciones']:
-                        st.warning(f"**Restricción:** {veh['observaciones']}")
-                    
-                    with st.form("confirmar_ingreso_vehiculo"):
-                        st.write(f"**Tipo:** {tipo_ingreso_veh}")
-                        turno_veh = determinar_turno()
-                        st.caption(f"Turno: {turno_veh}")
-                        st.warning("⚠️ Confirmar solo si cumple con las restricciones indicadas")
-                        confirmar_btn = st.form_submit_button("⚠️ AUTORIZAR EXCEPCIONALMENTE", type="secondary", use_container_width=True)
-                        
-                        if confirmar_btn:
-                            registrar_ingreso("VEHICULO", veh['patente'], veh['propietario'], veh['depto'], nombre_guardia, turno_veh, tipo_ingreso_veh, f"RESTRINGIDO: {veh.get('observaciones', '')}")
-                            st.warning(f"⚠️ Ingreso EXCEPCIONAL de {veh['patente']} registrado")
-                            st.session_state.vehiculo_encontrado = None
-                            st.session_state.mostrar_confirmacion_vehiculo = False
-                            st.rerun()
-                
-                else:  # AUTORIZADO
-                    st.success("✅ VEHÍCULO AUTORIZADO")
-                    st.write(f"**Patente:** {veh['patente']}")
-                    st.write(f"**Propietario:** {veh['propietario']}")
-                    st.write(f"**Depto:** {veh['depto']}")
-                    if veh['marca'] or veh['modelo']:
-                        st.write(f"**Vehículo:** {veh['marca']} {veh['modelo']} ({veh['color']})")
-                    
-                    with st.form("confirmar_ingreso_vehiculo"):
-                        st.write(f"**Tipo:** {tipo_ingreso_veh}")
-                        turno_veh = determinar_turno()
-                        st.caption(f"Turno: {turno_veh}")
-                        confirmar_btn = st.form_submit_button("✅ CONFIRMAR INGRESO", type="primary", use_container_width=True)
-                        
-                        if confirmar_btn:
-                            registrar_ingreso("VEHICULO", veh['patente'], veh['propietario'], veh['depto'], nombre_guardia, turno_veh, tipo_ingreso_veh)
-                            st.success(f"✅ Ingreso de {veh['patente']} registrado correctamente")
-                            st.balloons()
+                        st.toast(f"{visita.identificador} ya había salido")
+                    st.rerun()
+
+    # ==================== INTERFAZ ====================
+
+    st.markdown('<p class="big-font">🏢 Control de Acceso Integral</p>', unsafe_allow_html=True)
+    st.markdown("### Sistema de Seguridad - Vehículos y Personas")
+
+    # SELECTOR DE GUARDIA EN LA PÁGINA PRINCIPAL (no en sidebar)
+    st.subheader("👤 Selecciona Guardia en Turno")
+
+    guardias_disponibles = obtener_guardias_activos()
+
+    col_guard, col_turno, col_hora = st.columns([2, 1, 1])
+
+    with col_guard:
+        if guardias_disponibles:
+            # Mantener guardia seleccionado después de rerun
+            if 'guardia_actual' in st.session_state and st.session_state.guardia_actual in guardias_disponibles:
+                default_index = guardias_disponibles.index(st.session_state.guardia_actual) + 1
+            else:
+                default_index = 0
+
+            nombre_guardia = st.selectbox(
+                "Guardia:",
+                options=[""] + guardias_disponibles,
+                index=default_index,
+                key="guardia_select_main"
+            )
+
+            # Guardar en session_state
+            if nombre_guardia:
+                st.session_state.guardia_actual = nombre_guardia
+        else:
+            st.warning("⚠️ No hay guardias registrados")
+            nombre_guardia = st.text_input("Nombre del Guardia:", key="guardia_nombre_manual_main")
+
+    with col_turno:
+        if nombre_guardia:
+            indicador_turno()
+
+    with col_hora:
+        if nombre_guardia:
+            reloj()
+
+    if nombre_guardia:
+        st.success(f"✅ Guardia activo: **{nombre_guardia}**")
+
+    st.divider()
+
+    # TABS
+    # Con on_change="rerun" cada pestaña sabe si está abierta (.open) y solo se
+    # ejecuta la vista seleccionada: confirmar un ingreso en la portería no carga
+    # los listados de las otras pestañas. El estado de la sesión no depende de la
+    # vista (guardia, vehículo o persona encontrados, páginas).
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+        ["🔍 Validar Entrada", "🚗 Vehículos", "👤 Personas", "👮 Guardias", "📈 Registros", "⚙️ Administración"],
+        key="vista", on_change="rerun")
+
+    # TAB 1: VALIDAR ENTRADA
+    if tab1.open:
+        with tab1, metricas.medir("pestaña:Validar Entrada"):
+            st.header("🔍 Validación de Entrada")
+
+            if not nombre_guardia:
+                st.warning("⚠️ Debes seleccionar un guardia para continuar")
+            else:
+                col_veh, col_per = st.columns(2)
+
+                with col_veh:
+                    st.subheader("🚗 Validar Vehículo")
+                    with st.form("validar_vehiculo_form"):
+                        patente_buscar = st.text_input("Patente del Vehículo", max_chars=8).upper()
+                        tipo_ingreso_veh = st.selectbox("Tipo de Ingreso", ["Residente", "Visita", "Servicio"], key="tipo_veh")
+                        buscar_vehiculo_btn = st.form_submit_button("🔍 BUSCAR VEHÍCULO", width="stretch", type="primary")
+
+                        if buscar_vehiculo_btn and patente_buscar:
+                            if not validar_patente(patente_buscar):
+                                st.error("❌ Formato de patente inválido")
+                            else:
+                                vehiculo = buscar_vehiculo(patente_buscar)
+                                if vehiculo is not None:
+                                    st.session_state.vehiculo_encontrado = vehiculo
+                                    st.session_state.mostrar_confirmacion_vehiculo = True
+                                else:
+                                    st.error("❌ VEHÍCULO NO AUTORIZADO")
+                                    st.session_state.vehiculo_encontrado = None
+
+                    if st.session_state.vehiculo_encontrado is not None and st.session_state.mostrar_confirmacion_vehiculo:
+                        veh = st.session_state.vehiculo_encontrado
+
+                        # Verificar estado de autorización
+                        estado_aut = veh.estado_autorizacion or 'AUTORIZADO'
+
+                        if estado_aut == "NO AUTORIZADO":
+                            st.error("🚫 ¡ATENCIÓN! VEHÍCULO NO AUTORIZADO - NO PERMITIR INGRESO")
+                            st.write(f"**Patente:** {veh.patente}")
+                            st.write(f"**Propietario:** {veh.propietario}")
+                            st.write(f"**Depto:** {veh.depto}")
+                            if veh.observaciones:
+                                st.warning(f"**Motivo:** {veh.observaciones}")
+                            st.info("👮 Contactar al administrador o supervisor si intenta ingresar")
+
+                        elif estado_aut == "RESTRINGIDO":
+                            st.warning("⚠️ VEHÍCULO RESTRINGIDO - VERIFICAR ANTES DE AUTORIZAR")
+                            st.write(f"**Patente:** {veh.patente}")
+                            st.write(f"**Propietario:** {veh.propietario}")
+                            st.write(f"**Depto:** {veh.depto}")
+                            if veh.marca or veh.modelo:
+                                st.write(f"**Vehículo:** {veh.marca} {veh.modelo} ({veh.color})")
+                            if veh.observaciones:
+                                st.warning(f"**Restricción:** {veh.observaciones}")
+
+                            with st.form("confirmar_ingreso_vehiculo"):
+                                st.write(f"**Tipo:** {tipo_ingreso_veh}")
+                                turno_veh = determinar_turno()
+                                st.caption(f"Turno: {turno_veh}")
+                                st.warning("⚠️ Confirmar solo si cumple con las restricciones indicadas")
+                                reingreso_veh = control_antipassback("VEHICULO", veh.patente, key="reingreso_veh")
+                                confirmar_btn = st.form_submit_button("⚠️ AUTORIZAR EXCEPCIONALMENTE", type="secondary", width="stretch")
+
+                                if confirmar_btn and reingreso_veh:
+                                    registrar_ingreso("VEHICULO", veh.patente, veh.propietario, veh.depto, nombre_guardia, turno_veh, tipo_ingreso_veh, f"RESTRINGIDO: {veh.observaciones or ''}")
+                                    st.warning(f"⚠️ Ingreso EXCEPCIONAL de {veh.patente} registrado")
+                                    st.session_state.vehiculo_encontrado = None
+                                    st.session_state.mostrar_confirmacion_vehiculo = False
+                                    st.rerun()
+
+                        else:  # AUTORIZADO
+                            st.success("✅ VEHÍCULO AUTORIZADO")
+                            st.write(f"**Patente:** {veh.patente}")
+                            st.write(f"**Propietario:** {veh.propietario}")
+                            st.write(f"**Depto:** {veh.depto}")
+                            if veh.marca or veh.modelo:
+                                st.write(f"**Vehículo:** {veh.marca} {veh.modelo} ({veh.color})")
+
+                            with st.form("confirmar_ingreso_vehiculo"):
+                                st.write(f"**Tipo:** {tipo_ingreso_veh}")
+                                turno_veh = determinar_turno()
+                                st.caption(f"Turno: {turno_veh}")
+                                reingreso_veh = control_antipassback("VEHICULO", veh.patente, key="reingreso_veh")
+                                confirmar_btn = st.form_submit_button("✅ CONFIRMAR INGRESO", type="primary", width="stretch")
+
+                                if confirmar_btn and reingreso_veh:
+                                    registrar_ingreso("VEHICULO", veh.patente, veh.propietario, veh.depto, nombre_guardia, turno_veh, tipo_ingreso_veh)
+                                    st.success(f"✅ Ingreso de {veh.patente} registrado correctamente")
+                                    st.balloons()
+                                    st.session_state.vehiculo_encontrado = None
+                                    st.session_state.mostrar_confirmacion_vehiculo = False
+                                    st.rerun()
+
+                        if st.button("🔄 NUEVA BÚSQUEDA", key="nueva_busqueda_veh"):
                             st.session_state.vehiculo_encontrado = None
                             st.session_state.mostrar_confirmacion_vehiculo = False
                             st.rerun()
-                
-                if st.button("🔄 NUEVA BÚSQUEDA", key="nueva_busqueda_veh"):
-                    st.session_state.vehiculo_encontrado = None
-                    st.session_state.mostrar_confirmacion_vehiculo = False
-                    st.rerun()
-        
-        with col_per:
-            st.subheader("👤 Validar Persona")
-            with st.form("validar_persona_form"):
-                rut_buscar = st.text_input("RUT (sin puntos, con guión)", max_chars=12, placeholder="12345678-9").upper()
-                tipo_ingreso_per = st.selectbox("Tipo de Ingreso", ["Residente", "Visita", "Servicio", "Delivery"], key="tipo_per")
-                buscar_persona_btn = st.form_submit_button("🔍 BUSCAR PERSONA", use_container_width=True, type="primary")
-                
-                if buscar_persona_btn and rut_buscar:
-                    if not validar_rut(rut_buscar):
-                        st.error("❌ RUT inválido")
-                    else:
-                        df_persona = buscar_persona(rut_buscar)
-                        if not df_persona.empty:
-                            st.session_state.persona_encontrada = df_persona.iloc[0]
-                            st.session_state.mostrar_confirmacion_persona = True
-                        else:
-                            st.error("❌ PERSONA NO AUTORIZADA")
-                            st.session_state.persona_encontrada = None
-            
-            if st.session_state.persona_encontrada is not None and st.session_state.mostrar_confirmacion_persona:
-                per = st.session_state.persona_encontrada
-                
-                # Verificar estado de autorización
-                estado_aut = per.get('estado_autorizacion', 'AUTORIZADO')
-                
-                if estado_aut == "NO AUTORIZADO":
-                    st.error("🚫 ¡ATENCIÓN! PERSONA NO AUTORIZADA - NO PERMITIR INGRESO")
-                    st.write(f"**RUT:** {formatear_rut(per['rut'])}")
-                    st.write(f"**Nombre:** {per['nombre']}")
-                    st.write(f"**Depto:** {per['depto']}")
-                    st.write(f"**Tipo:** {per['tipo']}")
-                    if per['observaciones']:
-                        st.warning(f"**Motivo:** {per['observaciones']}")
-                    st.info("👮 Contactar al administrador o supervisor si intenta ingresar")
-                    
-                elif estado_aut == "RESTRINGIDO":
-                    st.warning("⚠️ PERSONA RESTRINGIDA - VERIFICAR ANTES DE AUTORIZAR")
-                    st.write(f"**RUT:** {formatear_rut(per['rut'])}")
-                    st.write(f"**Nombre:** {per['nombre']}")
-                    st.write(f"**Depto:** {per['depto']}")
-                    st.write(f"**Tipo:** {per['tipo']}")
-                    if per['observaciones']:
-                        st.warning(f"**Restricción:** {per['observaciones']}")
-                    
-                    with st.form("confirmar_ingreso_persona"):
-                        st.write(f"**Tipo Ingreso:** {tipo_ingreso_per}")
-                        turno_per = determinar_turno()
-                        st.caption(f"Turno: {turno_per}")
-                        st.warning("⚠️ Confirmar solo si cumple con las restricciones indicadas")
-                        confirmar_btn_per = st.form_submit_button("⚠️ AUTORIZAR EXCEPCIONALMENTE", type="secondary", use_container_width=True)
-                        
-                        if confirmar_btn_per:
-                            registrar_ingreso("PERSONA", per['rut'], per['nombre'], per['depto'], nombre_guardia, turno_per, tipo_ingreso_per, f"RESTRINGIDO: {per.get('observaciones', '')}")
-                            st.warning(f"⚠️ Ingreso EXCEPCIONAL de {per['nombre']} registrado")
-                            st.session_state.persona_encontrada = None
-                            st.session_state.mostrar_confirmacion_persona = False
-                            st.rerun()
-                
-                else:  # AUTORIZADO
-                    st.success("✅ PERSONA AUTORIZADA")
-                    st.write(f"**RUT:** {formatear_rut(per['rut'])}")
-                    st.write(f"**Nombre:** {per['nombre']}")
-                    st.write(f"**Depto:** {per['depto']}")
-                    st.write(f"**Tipo:** {per['tipo']}")
-                    
-                    with st.form("confirmar_ingreso_persona"):
-                        st.write(f"**Tipo Ingreso:** {tipo_ingreso_per}")
-                        turno_per = determinar_turno()
-                        st.caption(f"Turno: {turno_per}")
-                        confirmar_btn_per = st.form_submit_button("✅ CONFIRMAR INGRESO", type="primary", use_container_width=True)
-                        
-                        if confirmar_btn_per:
-                            registrar_ingreso("PERSONA", per['rut'], per['nombre'], per['depto'], nombre_guardia, turno_per, tipo_ingreso_per)
-                            st.success(f"✅ Ingreso de {per['nombre']} registrado correctamente")
-                            st.balloons()
+
+                    # Desde que el guardia presiona BUSCAR hasta que la decisión está dibujada
+                    if buscar_vehiculo_btn:
+                        metricas.registrar_desde_rerun("portería:decisión vehículo")
+
+                with col_per:
+                    st.subheader("👤 Validar Persona")
+                    with st.form("validar_persona_form"):
+                        rut_buscar = st.text_input("RUT (sin puntos, con guión)", max_chars=12, placeholder="12345678-9").upper()
+                        tipo_ingreso_per = st.selectbox("Tipo de Ingreso", ["Residente", "Visita", "Servicio", "Delivery"], key="tipo_per")
+                        buscar_persona_btn = st.form_submit_button("🔍 BUSCAR PERSONA", width="stretch", type="primary")
+
+                        if buscar_persona_btn and rut_buscar:
+                            if not validar_rut(rut_buscar):
+                                st.error("❌ RUT inválido")
+                            else:
+                                persona = buscar_persona(rut_buscar)
+                                if persona is not None:
+                                    st.session_state.persona_encontrada = persona
+                                    st.session_state.mostrar_confirmacion_persona = True
+                                else:
+                                    st.error("❌ PERSONA NO AUTORIZADA")
+                                    st.session_state.persona_encontrada = None
+
+                    if st.session_state.persona_encontrada is not None and st.session_state.mostrar_confirmacion_persona:
+                        per = st.session_state.persona_encontrada
+
+                        # Verificar estado de autorización
+                        estado_aut = per.estado_autorizacion or 'AUTORIZADO'
+
+                        if estado_aut == "NO AUTORIZADO":
+                            st.error("🚫 ¡ATENCIÓN! PERSONA NO AUTORIZADA - NO PERMITIR INGRESO")
+                            st.write(f"**RUT:** {formatear_rut(per.rut)}")
+                            st.write(f"**Nombre:** {per.nombre}")
+                            st.write(f"**Depto:** {per.depto}")
+                            st.write(f"**Tipo:** {per.tipo}")
+                            if per.observaciones:
+                                st.warning(f"**Motivo:** {per.observaciones}")
+                            st.info("👮 Contactar al administrador o supervisor si intenta ingresar")
+
+                        elif estado_aut == "RESTRINGIDO":
+                            st.warning("⚠️ PERSONA RESTRINGIDA - VERIFICAR ANTES DE AUTORIZAR")
+                            st.write(f"**RUT:** {formatear_rut(per.rut)}")
+                            st.write(f"**Nombre:** {per.nombre}")
+                            st.write(f"**Depto:** {per.depto}")
+                            st.write(f"**Tipo:** {per.tipo}")
+                            if per.observaciones:
+                                st.warning(f"**Restricción:** {per.observaciones}")
+
+                            with st.form("confirmar_ingreso_persona"):
+                                st.write(f"**Tipo Ingreso:** {tipo_ingreso_per}")
+                                turno_per = determinar_turno()
+                                st.caption(f"Turno: {turno_per}")
+                                st.warning("⚠️ Confirmar solo si cumple con las restricciones indicadas")
+                                reingreso_per = control_antipassback("PERSONA", per.rut, key="reingreso_per")
+                                confirmar_btn_per = st.form_submit_button("⚠️ AUTORIZAR EXCEPCIONALMENTE", type="secondary", width="stretch")
+
+                                if confirmar_btn_per and reingreso_per:
+                                    registrar_ingreso("PERSONA", per.rut, per.nombre, per.depto, nombre_guardia, turno_per, tipo_ingreso_per, f"RESTRINGIDO: {per.observaciones or ''}")
+                                    st.warning(f"⚠️ Ingreso EXCEPCIONAL de {per.nombre} registrado")
+                                    st.session_state.persona_encontrada = None
+                                    st.session_state.mostrar_confirmacion_persona = False
+                                    st.rerun()
+
+                        else:  # AUTORIZADO
+                            st.success("✅ PERSONA AUTORIZADA")
+                            st.write(f"**RUT:** {formatear_rut(per.rut)}")
+                            st.write(f"**Nombre:** {per.nombre}")
+                            st.write(f"**Depto:** {per.depto}")
+                            st.write(f"**Tipo:** {per.tipo}")
+
+                            with st.form("confirmar_ingreso_persona"):
+                                st.write(f"**Tipo Ingreso:** {tipo_ingreso_per}")
+                                turno_per = determinar_turno()
+                                st.caption(f"Turno: {turno_per}")
+                                reingreso_per = control_antipassback("PERSONA", per.rut, key="reingreso_per")
+                                confirmar_btn_per = st.form_submit_button("✅ CONFIRMAR INGRESO", type="primary", width="stretch")
+
+                                if confirmar_btn_per and reingreso_per:
+                                    registrar_ingreso("PERSONA", per.rut, per.nombre, per.depto, nombre_guardia, turno_per, tipo_ingreso_per)
+                                    st.success(f"✅ Ingreso de {per.nombre} registrado correctamente")
+                                    st.balloons()
+                                    st.session_state.persona_encontrada = None
+                                    st.session_state.mostrar_confirmacion_persona = False
+                                    st.rerun()
+
+                        if st.button("🔄 NUEVA BÚSQUEDA", key="nueva_busqueda_per"):
                             st.session_state.persona_encontrada = None
                             st.session_state.mostrar_confirmacion_persona = False
                             st.rerun()
-                
-                if st.button("🔄 NUEVA BÚSQUEDA", key="nueva_busqueda_per"):
-                    st.session_state.persona_encontrada = None
-                    st.session_state.mostrar_confirmacion_persona = False
-                    st.rerun()
 
-# TAB 2: VEHÍCULOS
-with tab2:
-    st.header("🚗 Gestión de Vehículos")
-    
-    with st.expander("➕ Agregar Vehículo Nuevo", expanded=False):
-        with st.form("agregar_vehiculo_form"):
-            col1, col2 = st.columns(2)
-            with col1:
-                nueva_patente = st.text_input("Patente *", max_chars=8).upper()
-                propietario = st.text_input("Propietario *").upper()
-                rut_veh = st.text_input("RUT del Propietario (sin puntos, con guión)", max_chars=12, placeholder="18311040-3", help="Ejemplo: 18311040-3").upper()
-                depto = st.text_input("Departamento/Unidad")
-            with col2:
-                marca = st.text_input("Marca")
-                modelo = st.text_input("Modelo")
-                color = st.text_input("Color")
-                telefono = st.text_input("Teléfono")
-            
-            # Estado de autorización
-            estado_autorizacion_veh = st.selectbox(
-                "Estado de Autorización *",
-                ["AUTORIZADO", "NO AUTORIZADO", "RESTRINGIDO"],
-                help="AUTORIZADO: Puede ingresar | NO AUTORIZADO: No puede ingresar | RESTRINGIDO: Requiere verificación adicional"
-            )
-            
-            observaciones_veh = st.text_area("Observaciones (obligatorio para NO AUTORIZADO o RESTRINGIDO)" if estado_autorizacion_veh != "AUTORIZADO" else "Observaciones")
-            
-            submitted = st.form_submit_button("💾 GUARDAR VEHÍCULO", type="primary", use_container_width=True)
-            if submitted:
-                if not nueva_patente or not propietario:
-                    st.error("❌ Debes completar los campos obligatorios (*)")
-                elif not validar_patente(nueva_patente):
-                    st.error("❌ Formato de patente inválido")
-                elif rut_veh and not validar_rut(rut_veh):
-                    # Calcular DV para mostrar en el error
-                    rut_limpio = rut_veh.replace(".", "").replace("-", "").upper()
-                    if len(rut_limpio) >= 2:
-                        rut_num = rut_limpio[:-1]
-                        dv_ingresado = rut_limpio[-1]
-                        suma = 0
-                        multiplo = 2
-                        for r in reversed(rut_num):
-                            if r.isdigit():
-                                suma += int(r) * multiplo
-                                multiplo += 1
-                                if multiplo == 8:
-                                    multiplo = 2
-                        resto = suma % 11
-                        dv_calculado = 11 - resto
-                        if dv_calculado == 11:
-                            dv_esperado = '0'
-                        elif dv_calculado == 10:
-                            dv_esperado = 'K'
+                    if buscar_persona_btn:
+                        metricas.registrar_desde_rerun("portería:decisión persona")
+
+                st.divider()
+                st.subheader("🏠 Ocupación Actual")
+                panel_ocupacion(nombre_guardia)
+
+    # TAB 2: VEHÍCULOS
+    if tab2.open:
+        with tab2, metricas.medir("pestaña:Vehículos"):
+            st.header("🚗 Gestión de Vehículos")
+
+            with st.expander("➕ Agregar Vehículo Nuevo", expanded=False):
+                with st.form("agregar_vehiculo_form"):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        nueva_patente = st.text_input("Patente *", max_chars=8).upper()
+                        propietario = st.text_input("Propietario *").upper()
+                        rut_veh = st.text_input("RUT del Propietario (sin puntos, con guión)", max_chars=12, placeholder="18311040-3", help="Ejemplo: 18311040-3").upper()
+                        depto = st.text_input("Departamento/Unidad")
+                    with col2:
+                        marca = st.text_input("Marca")
+                        modelo = st.text_input("Modelo")
+                        color = st.text_input("Color")
+                        telefono = st.text_input("Teléfono")
+
+                    # Estado de autorización
+                    estado_autorizacion_veh = st.selectbox(
+                        "Estado de Autorización *",
+                        ["AUTORIZADO", "NO AUTORIZADO", "RESTRINGIDO"],
+                        help="AUTORIZADO: Puede ingresar | NO AUTORIZADO: No puede ingresar | RESTRINGIDO: Requiere verificación adicional"
+                    )
+
+                    observaciones_veh = st.text_area("Observaciones (obligatorio para NO AUTORIZADO o RESTRINGIDO)" if estado_autorizacion_veh != "AUTORIZADO" else "Observaciones")
+
+                    submitted = st.form_submit_button("💾 GUARDAR VEHÍCULO", type="primary", width="stretch")
+                    if submitted:
+                        if not nueva_patente or not propietario:
+                            st.error("❌ Debes completar los campos obligatorios (*)")
+                        elif not validar_patente(nueva_patente):
+                            st.error("❌ Formato de patente inválido")
+                        elif rut_veh and not validar_rut(rut_veh):
+                            # Mostrar en el error el DV que corresponde
+                            rut_limpio = rut_veh.replace(".", "").replace("-", "").upper()
+                            if len(rut_limpio) >= 2 and rut_limpio[:-1].isascii() and rut_limpio[:-1].isdigit():
+                                rut_num, dv_ingresado = rut_limpio[:-1], rut_limpio[-1]
+                                st.error(f"❌ RUT inválido. Ingresaste: {rut_num}-{dv_ingresado}, pero el dígito verificador correcto es: {digito_verificador(rut_num)}")
+                            else:
+                                st.error("❌ RUT inválido. Formato correcto: 18311040-3 (sin puntos, con guión y dígito verificador)")
+                        elif estado_autorizacion_veh != "AUTORIZADO" and not observaciones_veh:
+                            st.error("❌ Debes indicar el motivo en Observaciones para vehículos NO AUTORIZADOS o RESTRINGIDOS")
                         else:
-                            dv_esperado = str(dv_calculado)
-                        st.error(f"❌ RUT inválido. Ingresaste: {rut_num}-{dv_ingresado}, pero el dígito verificador correcto es: {dv_esperado}")
-                    else:
-                        st.error("❌ RUT inválido. Formato correcto: 18311040-3 (sin puntos, con guión y dígito verificador)")
-                elif estado_autorizacion_veh != "AUTORIZADO" and not observaciones_veh:
-                    st.error("❌ Debes indicar el motivo en Observaciones para vehículos NO AUTORIZADOS o RESTRINGIDOS")
-                else:
-                    exito, mensaje = agregar_vehiculo(nueva_patente, propietario, rut_veh, depto, marca, modelo, color, telefono, estado_autorizacion_veh, observaciones_veh)
-                    if exito:
-                        if estado_autorizacion_veh == "NO AUTORIZADO":
-                            st.warning(f"⚠️ {mensaje} - Estado: NO AUTORIZADO")
-                        elif estado_autorizacion_veh == "RESTRINGIDO":
-                            st.warning(f"⚠️ {mensaje} - Estado: RESTRINGIDO")
+                            exito, mensaje = agregar_vehiculo(nueva_patente, propietario, rut_veh, depto, marca, modelo, color, telefono, estado_autorizacion_veh, observaciones_veh)
+                            if exito:
+                                if estado_autorizacion_veh == "NO AUTORIZADO":
+                                    st.warning(f"⚠️ {mensaje} - Estado: NO AUTORIZADO")
+                                elif estado_autorizacion_veh == "RESTRINGIDO":
+                                    st.warning(f"⚠️ {mensaje} - Estado: RESTRINGIDO")
+                                else:
+                                    st.success(f"✅ {mensaje}")
+                                st.balloons()
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {mensaje}")
+
+            importador("vehiculos", "patente*, propietario*, rut, depto, marca, modelo, color, telefono, estado_autorizacion, observaciones")
+
+            st.subheader("📋 Vehículos Autorizados")
+            vista_veh = st.radio("Mostrar:", ["✅ Solo Activos", "📋 Todos"], horizontal=True, key="vista_vehiculos")
+
+            col_busqueda, col_por_pagina = st.columns([6, 1])
+            with col_busqueda:
+                busqueda_veh = st.text_input("🔎 Buscar", key="busqueda_vehiculos", placeholder="Patente, propietario, RUT, depto, marca, modelo, color u observaciones")
+            with col_por_pagina:
+                por_pagina_veh = st.selectbox("Por página", [25, 50, 100], key="por_pagina_vehiculos")
+
+            with st.expander("Filtros por campo", expanded=False):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    filtro_patente = st.text_input("Patente comienza con", key="filtro_patente")
+                with col2:
+                    filtro_depto = st.text_input("Depto comienza con", key="filtro_depto")
+                with col3:
+                    filtro_propietario = st.text_input("Propietario comienza con", key="filtro_propietario")
+
+            filtros_veh = {'solo_activos': vista_veh == "✅ Solo Activos", 'patente': filtro_patente,
+                           'depto': filtro_depto, 'propietario': filtro_propietario, 'busqueda': busqueda_veh}
+            pagina_veh = pagina_actual("pag_veh", (por_pagina_veh, *filtros_veh.values()))
+            vehiculos, total_veh = listar_vehiculos(**filtros_veh, limite=por_pagina_veh, desplazamiento=(pagina_veh - 1) * por_pagina_veh)
+            if not vehiculos and pagina_veh > 1:
+                # La página quedó vacía (por ejemplo, tras desactivar su último vehículo)
+                pagina_veh = total_paginas(total_veh, por_pagina_veh)
+                ir_a_pagina("pag_veh", pagina_veh)
+                vehiculos, total_veh = listar_vehiculos(**filtros_veh, limite=por_pagina_veh, desplazamiento=(pagina_veh - 1) * por_pagina_veh)
+
+            if total_veh:
+                desde = (pagina_veh - 1) * por_pagina_veh
+                st.success(f"📊 Mostrando {desde + 1}-{desde + len(vehiculos)} de {total_veh} vehículo(s)")
+                for row in vehiculos:
+                    col_info, col_actions = st.columns([4, 1])
+                    with col_info:
+                        estado = "✅" if row.activo == 1 else "❌"
+
+                        # Estado de autorización con colores
+                        estado_aut = row.estado_autorizacion or 'AUTORIZADO'
+                        if estado_aut == "NO AUTORIZADO":
+                            badge_aut = "🚫 NO AUTORIZADO"
+                            color_fondo = "background-color: #8B0000; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
+                        elif estado_aut == "RESTRINGIDO":
+                            badge_aut = "⚠️ RESTRINGIDO"
+                            color_fondo = "background-color: #FF8C00; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
                         else:
-                            st.success(f"✅ {mensaje}")
-                        st.balloons()
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {mensaje}")
-    
-    st.subheader("📋 Vehículos Autorizados")
-    vista_veh = st.radio("Mostrar:", ["✅ Solo Activos", "📋 Todos"], horizontal=True, key="vista_vehiculos")
-    
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        filtro_patente = st.text_input("🔎 Filtrar por Patente", key="filtro_patente")
-    with col2:
-        filtro_depto = st.text_input("🔎 Filtrar por Depto", key="filtro_depto")
-    with col3:
-        filtro_propietario = st.text_input("🔎 Filtrar por Propietario", key="filtro_propietario")
-    
-    df_veh = obtener_vehiculos() if vista_veh == "✅ Solo Activos" else obtener_todos_vehiculos()
-    if vista_veh == "✅ Solo Activos":
-        df_veh['activo'] = 1
-    
-    if not df_veh.empty:
-        if filtro_patente:
-            df_veh = df_veh[df_veh['patente'].str.contains(filtro_patente.upper(), na=False)]
-        if filtro_depto:
-            df_veh = df_veh[df_veh['depto'].str.contains(filtro_depto, na=False, case=False)]
-        if filtro_propietario:
-            df_veh = df_veh[df_veh['propietario'].str.contains(filtro_propietario, na=False, case=False)]
-        
-        if df_veh.empty:
-            st.warning("🔍 No se encontraron vehículos")
-        else:
-            st.success(f"📊 Mostrando {len(df_veh)} vehículo(s)")
-            for idx, row in df_veh.iterrows():
-                col_info, col_actions = st.columns([4, 1])
-                with col_info:
-                    estado = "✅" if row['activo'] == 1 else "❌"
-                    
-                    # Estado de autorización con colores
-                    estado_aut = row.get('estado_autorizacion', 'AUTORIZADO')
-                    if estado_aut == "NO AUTORIZADO":
-                        badge_aut = "🚫 NO AUTORIZADO"
-                        color_fondo = "background-color: #8B0000; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
-                    elif estado_aut == "RESTRINGIDO":
-                        badge_aut = "⚠️ RESTRINGIDO"
-                        color_fondo = "background-color: #FF8C00; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
-                    else:
-                        badge_aut = "✅ AUTORIZADO"
-                        color_fondo = "background-color: #006400; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
-                    
-                    rut_display = f"RUT: {formatear_rut(row['rut'])}" if row.get('rut') and row['rut'] else ""
-                    st.markdown(f"{estado} **{row['patente']}** - {row['propietario']} {rut_display}")
-                    st.markdown(f"<span style='{color_fondo}'>{badge_aut}</span>", unsafe_allow_html=True)
-                    st.caption(f"Depto: {row['depto']} | 📱 {row['telefono'] if row['telefono'] else 'Sin teléfono'} | 🚗 {row['marca']} {row['modelo']} ({row['color']})")
-                    if row['observaciones']:
-                        st.caption(f"💬 {row['observaciones']}")
-                
-                with col_actions:
-                    if row['activo'] == 1:
-                        if st.button("🗑️", key=f"del_veh_{row['id']}", use_container_width=True):
-                            desactivar_vehiculo(row['id'])
-                            st.rerun()
-                    else:
-                        if st.button("♻️", key=f"reac_veh_{row['id']}", use_container_width=True):
-                            reactivar_vehiculo(row['id'])
-                            st.rerun()
-                st.divider()
-            
-            csv = df_veh[['patente', 'propietario', 'rut', 'depto', 'marca', 'modelo']].to_csv(index=False).encode('utf-8')
-            st.download_button("📥 Descargar CSV", csv, f"vehiculos_{datetime.now(CHILE_TZ).strftime('%Y%m%d')}.csv", "text/csv")
-    else:
-        st.info("📝 No hay vehículos registrados")
-
-# TAB 3: PERSONAS
-with tab3:
-    st.header("👤 Gestión de Personas")
-    
-    with st.expander("➕ Agregar Persona Nueva", expanded=False):
-        with st.form("agregar_persona_form"):
-            col1, col2 = st.columns(2)
-            with col1:
-                nuevo_rut = st.text_input("RUT *", max_chars=12, placeholder="12345678-9").upper()
-                nombre_per = st.text_input("Nombre Completo *").upper()
-                depto_per = st.text_input("Departamento/Unidad")
-            with col2:
-                telefono_per = st.text_input("Teléfono")
-                tipo_per = st.selectbox("Tipo *", ["Residente", "Servicio", "Proveedor", "Otro"])
-            
-            # Estado de autorización
-            estado_autorizacion_per = st.selectbox(
-                "Estado de Autorización *",
-                ["AUTORIZADO", "NO AUTORIZADO", "RESTRINGIDO"],
-                help="AUTORIZADO: Puede ingresar | NO AUTORIZADO: No puede ingresar | RESTRINGIDO: Requiere verificación adicional"
-            )
-            
-            observaciones_per = st.text_area("Observaciones (obligatorio para NO AUTORIZADO o RESTRINGIDO)" if estado_autorizacion_per != "AUTORIZADO" else "Observaciones")
-            
-            submitted_per = st.form_submit_button("💾 GUARDAR PERSONA", type="primary", use_container_width=True)
-            if submitted_per:
-                if not nuevo_rut or not nombre_per or not tipo_per:
-                    st.error("❌ Debes completar los campos obligatorios (*)")
-                elif not validar_rut(nuevo_rut):
-                    st.error("❌ RUT inválido")
-                elif estado_autorizacion_per != "AUTORIZADO" and not observaciones_per:
-                    st.error("❌ Debes indicar el motivo en Observaciones para personas NO AUTORIZADAS o RESTRINGIDAS")
-                else:
-                    exito, mensaje = agregar_persona(nuevo_rut, nombre_per, depto_per, telefono_per, tipo_per, estado_autorizacion_per, observaciones_per)
-                    if exito:
-                        if estado_autorizacion_per == "NO AUTORIZADO":
-                            st.warning(f"⚠️ {mensaje} - Estado: NO AUTORIZADO")
-                        elif estado_autorizacion_per == "RESTRINGIDO":
-                            st.warning(f"⚠️ {mensaje} - Estado: RESTRINGIDO")
+                            badge_aut = "✅ AUTORIZADO"
+                            color_fondo = "background-color: #006400; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
+
+                        rut_display = f"RUT: {formatear_rut(row.rut)}" if row.rut else ""
+                        st.markdown(f"{estado} **{row.patente}** - {row.propietario} {rut_display}")
+                        st.markdown(f"<span style='{color_fondo}'>{badge_aut}</span>", unsafe_allow_html=True)
+                        st.caption(f"Depto: {row.depto} | 📱 {row.telefono if row.telefono else 'Sin teléfono'} | 🚗 {row.marca} {row.modelo} ({row.color})")
+                        if row.observaciones:
+                            st.caption(f"💬 {row.observaciones}")
+
+                    with col_actions:
+                        if row.activo == 1:
+                            if st.button("🗑️", key=f"del_veh_{row.id}", width="stretch"):
+                                desactivar_vehiculo(row.id)
+                                st.rerun()
                         else:
-                            st.success(f"✅ {mensaje}")
-                        st.balloons()
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {mensaje}")
-    
-    st.subheader("📋 Personas Autorizadas")
-    vista_per = st.radio("Mostrar:", ["✅ Solo Activos", "📋 Todos"], horizontal=True, key="vista_personas")
-    
-    df_per = obtener_personas() if vista_per == "✅ Solo Activos" else obtener_todas_personas()
-    if vista_per == "✅ Solo Activos":
-        df_per['activo'] = 1
-    
-    if not df_per.empty:
-        st.success(f"📊 Mostrando {len(df_per)} persona(s)")
-        for idx, row in df_per.iterrows():
-            col_info, col_actions = st.columns([4, 1])
-            with col_info:
-                estado = "✅" if row['activo'] == 1 else "❌"
-                
-                # Estado de autorización con colores
-                estado_aut = row.get('estado_autorizacion', 'AUTORIZADO')
-                if estado_aut == "NO AUTORIZADO":
-                    badge_aut = "🚫 NO AUTORIZADO"
-                    color_fondo = "background-color: #8B0000; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
-                elif estado_aut == "RESTRINGIDO":
-                    badge_aut = "⚠️ RESTRINGIDO"
-                    color_fondo = "background-color: #FF8C00; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
-                else:
-                    badge_aut = "✅ AUTORIZADO"
-                    color_fondo = "background-color: #006400; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
-                
-                st.markdown(f"{estado} **{formatear_rut(row['rut'])}** - {row['nombre']}")
-                st.markdown(f"<span style='{color_fondo}'>{badge_aut}</span>", unsafe_allow_html=True)
-                st.caption(f"Depto: {row['depto']} | 📱 {row['telefono'] if row['telefono'] else 'Sin teléfono'} | Tipo: {row['tipo']}")
-                if row['observaciones']:
-                    st.caption(f"💬 {row['observaciones']}")
-            
-            with col_actions:
-                if row['activo'] == 1:
-                    if st.button("🗑️", key=f"del_per_{row['id']}", use_container_width=True):
-                        desactivar_persona(row['id'])
-                        st.rerun()
-                else:
-                    if st.button("♻️", key=f"reac_per_{row['id']}", use_container_width=True):
-                        reactivar_persona(row['id'])
-                        st.rerun()
-            st.divider()
-        
-        csv = df_per[['rut', 'nombre', 'depto', 'telefono', 'tipo']].to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Descargar CSV", csv, f"personas_{datetime.now(CHILE_TZ).strftime('%Y%m%d')}.csv", "text/csv")
-    else:
-        st.info("📝 No hay personas registradas")
-
-# TAB 4: GUARDIAS
-with tab4:
-    st.header("👮 Gestión de Guardias")
-    
-    # Agregar guardia nuevo (siempre visible)
-    with st.expander("➕ Agregar Guardia Nuevo", expanded=False):
-        with st.form("agregar_guardia_form"):
-            col1, col2 = st.columns(2)
-            with col1:
-                nuevo_guardia = st.text_input("Nombre del Guardia *").upper()
-            with col2:
-                tel_guardia = st.text_input("Teléfono")
-            
-            submitted_guar = st.form_submit_button("💾 AGREGAR GUARDIA", type="primary", use_container_width=True)
-            if submitted_guar:
-                if not nuevo_guardia:
-                    st.error("❌ Debes ingresar el nombre del guardia")
-                else:
-                    exito, mensaje = agregar_guardia(nuevo_guardia, tel_guardia)
-                    if exito:
-                        st.success(f"✅ {mensaje}")
-                        st.balloons()
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {mensaje}")
-    
-    st.divider()
-    
-    # Lista de guardias (en expander que se puede reabrir)
-    with st.expander("📋 Ver Lista de Guardias", expanded=True):
-        df_guardias = obtener_todos_guardias()
-        
-        if not df_guardias.empty:
-            activos = df_guardias[df_guardias['activo'] == 1]
-            inactivos = df_guardias[df_guardias['activo'] == 0]
-            
-            st.success(f"✅ Activos ({len(activos)})")
-            for idx, row in activos.iterrows():
-                col_info, col_actions = st.columns([4, 1])
-                with col_info:
-                    tel = row['telefono'] if row['telefono'] else "Sin teléfono"
-                    st.write(f"✅ **{row['nombre']}**")
-                    st.caption(f"📱 {tel}")
-                with col_actions:
-                    if st.button("❌", key=f"deact_guar_{row['id']}", use_container_width=True):
-                        desactivar_guardia(row['id'])
-                        st.rerun()
-                st.divider()
-            
-            if not inactivos.empty:
-                st.warning(f"❌ Inactivos ({len(inactivos)})")
-                for idx, row in inactivos.iterrows():
+                            if st.button("♻️", key=f"reac_veh_{row.id}", width="stretch"):
+                                reactivar_vehiculo(row.id)
+                                st.rerun()
+                    st.divider()
+
+                controles_paginacion("pag_veh", pagina_veh, total_veh, por_pagina_veh)
+
+                boton_descarga("📥 Descargar CSV", consulta_vehiculos_filtrados(**filtros_veh),
+                               f"vehiculos_{datetime.now(CHILE_TZ).strftime('%Y%m%d')}", key="descargar_vehiculos")
+            elif busqueda_veh or filtro_patente or filtro_depto or filtro_propietario:
+                st.warning("🔍 No se encontraron vehículos")
+            else:
+                st.info("📝 No hay vehículos registrados")
+
+    # TAB 3: PERSONAS
+    if tab3.open:
+        with tab3, metricas.medir("pestaña:Personas"):
+            st.header("👤 Gestión de Personas")
+
+            with st.expander("➕ Agregar Persona Nueva", expanded=False):
+                with st.form("agregar_persona_form"):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        nuevo_rut = st.text_input("RUT *", max_chars=12, placeholder="12345678-9").upper()
+                        nombre_per = st.text_input("Nombre Completo *").upper()
+                        depto_per = st.text_input("Departamento/Unidad")
+                    with col2:
+                        telefono_per = st.text_input("Teléfono")
+                        tipo_per = st.selectbox("Tipo *", ["Residente", "Servicio", "Proveedor", "Otro"])
+
+                    # Estado de autorización
+                    estado_autorizacion_per = st.selectbox(
+                        "Estado de Autorización *",
+                        ["AUTORIZADO", "NO AUTORIZADO", "RESTRINGIDO"],
+                        help="AUTORIZADO: Puede ingresar | NO AUTORIZADO: No puede ingresar | RESTRINGIDO: Requiere verificación adicional"
+                    )
+
+                    observaciones_per = st.text_area("Observaciones (obligatorio para NO AUTORIZADO o RESTRINGIDO)" if estado_autorizacion_per != "AUTORIZADO" else "Observaciones")
+
+                    submitted_per = st.form_submit_button("💾 GUARDAR PERSONA", type="primary", width="stretch")
+                    if submitted_per:
+                        if not nuevo_rut or not nombre_per or not tipo_per:
+                            st.error("❌ Debes completar los campos obligatorios (*)")
+                        elif not validar_rut(nuevo_rut):
+                            st.error("❌ RUT inválido")
+                        elif estado_autorizacion_per != "AUTORIZADO" and not observaciones_per:
+                            st.error("❌ Debes indicar el motivo en Observaciones para personas NO AUTORIZADAS o RESTRINGIDAS")
+                        else:
+                            exito, mensaje = agregar_persona(nuevo_rut, nombre_per, depto_per, telefono_per, tipo_per, estado_autorizacion_per, observaciones_per)
+                            if exito:
+                                if estado_autorizacion_per == "NO AUTORIZADO":
+                                    st.warning(f"⚠️ {mensaje} - Estado: NO AUTORIZADO")
+                                elif estado_autorizacion_per == "RESTRINGIDO":
+                                    st.warning(f"⚠️ {mensaje} - Estado: RESTRINGIDO")
+                                else:
+                                    st.success(f"✅ {mensaje}")
+                                st.balloons()
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {mensaje}")
+
+            importador("personas", "rut*, nombre*, depto, telefono, tipo, estado_autorizacion, observaciones")
+
+            st.subheader("📋 Personas Autorizadas")
+            vista_per = st.radio("Mostrar:", ["✅ Solo Activos", "📋 Todos"], horizontal=True, key="vista_personas")
+
+            col_busqueda, col_por_pagina = st.columns([6, 1])
+            with col_busqueda:
+                busqueda_per = st.text_input("🔎 Buscar", key="busqueda_personas", placeholder="Nombre, RUT, depto, tipo u observaciones")
+            with col_por_pagina:
+                por_pagina_per = st.selectbox("Por página", [25, 50, 100], key="por_pagina_personas")
+
+            with st.expander("Filtros por campo", expanded=False):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    filtro_rut = st.text_input("RUT comienza con", key="filtro_rut")
+                with col2:
+                    filtro_depto_per = st.text_input("Depto comienza con", key="filtro_depto_per")
+                with col3:
+                    filtro_nombre = st.text_input("Nombre comienza con", key="filtro_nombre")
+
+            filtros_per = {'solo_activos': vista_per == "✅ Solo Activos", 'rut': filtro_rut,
+                           'depto': filtro_depto_per, 'nombre': filtro_nombre, 'busqueda': busqueda_per}
+            pagina_per = pagina_actual("pag_per", (por_pagina_per, *filtros_per.values()))
+            personas, total_per = listar_personas(**filtros_per, limite=por_pagina_per, desplazamiento=(pagina_per - 1) * por_pagina_per)
+            if not personas and pagina_per > 1:
+                pagina_per = total_paginas(total_per, por_pagina_per)
+                ir_a_pagina("pag_per", pagina_per)
+                personas, total_per = listar_personas(**filtros_per, limite=por_pagina_per, desplazamiento=(pagina_per - 1) * por_pagina_per)
+
+            if total_per:
+                desde = (pagina_per - 1) * por_pagina_per
+                st.success(f"📊 Mostrando {desde + 1}-{desde + len(personas)} de {total_per} persona(s)")
+                for row in personas:
                     col_info, col_actions = st.columns([4, 1])
                     with col_info:
-                        st.write(f"❌ **{row['nombre']}**")
+                        estado = "✅" if row.activo == 1 else "❌"
+
+                        # Estado de autorización con colores
+                        estado_aut = row.estado_autorizacion or 'AUTORIZADO'
+                        if estado_aut == "NO AUTORIZADO":
+                            badge_aut = "🚫 NO AUTORIZADO"
+                            color_fondo = "background-color: #8B0000; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
+                        elif estado_aut == "RESTRINGIDO":
+                            badge_aut = "⚠️ RESTRINGIDO"
+                            color_fondo = "background-color: #FF8C00; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
+                        else:
+                            badge_aut = "✅ AUTORIZADO"
+                            color_fondo = "background-color: #006400; color: white; padding: 3px 8px; border-radius: 3px; font-weight: bold;"
+
+                        st.markdown(f"{estado} **{formatear_rut(row.rut)}** - {row.nombre}")
+                        st.markdown(f"<span style='{color_fondo}'>{badge_aut}</span>", unsafe_allow_html=True)
+                        st.caption(f"Depto: {row.depto} | 📱 {row.telefono if row.telefono else 'Sin teléfono'} | Tipo: {row.tipo}")
+                        if row.observaciones:
+                            st.caption(f"💬 {row.observaciones}")
+
                     with col_actions:
-                        if st.button("✅", key=f"react_guar_{row['id']}", use_container_width=True):
-                            reactivar_guardia(row['id'])
-                            st.rerun()
+                        if row.activo == 1:
+                            if st.button("🗑️", key=f"del_per_{row.id}", width="stretch"):
+                                desactivar_persona(row.id)
+                                st.rerun()
+                        else:
+                            if st.button("♻️", key=f"reac_per_{row.id}", width="stretch"):
+                                reactivar_persona(row.id)
+                                st.rerun()
                     st.divider()
-        else:
-            st.info("No hay guardias registrados")
 
-# TAB 5: REGISTROS
-with tab5:
-    st.header("📈 Registros de Ingresos")
-    periodo = st.radio("Selecciona período:", ["📅 Hoy", "🔍 Rango Personalizado"], horizontal=True)
-    st.divider()
-    
-    if periodo == "📅 Hoy":
-        st.subheader(f"Ingresos de Hoy - {datetime.now(CHILE_TZ).strftime('%d/%m/%Y')}")
-        df_registros = obtener_registros_hoy()
-        
-        if not df_registros.empty:
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Total", len(df_registros))
-            with col2:
-                vehiculos = len(df_registros[df_registros['tipo_registro'] == 'VEHICULO'])
-                st.metric("🚗 Vehículos", vehiculos)
-            with col3:
-                personas = len(df_registros[df_registros['tipo_registro'] == 'PERSONA'])
-                st.metric("👤 Personas", personas)
-            with col4:
-                dia_count = len(df_registros[df_registros['turno'].str.contains('Día', na=False)])
-                st.metric("☀️ Turno Día", dia_count)
-            
+                controles_paginacion("pag_per", pagina_per, total_per, por_pagina_per)
+
+                boton_descarga("📥 Descargar CSV", consulta_personas_filtradas(**filtros_per),
+                               f"personas_{datetime.now(CHILE_TZ).strftime('%Y%m%d')}", key="descargar_personas")
+            elif busqueda_per or filtro_rut or filtro_depto_per or filtro_nombre:
+                st.warning("🔍 No se encontraron personas")
+            else:
+                st.info("📝 No hay personas registradas")
+
+    # TAB 4: GUARDIAS
+    if tab4.open:
+        with tab4, metricas.medir("pestaña:Guardias"):
+            st.header("👮 Gestión de Guardias")
+
+            # Agregar guardia nuevo (siempre visible)
+            with st.expander("➕ Agregar Guardia Nuevo", expanded=False):
+                with st.form("agregar_guardia_form"):
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        nuevo_guardia = st.text_input("Nombre del Guardia *").upper()
+                    with col2:
+                        tel_guardia = st.text_input("Teléfono")
+
+                    submitted_guar = st.form_submit_button("💾 AGREGAR GUARDIA", type="primary", width="stretch")
+                    if submitted_guar:
+                        if not nuevo_guardia:
+                            st.error("❌ Debes ingresar el nombre del guardia")
+                        else:
+                            exito, mensaje = agregar_guardia(nuevo_guardia, tel_guardia)
+                            if exito:
+                                st.success(f"✅ {mensaje}")
+                                st.balloons()
+                                st.rerun()
+                            else:
+                                st.error(f"❌ {mensaje}")
+
+            importador("guardias", "nombre*, telefono")
+
             st.divider()
-            st.dataframe(df_registros, use_container_width=True, hide_index=True)
-            
-            csv = df_registros.to_csv(index=False).encode('utf-8')
-            st.download_button("📥 Descargar CSV", csv, f"registros_{datetime.now(CHILE_TZ).strftime('%Y%m%d')}.csv", "text/csv")
-        else:
-            st.info("No hay registros para hoy")
-    
-    else:
-        st.subheader("🔍 Selecciona Rango de Fechas")
-        col1, col2 = st.columns(2)
-        with col1:
-            fecha_inicio = st.date_input("Fecha Inicio", value=datetime.now(CHILE_TZ) - timedelta(days=7), max_value=datetime.now(CHILE_TZ))
-        with col2:
-            fecha_fin = st.date_input("Fecha Fin", value=datetime.now(CHILE_TZ), max_value=datetime.now(CHILE_TZ))
-        
-        if fecha_inicio > fecha_fin:
-            st.error("❌ La fecha de inicio debe ser anterior a la fecha de fin")
-        else:
-            df_rango = obtener_registros_rango_fechas(fecha_inicio.strftime('%Y-%m-%d'), fecha_fin.strftime('%Y-%m-%d'))
-            
-            if not df_rango.empty:
-                st.success(f"📊 {len(df_rango)} registros encontrados")
-                col1, col2, col3 = st.columns(3)
+
+            # Lista de guardias (en expander que se puede reabrir)
+            with st.expander("📋 Ver Lista de Guardias", expanded=True):
+                guardias = obtener_guardias(solo_activos=False)
+
+                if guardias:
+                    activos = [g for g in guardias if g.activo == 1]
+                    inactivos = [g for g in guardias if g.activo != 1]
+
+                    st.success(f"✅ Activos ({len(activos)})")
+                    for guardia in activos:
+                        col_info, col_actions = st.columns([4, 1])
+                        with col_info:
+                            tel = guardia.telefono if guardia.telefono else "Sin teléfono"
+                            st.write(f"✅ **{guardia.nombre}**")
+                            st.caption(f"📱 {tel}")
+                        with col_actions:
+                            if st.button("❌", key=f"deact_guar_{guardia.id}", width="stretch"):
+                                desactivar_guardia(guardia.id)
+                                st.rerun()
+                        st.divider()
+
+                    if inactivos:
+                        st.warning(f"❌ Inactivos ({len(inactivos)})")
+                        for guardia in inactivos:
+                            col_info, col_actions = st.columns([4, 1])
+                            with col_info:
+                                st.write(f"❌ **{guardia.nombre}**")
+                            with col_actions:
+                                if st.button("✅", key=f"react_guar_{guardia.id}", width="stretch"):
+                                    reactivar_guardia(guardia.id)
+                                    st.rerun()
+                            st.divider()
+                else:
+                    st.info("No hay guardias registrados")
+
+    # TAB 5: REGISTROS
+    if tab5.open:
+        with tab5, metricas.medir("pestaña:Registros"):
+            st.header("📈 Registros de Ingresos")
+            periodo = st.radio("Selecciona período:", ["📅 Hoy", "🔍 Rango Personalizado"], horizontal=True)
+            st.divider()
+
+            if periodo == "📅 Hoy":
+                panel_ingresos_hoy()
+
+            else:
+                st.subheader("🔍 Selecciona Rango de Fechas")
+                col1, col2 = st.columns(2)
+                with col1:
+                    fecha_inicio = st.date_input("Fecha Inicio", value=datetime.now(CHILE_TZ) - timedelta(days=7), max_value=datetime.now(CHILE_TZ))
+                with col2:
+                    fecha_fin = st.date_input("Fecha Fin", value=datetime.now(CHILE_TZ), max_value=datetime.now(CHILE_TZ))
+
+                if fecha_inicio > fecha_fin:
+                    st.error("❌ La fecha de inicio debe ser anterior a la fecha de fin")
+                else:
+                    desde_rango = fecha_inicio.strftime('%Y-%m-%d')
+                    hasta_rango = fecha_fin.strftime('%Y-%m-%d')
+                    resumen_rango = resumen_registros(desde_rango, hasta_rango)
+                    total_rango = resumen_rango['total']
+
+                    if total_rango:
+                        st.success(f"📊 {total_rango} registros encontrados")
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Total Ingresos", total_rango)
+                        with col2:
+                            st.metric("🚗 Vehículos", resumen_rango['VEHICULO'])
+                        with col3:
+                            st.metric("👤 Personas", resumen_rango['PERSONA'])
+                        with col4:
+                            st.metric("☀️ Turno Día", resumen_rango['turno_dia'])
+
+                        st.divider()
+                        df_rango = obtener_registros_rango_fechas(desde_rango, hasta_rango, limite=MAX_FILAS_PANTALLA)
+                        if total_rango > MAX_FILAS_PANTALLA:
+                            st.caption(f"Mostrando los {MAX_FILAS_PANTALLA} ingresos más recientes; el CSV incluye los {total_rango}.")
+                        st.dataframe(df_rango, width="stretch", hide_index=True)
+
+                        formato_rango = st.radio("Formato de descarga", list(FORMATOS_DESCARGA), horizontal=True,
+                                                 index=1 if total_rango > 50000 else 0, key="formato_rango",
+                                                 help="Parquet conserva los tipos (fecha_hora como fecha) y es más liviano")
+                        boton_descarga(f"📥 Descargar {formato_rango}", consulta_registros_rango(desde_rango, hasta_rango),
+                                       f"registros_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}",
+                                       formato=formato_rango, key="descargar_registros_rango",
+                                       fuentes=lambda: fuentes_registros(desde_rango, hasta_rango))
+                    else:
+                        st.info("No hay registros en el rango seleccionado")
+
+    # TAB 6: ADMINISTRACIÓN
+    if tab6.open:
+        with tab6:
+            st.header("⚙️ Administración")
+            if acceso_administracion():
+                st.subheader("⏱️ Latencias")
+                resumen_metricas = metricas.resumen()
+                if resumen_metricas:
+                    st.dataframe(
+                        [{"Métrica": nombre, "Unidad": m['unidad'], "Total": m['total'], "Muestras": m['muestras'],
+                          "p50": round(m['p50'], 2), "p95": round(m['p95'], 2), "p99": round(m['p99'], 2),
+                          "Máx": round(m['max'], 2)}
+                         for nombre, m in resumen_metricas.items()],
+                        width="stretch", hide_index=True)
+                    st.caption(f"Percentiles sobre las últimas {metricas.MUESTRAS} mediciones de cada métrica, "
+                               "desde que inició el proceso")
+                else:
+                    st.info("Todavía no hay mediciones")
+                col_json, col_reiniciar = st.columns(2)
+                with col_json:
+                    st.download_button("📥 Exportar JSON", metricas.exportar_json,
+                                       f"metricas_{datetime.now(CHILE_TZ).strftime('%Y%m%d_%H%M%S')}.json",
+                                       "application/json", key="exportar_metricas")
+                with col_reiniciar:
+                    if st.button("🔄 Reiniciar métricas", key="reiniciar_metricas"):
+                        metricas.reiniciar()
+                        st.rerun()
+                if cola_ingresos.ACTIVA:
+                    st.caption(f"Cola de ingresos: {cola_ingresos.profundidad()} pendiente(s) de escribir en la base, "
+                               f"{cola_ingresos.rechazadas()} rechazado(s) (tabla ingresos_rechazados)")
+                    if not cola_ingresos.viva():
+                        st.error("El hilo escritor de la cola de ingresos se detuvo: los ingresos se escriben directo "
+                                 "y los pendientes se aplicarán al reiniciar la aplicación")
+
+                st.divider()
+                st.subheader("🗄️ Caché de lecturas")
+                cache = estadisticas_cache()
+                aciertos = sum(a for a, _ in cache['funciones'].values())
+                fallos = sum(f for _, f in cache['funciones'].values())
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("Total Ingresos", len(df_rango))
+                    st.metric("Aciertos", aciertos)
                 with col2:
-                    vehiculos = len(df_rango[df_rango['tipo_registro'] == 'VEHICULO'])
-                    st.metric("🚗 Vehículos", vehiculos)
+                    st.metric("Fallos", fallos)
                 with col3:
-                    personas = len(df_rango[df_rango['tipo_registro'] == 'PERSONA'])
-                    st.metric("👤 Personas", personas)
-                
+                    st.metric("Tasa de aciertos", f"{aciertos / (aciertos + fallos):.0%}" if aciertos + fallos else "-")
+                with col4:
+                    st.metric("Entradas", f"{cache['entradas']} / {cache['maximo']}")
+                st.caption(f"Generación {cache['generacion']} · padrón de portería {cache['padron']} clave(s) · "
+                           f"TTL {cache['ttl']:g} s · contadores desde que inició el proceso")
+                if cache['funciones']:
+                    st.dataframe(
+                        [{"Consulta": nombre, "Aciertos": a, "Fallos": f} for nombre, (a, f) in cache['funciones'].items()],
+                        width="stretch", hide_index=True)
+                if st.button("🧹 Vaciar caché", key="vaciar_cache"):
+                    invalidar_cache()
+                    st.rerun()
+
                 st.divider()
-                st.dataframe(df_rango, use_container_width=True, hide_index=True)
-                
-                csv = df_rango.to_csv(index=False).encode('utf-8')
-                st.download_button("📥 Descargar CSV", csv, f"registros_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.csv", "text/csv")
-            else:
-                st.info("No hay registros en el rango seleccionado")
+                st.subheader("🗃️ Archivo de registros")
+                st.caption("Los meses cerrados se mueven a un archivo por mes; las consultas por rango los siguen incluyendo.")
+                archivados = meses_archivados()
+                if archivados:
+                    st.write(f"Meses archivados ({len(archivados)}): " + ", ".join(archivados))
+                else:
+                    st.info("Todavía no hay meses archivados")
+                if st.button("🗃️ Archivar meses cerrados", key="archivar_meses",
+                             help="Deja en la base el mes actual y el anterior"):
+                    with st.spinner("Archivando..."):
+                        movidos = archivar()
+                    if movidos:
+                        st.success("✅ " + ", ".join(f"{mes}: {filas} ingresos" for mes, filas in movidos))
+                    else:
+                        st.info("No hay meses cerrados para archivar")
 
-st.divider()
-st.markdown('<div style="text-align: center; color: gray;"><p>Sistema de Control de Acceso v3.0 | Desarrollado por Simatec S.A.</p></div>', unsafe_allow_html=True)
+    st.divider()
+    st.markdown('<div style="text-align: center; color: gray;"><p>Sistema de Control de Acceso v3.0 | Desarrollado por Simatec S.A.</p></div>', unsafe_allow_html=True)
+finally:
+    metricas.terminar_rerun()
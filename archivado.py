@@ -0,0 +1,162 @@
+"""Archivo mensual de registro_ingresos.
+
+Los meses cerrados se mueven de la base principal a un archivo SQLite por
+mes (``<base>_archivo/registros_AAAA-MM.db``), con la misma tabla e índice
+por instante. Los meses se archivan siempre del más antiguo al más
+reciente, así que todo lo archivado es anterior a lo que queda en la base
+principal: una consulta por rango recorre la base principal y luego los
+archivos que tocan el rango, del más nuevo al más viejo, y los resultados
+quedan en orden sin mezclar.
+
+Las estadísticas diarias (``estadisticas_ingresos``) quedan en la base
+principal y no cambian al archivar.
+
+Uso desde la línea de comandos:
+    python archivado.py                 # archiva los meses cerrados, salvo el anterior
+    python archivado.py --conservar 0   # incluye el mes anterior
+    python archivado.py --listar
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import db
+import horario
+import migraciones
+
+# Meses cerrados que se dejan en la base principal, además del actual
+CONSERVAR_MESES = 1
+
+_COLUMNAS = ('id, tipo_registro, identificador, nombre_persona, depto, fecha_hora, '
+             'guardia, turno, tipo_ingreso, observaciones, instante')
+
+
+def carpeta_archivo():
+    """Carpeta de los archivos mensuales (CONTROL_ACCESO_ARCHIVO o junto a la base)."""
+    carpeta = os.environ.get('CONTROL_ACCESO_ARCHIVO')
+    if carpeta:
+        return carpeta
+    return os.path.splitext(os.path.abspath(db.obtener_ruta()))[0] + '_archivo'
+
+
+def ruta_mes(mes):
+    return os.path.join(carpeta_archivo(), f"registros_{mes}.db")
+
+
+def meses_archivados():
+    """Meses 'AAAA-MM' con archivo, de más antiguo a más reciente."""
+    rutas = glob.glob(os.path.join(carpeta_archivo(), "registros_????-??.db"))
+    return sorted(os.path.basename(ruta)[len("registros_"):-len(".db")] for ruta in rutas)
+
+
+def _mes_siguiente(mes):
+    anio, numero = int(mes[:4]), int(mes[5:7])
+    return f"{anio + numero // 12}-{numero % 12 + 1:02d}"
+
+
+def _mes_anterior(mes, meses=1):
+    indice = int(mes[:4]) * 12 + int(mes[5:7]) - 1 - meses
+    return f"{indice // 12}-{indice % 12 + 1:02d}"
+
+# ==================== CONSULTAS ====================
+
+def fuentes(fecha_inicio=None, fecha_fin=None):
+    """Conexiones con ingresos del rango: la base principal y luego los archivos.
+
+    Las fechas son 'AAAA-MM-DD' (None = sin límite). Los archivos se abren
+    solo lectura y se cierran al pasar al siguiente o al cerrar el generador.
+    """
+    yield db.conexion()
+    desde = fecha_inicio[:7] if fecha_inicio else None
+    hasta = fecha_fin[:7] if fecha_fin else None
+    for mes in reversed(meses_archivados()):
+        if (desde and mes < desde) or (hasta and mes > hasta):
+            continue
+        conn = sqlite3.connect(f"file:{ruta_mes(mes)}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+# ==================== ARCHIVADO ====================
+
+def _archivar_mes(mes):
+    """Copia el mes a su archivo y lo borra de la base principal; retorna las filas movidas.
+
+    Con la base en WAL, SQLite no garantiza que el COMMIT sea atómico entre
+    las dos bases. Si el proceso se corta entre ambas, el mes queda repetido
+    hasta volver a archivar; la copia usa el id como clave, así que repetir
+    la operación no duplica filas en el archivo.
+    """
+    desde, hasta = horario.instante(f"{mes}-01"), horario.instante(f"{_mes_siguiente(mes)}-01")
+    os.makedirs(carpeta_archivo(), exist_ok=True)
+    db.conexion().execute("ATTACH DATABASE ? AS archivo", (ruta_mes(mes),))
+    try:
+        with db.transaccion() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS archivo.registro_ingresos (
+                id INTEGER PRIMARY KEY, tipo_registro TEXT NOT NULL,
+                identificador TEXT NOT NULL, nombre_persona TEXT, depto TEXT,
+                fecha_hora TEXT NOT NULL, guardia TEXT NOT NULL, turno TEXT NOT NULL,
+                tipo_ingreso TEXT, observaciones TEXT, instante INTEGER)''')
+            conn.execute("CREATE INDEX IF NOT EXISTS archivo.idx_registro_instante ON registro_ingresos (instante)")
+            conn.execute(f'''INSERT OR IGNORE INTO archivo.registro_ingresos ({_COLUMNAS})
+                SELECT {_COLUMNAS} FROM main.registro_ingresos WHERE instante >= ? AND instante < ?''',
+                         (desde, hasta))
+            movidas = conn.execute("DELETE FROM main.registro_ingresos WHERE instante >= ? AND instante < ?",
+                                   (desde, hasta)).rowcount
+    finally:
+        db.conexion().execute("DETACH DATABASE archivo")
+    return movidas
+
+
+def archivar(conservar=CONSERVAR_MESES, hoy=None):
+    """Archiva los meses cerrados, dejando `conservar` meses además del actual.
+
+    Retorna [(mes, filas movidas)]. `hoy` ('AAAA-MM-DD') permite fijar la fecha.
+    """
+    if hoy is None:
+        hoy = datetime.now(horario.CHILE_TZ).strftime('%Y-%m-%d')
+    limite = _mes_anterior(hoy[:7], conservar)   # primer mes que se queda en la base
+
+    archivados = []
+    while True:
+        # Siempre el mes más antiguo que queda, así no se crean archivos vacíos
+        primera = db.conexion().execute("SELECT MIN(instante) FROM registro_ingresos").fetchone()[0]
+        if primera is None:
+            return archivados
+        primera = horario.hora_local(primera)
+        if primera[:7] >= limite:
+            return archivados
+        archivados.append((primera[:7], _archivar_mes(primera[:7])))
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mueve los meses cerrados de registro_ingresos a archivos mensuales.")
+    parser.add_argument('--conservar', type=int, default=CONSERVAR_MESES,
+                        help=f"meses cerrados que quedan en la base principal (por defecto {CONSERVAR_MESES})")
+    parser.add_argument('--listar', action='store_true', help="solo muestra los meses archivados")
+    parser.add_argument('--vacuum', action='store_true', help="compacta la base principal después de archivar")
+    parser.add_argument('--db', help="ruta de la base de datos (por defecto CONTROL_ACCESO_DB)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.configurar(args.db)
+    migraciones.migrar()
+
+    if not args.listar:
+        for mes, movidas in archivar(args.conservar):
+            print(f"{mes}: {movidas} ingresos archivados")
+        if args.vacuum:
+            db.conexion().execute("VACUUM")
+    for mes in meses_archivados():
+        print(f"  {ruta_mes(mes)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
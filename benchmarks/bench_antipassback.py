@@ -0,0 +1,102 @@
+"""Regla anti-passback: ventana en memoria vs consulta al registro (antipassback.py).
+
+Para varios tamaños del registro de ingresos, con el mismo padrón (cada
+vehículo o persona acumula más ingresos a medida que crece el registro),
+genera una base con benchmarks/generador.py, registra una ráfaga de
+ingresos recientes y mide:
+
+- la carga de la ventana desde idx_registro_instante,
+- ingreso_reciente para identificadores al azar (la mitad con un ingreso
+  reciente), que es lo que se agrega a cada confirmación en portería,
+- la consulta equivalente sobre el registro: MAX(instante) del
+  identificador con idx_registro_identificador.
+
+Comprueba que las dos den la misma respuesta.
+
+Uso:
+    python benchmarks/bench_antipassback.py --tamanos 10000,100000,1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import antipassback  # noqa: E402
+import db  # noqa: E402
+import datos  # noqa: E402
+import generador  # noqa: E402
+import horario  # noqa: E402
+
+_SQL_ULTIMO = "SELECT MAX(instante) FROM registro_ingresos WHERE identificador = ? AND tipo_registro = ?"
+
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def medir(funcion, consultas):
+    tiempos, respuestas = [], []
+    for tipo_registro, identificador in consultas:
+        inicio = time.perf_counter()
+        respuestas.append(funcion(tipo_registro, identificador))
+        tiempos.append((time.perf_counter() - inicio) * 1e6)
+    return tiempos, respuestas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', default='10000,100000,1000000', help="ingresos en el registro, separados por coma")
+    parser.add_argument('--vehiculos', type=int, default=2000)
+    parser.add_argument('--personas', type=int, default=5000)
+    parser.add_argument('--por-dia', type=int, default=3000, help="ingresos por día del historial")
+    parser.add_argument('--recientes', type=int, default=500, help="ingresos de la ráfaga reciente")
+    parser.add_argument('--consultas', type=int, default=5000)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix='antipassback_')
+    segundos = int(antipassback.MINUTOS * 60)
+    print(f"Ventana de {antipassback.MINUTOS:g} min, {args.vehiculos} vehículos, {args.personas} personas, "
+          f"{args.recientes} ingresos recientes, {args.consultas} consultas (tiempos en µs)\n")
+    print(f"{'ingresos':>10}{'por id':>8}{'carga':>10}{'ventana p50':>13}{'p99':>8}{'SQL p50':>10}{'p99':>8}")
+    for tamano in (int(t) for t in args.tamanos.split(',')):
+        db.configurar(os.path.join(carpeta, f'ingresos_{tamano}.db'))
+        generador.poblar(args.vehiculos, args.personas, tamano, dias=max(1, tamano // args.por_dia))
+        conn = db.conexion()
+        padron = ([('VEHICULO', p) for p, in conn.execute("SELECT patente FROM vehiculos")]
+                  + [('PERSONA', r) for r, in conn.execute("SELECT rut FROM personas")])
+
+        rnd = random.Random(generador.SEMILLA)
+        recientes = rnd.sample(padron, args.recientes)
+        for tipo_registro, identificador in recientes:
+            datos.registrar_ingreso(tipo_registro, identificador, "", "", "BENCH", datos.determinar_turno())
+        consultas = [rnd.choice(recientes) if rnd.random() < 0.5 else rnd.choice(padron)
+                     for _ in range(args.consultas)]
+
+        ahora = horario.ahora()[1]
+        inicio = time.perf_counter()
+        antipassback._Ventana(segundos).cargar(conn, ahora)
+        carga = (time.perf_counter() - inicio) * 1e6
+
+        ventana, en_ventana = medir(antipassback.ingreso_reciente, consultas)
+        sql, ultimos = medir(lambda t, i: conn.execute(_SQL_ULTIMO, (i, t)).fetchone()[0], consultas)
+        limite = horario.ahora()[1] - segundos
+        distintas = sum((a is not None) != (b is not None and b >= limite) for a, b in zip(en_ventana, ultimos))
+        if distintas:
+            sys.exit(f"{tamano} ingresos: {distintas} respuestas distintas entre la ventana y el registro")
+
+        print(f"{tamano:>10}{tamano / len(padron):>8.0f}{carga:>10.0f}"
+              f"{statistics.median(ventana):>13.1f}{_percentil(ventana, 0.99):>8.1f}"
+              f"{statistics.median(sql):>10.1f}{_percentil(sql, 0.99):>8.1f}")
+        db.cerrar_conexiones()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Registro de ingresos directo vs cola de escritura diferida (cola_ingresos.py).
+
+Simula un cambio de turno: N guardias (un hilo cada uno, como las sesiones
+de Streamlit) registran ingresos a la vez. Mide cuánto espera el guardia en
+registrar_ingreso, los ingresos por segundo y las transacciones hechas, con
+synchronous NORMAL y FULL. Después comprueba la garantía de la cola: un
+proceso que encola ingresos y muere sin vaciarla no pierde ninguno ni los
+duplica al recuperarse.
+
+Uso:
+    python benchmarks/bench_cola_ingresos.py --guardias 16 --ingresos 200
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import cola_ingresos  # noqa: E402
+import db  # noqa: E402
+import datos  # noqa: E402
+import metricas  # noqa: E402
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def correr(carpeta, nombre, cola, synchronous, guardias, ingresos):
+    db.configurar(os.path.join(carpeta, f"{nombre}.db"), synchronous=synchronous)
+    cola_ingresos.ACTIVA = cola
+    datos.init_db()
+    nombres = datos.obtener_guardias_activos()
+    latencias = []
+    lock = threading.Lock()
+    barrera = threading.Barrier(guardias)
+
+    def guardia(n):
+        propias = []
+        barrera.wait()
+        for i in range(ingresos):
+            inicio = time.perf_counter()
+            datos.registrar_ingreso("VEHICULO", f"BC{n:02d}{i:02d}"[:6], "RESIDENTE", "101",
+                                    nombres[n % len(nombres)], "Día (8:00-20:00)", "Residente")
+            propias.append((time.perf_counter() - inicio) * 1000)
+        with lock:
+            latencias.extend(propias)
+
+    hilos = [threading.Thread(target=guardia, args=(n,)) for n in range(guardias)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    cola_ingresos.esperar()
+    total = time.perf_counter() - inicio
+
+    escritos = db.conexion().execute("SELECT COUNT(*) FROM registro_ingresos").fetchone()[0]
+    assert escritos == guardias * ingresos, (escritos, guardias * ingresos)
+    # Sin cola, cada ingreso es su propia transacción
+    transacciones = metricas.resumen().get('cola:lote', {}).get('total', 0) if cola else escritos
+    metricas.reiniciar()
+    cola_ingresos.detener()
+    db.cerrar_conexiones()
+    return latencias, escritos / total, transacciones
+
+
+def verificar_recuperacion(carpeta, ingresos):
+    """Un proceso encola y muere sin vaciar la cola; el siguiente init_db() los recupera."""
+    ruta = os.path.join(carpeta, 'caida.db')
+    hijo = f'''
+import os, sys
+sys.path.insert(0, {RAIZ!r})
+import cola_ingresos, db, datos
+db.configurar({ruta!r})
+datos.init_db()
+cola_ingresos.ACTIVA = True
+cola_ingresos.ESPERA_MS = 60000   # que el escritor no alcance a escribir
+for i in range({ingresos}):
+    datos.registrar_ingreso("PERSONA", f"{{i}}-K", "VISITA", "101", "GUARDIA", "Día (8:00-20:00)", "Visita")
+os._exit(0)                         # sin atexit: como una caída
+'''
+    subprocess.run([sys.executable, '-c', hijo], check=True)
+    db.configurar(ruta)
+    antes = db.conexion().execute("SELECT COUNT(*) FROM registro_ingresos").fetchone()[0]
+    datos.init_db()
+    despues = db.conexion().execute("SELECT COUNT(*) FROM registro_ingresos").fetchone()[0]
+    cola_ingresos._revisadas.clear()
+    datos.init_db()   # una segunda recuperación no debe duplicar
+    final = db.conexion().execute("SELECT COUNT(*) FROM registro_ingresos").fetchone()[0]
+    db.cerrar_conexiones()
+    return antes, despues, final
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guardias', type=int, default=16)
+    parser.add_argument('--ingresos', type=int, default=200, help="ingresos por guardia")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix='bench_cola_')
+    print(f"{args.guardias} guardias x {args.ingresos} ingresos\n")
+    print(f"{'modo':<10}{'synchronous':<13}{'p50':>9}{'p95':>9}{'p99':>9}{'ingresos/s':>12}{'transacciones':>15}")
+    for synchronous in ('NORMAL', 'FULL'):
+        for nombre, cola in (('directo', False), ('cola', True)):
+            latencias, por_segundo, transacciones = correr(carpeta, f"{nombre}_{synchronous}", cola, synchronous,
+                                                           args.guardias, args.ingresos)
+            print(f"{nombre:<10}{synchronous:<13}{percentil(latencias, 50):>7.2f}ms{percentil(latencias, 95):>7.2f}ms"
+                  f"{percentil(latencias, 99):>7.2f}ms{por_segundo:>12.0f}{transacciones:>15}")
+
+    antes, despues, final = verificar_recuperacion(carpeta, 500)
+    print(f"\nCaída con 500 ingresos en cola: {antes} en la base al morir, {despues} tras recuperar, "
+          f"{final} tras recuperar otra vez")
+
+
+if __name__ == '__main__':
+    main()
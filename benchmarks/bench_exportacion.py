@@ -0,0 +1,110 @@
+"""Benchmark de exportación de registro_ingresos: CSV vs Parquet.
+
+Compara, para el mismo rango, el camino anterior de la pestaña Registros
+(read_sql_query + to_csv), el CSV por lotes, el CSV gzip y el Parquet
+tipado: tiempo de generación, tamaño y tiempo de lectura posterior con
+pandas. Mide también la exportación incremental para auditoría, completa y
+después de un día más de ingresos.
+
+Uso:
+    python benchmarks/bench_exportacion.py --filas 500000
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import db  # noqa: E402
+import datos  # noqa: E402
+import exportacion  # noqa: E402
+import horario  # noqa: E402
+
+TIPOS_INGRESO = ("Residente", "Visita", "Delivery", "Servicio técnico")
+
+
+def insertar(desde, cantidad, paso, rnd):
+    guardias = datos.obtener_guardias_activos()
+    registros = []
+    for i in range(cantidad):
+        instante = desde + timedelta(seconds=i * paso)
+        vehiculo = rnd.random() < 0.6
+        registros.append((
+            "VEHICULO" if vehiculo else "PERSONA",
+            f"{rnd.choice('BCDFGHJKLPRSTVWXYZ')}{rnd.choice('BCDFGHJKLPRSTVWXYZ')}{rnd.randrange(1000, 9999)}"
+            if vehiculo else f"{rnd.randrange(5000000, 25000000)}-{rnd.randrange(10)}",
+            f"RESIDENTE {rnd.randrange(2000)}", str(rnd.randrange(101, 2020)),
+            instante.strftime('%Y-%m-%d %H:%M:%S'), rnd.choice(guardias),
+            "Día (8:00-20:00)" if 8 <= instante.hour < 20 else "Noche (20:00-8:00)",
+            rnd.choice(TIPOS_INGRESO), ""))
+    for inicio in range(0, len(registros), 50000):
+        with db.transaccion() as conn:
+            conn.executemany('''INSERT INTO registro_ingresos (tipo_registro, identificador, nombre_persona, depto,
+                                fecha_hora, guardia, turno, tipo_ingreso, observaciones)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', registros[inicio:inicio + 50000])
+    with db.transaccion() as conn:
+        horario.completar_instantes(conn)
+    return desde + timedelta(seconds=cantidad * paso)
+
+
+def medir(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=500000, help="ingresos en el rango exportado")
+    parser.add_argument('--dias', type=int, default=365)
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    db.configurar(os.path.join(carpeta, 'exportacion.db'))
+    datos.init_db()
+    rnd = random.Random(7)
+    inicio = datetime(2025, 1, 1)
+    paso = args.dias * 86400 / args.filas
+    fin = insertar(inicio, args.filas, paso, rnd)
+    desde, hasta = inicio.strftime('%Y-%m-%d'), (fin - timedelta(seconds=1)).strftime('%Y-%m-%d')
+    sql, params = datos.consulta_registros_rango(desde, hasta)
+    print(f"{args.filas} ingresos entre {desde} y {hasta}\n")
+
+    def anterior():
+        df = pd.read_sql_query(sql, db.conexion(), params=params)
+        return io.BytesIO(df.to_csv(index=False).encode('utf-8'))
+
+    formatos = [
+        ("to_csv (anterior)", anterior, lambda b: pd.read_csv(b)),
+        ("CSV por lotes", lambda: exportacion.archivo_csv(sql, params), lambda b: pd.read_csv(b)),
+        ("CSV gzip", lambda: exportacion.archivo_csv(sql, params, comprimir=True),
+         lambda b: pd.read_csv(b, compression='gzip')),
+        ("Parquet zstd", lambda: exportacion.archivo_parquet(sql, params), lambda b: pd.read_parquet(b)),
+    ]
+    print(f"{'formato':<20}{'genera':>10}{'tamaño':>12}{'lectura':>10}  tipo de fecha_hora al leer")
+    for nombre, generar, leer in formatos:
+        archivo, t_generar = medir(generar)
+        tamano = archivo.getbuffer().nbytes
+        df, t_leer = medir(lambda: leer(archivo))
+        print(f"{nombre:<20}{t_generar * 1000:>8.0f}ms{tamano / 1e6:>10.1f}MB{t_leer * 1000:>8.0f}ms  "
+              f"{df['fecha_hora'].dtype}")
+
+    destino = os.path.join(carpeta, 'auditoria')
+    escritas, t_completa = medir(lambda: exportacion.exportar_parquet(destino))
+    print(f"\nExportación de auditoría completa: {escritas['registro_ingresos']} ingresos en {t_completa * 1000:.0f} ms")
+    insertar(fin, int(86400 / paso), paso, rnd)
+    escritas, t_incremental = medir(lambda: exportacion.exportar_parquet(destino))
+    print(f"Exportación incremental (1 día más): {escritas['registro_ingresos']} ingresos en "
+          f"{t_incremental * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark de los filtros por fecha sobre un registro_ingresos sintético.
+
+Compara tres filtros: DATE(fecha_hora) = ? / BETWEEN (recorre toda la
+tabla), el rango semiabierto de texto sobre fecha_hora con el índice
+idx_registro_fecha que existía antes de la migración 12, y el rango de
+enteros sobre instante (idx_registro_instante) que usa
+datos.consulta_registros_rango. También informa el tamaño de ambos índices.
+
+Uso:
+    python benchmarks/bench_registros_fechas.py --filas 2000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import datos  # noqa: E402
+import horario  # noqa: E402
+
+CONSULTA_ANTERIOR_DIA = '''SELECT tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso
+    FROM registro_ingresos WHERE DATE(fecha_hora) = ? ORDER BY fecha_hora DESC'''
+CONSULTA_ANTERIOR_RANGO = '''SELECT tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso
+    FROM registro_ingresos WHERE DATE(fecha_hora) BETWEEN ? AND ? ORDER BY fecha_hora DESC'''
+CONSULTA_TEXTO = '''SELECT tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso
+    FROM registro_ingresos WHERE fecha_hora >= ? AND fecha_hora < ? ORDER BY fecha_hora DESC'''
+
+
+def poblar(filas, dias):
+    fin = datetime(2026, 1, 1)
+    inicio = fin - timedelta(days=dias)
+    paso = (fin - inicio).total_seconds() / filas
+    rnd = random.Random(42)
+    lote = 50000
+    for desde in range(0, filas, lote):
+        registros = []
+        # El registro es append-only: los ingresos llegan en orden cronológico
+        for i in range(desde, min(desde + lote, filas)):
+            momento = inicio + timedelta(seconds=int(i * paso))
+            tipo = rnd.choice(("VEHICULO", "PERSONA"))
+            turno = "Día (8:00-20:00)" if 8 <= momento.hour < 20 else "Noche (20:00-8:00)"
+            registros.append((tipo, f"ID{rnd.randrange(20000):05d}", "RESIDENTE", str(rnd.randrange(300)),
+                              momento.strftime('%Y-%m-%d %H:%M:%S'), "GUARDIA", turno, "Residente", ""))
+        with db.transaccion() as conn:
+            conn.executemany('''INSERT INTO registro_ingresos (tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso, observaciones)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', registros)
+    with db.transaccion() as conn:
+        horario.completar_instantes(conn)
+    return fin - timedelta(days=1)
+
+
+def medir(conn, sql, params, repeticiones):
+    mejores = []
+    filas = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        filas = len(conn.execute(sql, params).fetchall())
+        mejores.append(time.perf_counter() - inicio)
+    return min(mejores), filas
+
+
+def plan(conn, sql, params):
+    return "; ".join(fila[-1] for fila in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def tamano_indice(conn, nombre):
+    """Bytes del índice, o None si SQLite no trae dbstat."""
+    try:
+        return conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (nombre,)).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=2_000_000)
+    parser.add_argument('--dias', type=int, default=365, help="días cubiertos por el registro")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    db.configurar(os.path.join(tempfile.mkdtemp(prefix='bench_fechas_'), 'bench.db'))
+    datos.init_db()
+    conn = db.conexion()
+
+    print(f"Generando {args.filas:,} ingresos en {args.dias} días...")
+    t0 = time.perf_counter()
+    ultimo_dia = poblar(args.filas, args.dias)
+    # El índice de texto anterior a idx_registro_instante, para comparar
+    conn.execute("CREATE INDEX idx_registro_fecha ON registro_ingresos (fecha_hora)")
+    conn.execute("ANALYZE")
+    print(f"  listo en {time.perf_counter() - t0:.1f}s")
+
+    dia = ultimo_dia.strftime('%Y-%m-%d')
+    semana_inicio = (ultimo_dia - timedelta(days=6)).strftime('%Y-%m-%d')
+    siguiente = (ultimo_dia + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    casos = [
+        ("Hoy", (CONSULTA_ANTERIOR_DIA, [dia]), (CONSULTA_TEXTO, [dia, siguiente]), datos.consulta_registros_rango(dia, dia)),
+        ("Últimos 7 días", (CONSULTA_ANTERIOR_RANGO, [semana_inicio, dia]), (CONSULTA_TEXTO, [semana_inicio, siguiente]),
+         datos.consulta_registros_rango(semana_inicio, dia)),
+    ]
+    print(f"{'consulta':<16}{'filas':>8}{'DATE()':>12}{'texto':>12}{'instante':>12}")
+    for nombre, *variantes in casos:
+        tiempos, filas = [], set()
+        for sql, params in variantes:
+            segundos, cantidad = medir(conn, sql, params, args.repeticiones)
+            tiempos.append(segundos)
+            filas.add(cantidad)
+        assert len(filas) == 1, filas
+        print(f"{nombre:<16}{filas.pop():>8}" + "".join(f"{t * 1000:>10.1f}ms" for t in tiempos))
+        for etiqueta, (sql, params) in zip(("DATE()", "texto", "instante"), variantes):
+            print(f"  plan {etiqueta + ':':<10}{plan(conn, sql, params)}")
+
+    for nombre in ("idx_registro_fecha", "idx_registro_instante"):
+        tamano = tamano_indice(conn, nombre)
+        print(f"{nombre}: {'sin dbstat' if tamano is None else f'{tamano / 2**20:.1f} MB'}")
+
+    db.cerrar_conexiones()
+
+
+if __name__ == '__main__':
+    main()
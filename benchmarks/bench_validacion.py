@@ -0,0 +1,115 @@
+"""Validación de RUT y patentes: por fila vs por columna (validacion.py).
+
+Arma una columna de RUT y otra de patentes como las de una planilla de
+importación (válidos con y sin puntos, dígitos verificadores errados y
+basura) y compara la validación anterior fila por fila (tres regex por
+patente, ciclo con el módulo 11 por RUT), las funciones por valor de
+validacion.py y sus variantes vectorizadas. Comprueba que las tres den el
+mismo resultado.
+
+Uso:
+    python benchmarks/bench_validacion.py --filas 500000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import generador  # noqa: E402
+import validacion  # noqa: E402
+
+
+def validar_patente_anterior(patente):
+    patente = patente.replace("-", "").replace(" ", "").upper()
+    return any(re.match(p, patente) for p in [r'^[A-Z]{4}\d{2}$', r'^[A-Z]{2}\d{4}$', r'^[A-Z]{2}\d{2}\d{2}$'])
+
+
+def validar_rut_anterior(rut):
+    rut = rut.replace(".", "").replace("-", "").upper()
+    if len(rut) < 2:
+        return False
+    rut_num = rut[:-1]
+    dv = rut[-1]
+    if not rut_num.isdigit():
+        return False
+    suma = 0
+    multiplo = 2
+    for r in reversed(rut_num):
+        suma += int(r) * multiplo
+        multiplo += 1
+        if multiplo == 8:
+            multiplo = 2
+    dvr = 11 - suma % 11
+    dvr = '0' if dvr == 11 else 'K' if dvr == 10 else str(dvr)
+    return dv == dvr
+
+
+def columnas(filas, rnd):
+    ruts, patentes = [], []
+    for _ in range(filas):
+        numero = rnd.randrange(1_000_000, 26_000_000)
+        azar = rnd.random()
+        if azar < 0.7:
+            ruts.append(generador.rut(numero, puntos=rnd.random() < 0.3))
+        elif azar < 0.9:
+            ruts.append(f"{numero}-{rnd.choice('0123456789K')}")
+        else:
+            ruts.append(rnd.choice(("", "SIN RUT", f"{numero}", "12.345.678", "K-K")))
+        azar = rnd.random()
+        if azar < 0.9:
+            patentes.append(generador.patente(rnd, rnd.choice(generador.FORMATOS_PATENTE)))
+        else:
+            patentes.append(rnd.choice(("", "ABC123", "AB12345", "1234AB", "BCDF1")))
+    return ruts, patentes
+
+
+def medir(funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=500000)
+    args = parser.parse_args()
+
+    ruts, patentes = columnas(args.filas, random.Random(generador.SEMILLA))
+    serie_ruts, serie_patentes = pd.Series(ruts), pd.Series(patentes)
+
+    casos = [
+        ("RUT", [
+            ("por fila (anterior)", lambda: [validar_rut_anterior(r) for r in ruts]),
+            ("por fila (validar_rut)", lambda: [validacion.validar_rut(r) for r in ruts]),
+            ("por columna (validar_ruts)", lambda: validacion.validar_ruts(serie_ruts).tolist()),
+        ]),
+        ("patente", [
+            ("por fila (anterior)", lambda: [validar_patente_anterior(p) for p in patentes]),
+            ("por fila (validar_patente)", lambda: [validacion.validar_patente(p) for p in patentes]),
+            ("por columna (validar_patentes)", lambda: validacion.validar_patentes(serie_patentes).tolist()),
+        ]),
+    ]
+    print(f"{args.filas} valores por columna\n")
+    print(f"{'columna':<10}{'variante':<34}{'tiempo':>10}{'valores/s':>14}{'válidos':>10}")
+    for columna, variantes in casos:
+        referencia = None
+        for nombre, validar in variantes:
+            resultado, segundos = medir(validar)
+            if referencia is None:
+                referencia = resultado
+            elif resultado != referencia:
+                distintos = sum(a != b for a, b in zip(resultado, referencia))
+                sys.exit(f"{columna} {nombre}: {distintos} resultados distintos de la validación anterior")
+            print(f"{columna:<10}{nombre:<34}{segundos * 1000:>8.0f}ms{args.filas / segundos:>14,.0f}"
+                  f"{sum(resultado):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Prueba de carga de la API de portería (api.py).
+
+Genera una base sintética con benchmarks/generador.py, levanta api.py en un
+proceso aparte y lo carga con N clientes concurrentes (conexiones HTTP/1.1
+persistentes sobre asyncio, como una barrera o cámara que consulta sin
+parar). Informa pedidos por segundo y latencias p50/p95/p99 de las
+búsquedas de patente y RUT para cada nivel de concurrencia, y al final una
+mezcla con registro de ingresos.
+
+Uso:
+    python benchmarks/carga_api.py --concurrencia 1,8,32,64 --segundos 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import db  # noqa: E402
+import datos  # noqa: E402
+import generador  # noqa: E402
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def pedir(lector, escritor, metodo, camino, cuerpo=None):
+    """Un pedido HTTP/1.1 sobre la conexión abierta; retorna (estado, cuerpo)."""
+    datos_cuerpo = json.dumps(cuerpo).encode() if cuerpo is not None else b""
+    escritor.write(f"{metodo} {camino} HTTP/1.1\r\nHost: api\r\nContent-Type: application/json\r\n"
+                   f"Content-Length: {len(datos_cuerpo)}\r\n\r\n".encode() + datos_cuerpo)
+    encabezados = (await lector.readuntil(b"\r\n\r\n")).decode('latin-1').split("\r\n")
+    estado = int(encabezados[0].split()[1])
+    largo = next(int(linea.split(":", 1)[1]) for linea in encabezados if linea.lower().startswith("content-length"))
+    return estado, await lector.readexactly(largo)
+
+
+async def cliente(puerto, pedidos, hasta, latencias, errores):
+    lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+    try:
+        while time.perf_counter() < hasta:
+            metodo, camino, cuerpo, esperados = next(pedidos)
+            inicio = time.perf_counter()
+            estado, _ = await pedir(lector, escritor, metodo, camino, cuerpo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if estado not in esperados:
+                errores.append(estado)
+    finally:
+        escritor.close()
+
+
+async def cargar(puerto, pedidos, concurrencia, segundos):
+    latencias, errores = [], []
+    hasta = time.perf_counter() + segundos
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(puerto, pedidos, hasta, latencias, errores) for _ in range(concurrencia)))
+    return len(latencias) / (time.perf_counter() - inicio), latencias, errores
+
+
+def ciclo(rnd, opciones):
+    while True:
+        yield rnd.choice(opciones)
+
+
+def esperar_api(puerto, proceso):
+    for _ in range(200):
+        if proceso.poll() is not None:
+            sys.exit("api.py terminó antes de empezar")
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    sys.exit("api.py no respondió")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrencia', default="1,8,32,64", help="clientes simultáneos, separados por coma")
+    parser.add_argument('--segundos', type=float, default=10, help="duración de cada nivel")
+    parser.add_argument('--vehiculos', type=int, default=5000)
+    parser.add_argument('--personas', type=int, default=15000)
+    parser.add_argument('--ingresos', type=int, default=300000)
+    args = parser.parse_args()
+
+    ruta = os.path.join(tempfile.mkdtemp(prefix='carga_api_'), 'api.db')
+    db.configurar(ruta)
+    generador.poblar(args.vehiculos, args.personas, args.ingresos)
+    conn = db.conexion()
+    patentes = [fila[0] for fila in conn.execute("SELECT patente FROM vehiculos WHERE estado_autorizacion = 'AUTORIZADO'")]
+    ruts = [fila[0] for fila in conn.execute("SELECT rut FROM personas")]
+    guardia = datos.obtener_guardias_activos()[0]
+    db.cerrar_conexiones()
+
+    rnd = random.Random(generador.SEMILLA)
+    consultas = ([("GET", f"/vehiculos/{datos.normalizar_patente(p)}", None, (200,)) for p in rnd.sample(patentes, 500)]
+                 + [("GET", f"/personas/{datos.normalizar_rut(r)}", None, (200,)) for r in rnd.sample(ruts, 500)])
+    registros = [("POST", "/ingresos", {'tipo_registro': 'VEHICULO', 'identificador': p, 'guardia': guardia,
+                                        'tipo_ingreso': 'Residente'}, (201, 202)) for p in rnd.sample(patentes, 100)]
+
+    puerto = puerto_libre()
+    api = subprocess.Popen([sys.executable, os.path.join(RAIZ, 'api.py'), '--db', ruta, '--port', str(puerto)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_api(puerto, api)
+        # Primera pasada: guarda las patentes y RUT consultados en el padrón de la API
+        asyncio.run(cargar(puerto, ciclo(rnd, consultas), 1, 0.5))
+
+        print(f"{args.vehiculos} vehículos, {args.personas} personas, {args.ingresos} ingresos\n")
+        print(f"{'mezcla':<24}{'clientes':>9}{'pedidos/s':>12}{'p50':>9}{'p95':>9}{'p99':>9}{'errores':>9}")
+        niveles = [int(n) for n in args.concurrencia.split(",")]
+        casos = [("búsquedas", consultas, n) for n in niveles]
+        # Nueve búsquedas por cada ingreso registrado
+        casos.append(("búsquedas + ingresos", consultas + registros * 10, max(niveles)))
+        for nombre, opciones, concurrencia in casos:
+            por_segundo, latencias, errores = asyncio.run(
+                cargar(puerto, ciclo(rnd, opciones), concurrencia, args.segundos))
+            print(f"{nombre:<24}{concurrencia:>9}{por_segundo:>12.0f}{percentil(latencias, 50):>7.1f}ms"
+                  f"{percentil(latencias, 95):>7.1f}ms{percentil(latencias, 99):>7.1f}ms{len(errores):>9}")
+    finally:
+        api.terminate()
+        api.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Consultas a la base por minuto de una sesión abierta sin interacción.
+
+Antes, el reloj se actualizaba con st.rerun() cada 30 segundos, lo que
+re-ejecutaba app.py completo con todas las pestañas y sus consultas. Ahora
+el reloj, el turno, la ocupación y los ingresos de hoy son fragmentos con
+temporizador propio, y solo se dibuja la pestaña abierta.
+
+El script usa AppTest de Streamlit y cuenta las sentencias SQL de:
+
+- antes: una ejecución completa de app.py con todas las pestañas dibujadas
+  (una copia de app.py donde cada ``if tabN.open:`` pasa a ``if True:``);
+  era lo que costaba cada vuelta del refresco,
+- ahora: una ejecución completa de app.py, que solo ocurre al interactuar,
+  y la parte que corre dentro de los fragmentos, que es lo que cuesta cada
+  vuelta del temporizador. Para separarla, st.fragment se envuelve con un
+  decorador que marca las sentencias ejecutadas dentro de un fragmento.
+
+Cada caso se mide con la caché de lecturas cargada y recién vaciada (la
+vuelta en que venció CONTROL_ACCESO_CACHE_TTL), y se proyecta a un minuto
+con el intervalo de la app.
+
+Uso:
+    python benchmarks/consultas_por_sesion.py --ingresos 2000
+"""
+
+import argparse
+import functools
+import os
+import re
+import sys
+import tempfile
+import time
+from unittest import mock
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import db  # noqa: E402
+import datos  # noqa: E402
+from validacion import digito_verificador  # noqa: E402
+
+# Sentencias ejecutadas en todas las conexiones del proceso: [dentro de un fragmento]
+_sentencias = []
+_fragmentos_en_curso = []
+_segundos_fragmentos = [0.0]
+_fragment = st.fragment
+
+
+def _abrir_con_traza(abrir):
+    def envoltura(ruta):
+        conn = abrir(ruta)
+        # Las líneas "-- TRIGGER" son pasos internos de otra sentencia
+        conn.set_trace_callback(lambda sql: sql.startswith('--') or _sentencias.append(bool(_fragmentos_en_curso)))
+        return conn
+    return envoltura
+
+
+def _fragmento_marcado(func=None, **opciones):
+    """st.fragment que marca como propias las sentencias ejecutadas dentro del fragmento."""
+    def decorar(funcion):
+        @functools.wraps(funcion)
+        def marcada(*args, **kwargs):
+            _fragmentos_en_curso.append(funcion.__name__)
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                _segundos_fragmentos[0] += time.perf_counter() - inicio
+                _fragmentos_en_curso.pop()
+        return _fragment(marcada, **opciones)
+    return decorar if func is None else decorar(func)
+
+
+def contar(at, vaciar_cache):
+    """Sentencias SQL y milisegundos de una ejecución completa: (total, ms, en fragmentos, ms en fragmentos)."""
+    if vaciar_cache:
+        datos.invalidar_cache()
+    del _sentencias[:]
+    _segundos_fragmentos[0] = 0.0
+    inicio = time.perf_counter()
+    at.run()
+    segundos = time.perf_counter() - inicio
+    if at.exception:
+        sys.exit(f"La app falló: {at.exception[0].value}")
+    return len(_sentencias), segundos * 1000, sum(_sentencias), _segundos_fragmentos[0] * 1000
+
+
+def _rut(numero):
+    return f"{numero}-{digito_verificador(numero)}"
+
+
+def poblar(ingresos):
+    guardia = datos.obtener_guardias_activos()[0]
+    for i in range(200):
+        datos.agregar_vehiculo(f"BC{i:04d}", f"PROPIETARIO {i}", "", str(100 + i), "", "", "")
+        datos.agregar_persona(_rut(10000000 + i), f"PERSONA {i}", str(100 + i), "", "Residente")
+    for i in range(ingresos):
+        datos.registrar_ingreso("VEHICULO" if i % 2 else "PERSONA", f"ID{i}", f"NOMBRE {i}", "101",
+                                guardia, datos.determinar_turno(), "Residente")
+    return guardia
+
+
+def app_con_todas_las_pestanas(carpeta):
+    """Copia de app.py que dibuja todas las pestañas en cada ejecución, como antes."""
+    with open(os.path.join(RAIZ, 'app.py'), encoding='utf-8') as f:
+        codigo, reemplazos = re.subn(r'\bif tab\d\.open:', 'if True:', f.read())
+    if reemplazos != 6:
+        sys.exit(f"Se esperaban 6 pestañas en app.py y hay {reemplazos}")
+    ruta = os.path.join(carpeta, 'app_todas_las_pestanas.py')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(codigo)
+    return ruta
+
+
+def sesion(ruta, guardia):
+    at = AppTest.from_file(ruta, default_timeout=120)
+    # La pestaña Administración también se dibuja
+    at.session_state['admin_autorizado'] = True
+    at.run()
+    at.selectbox(key="guardia_select_main").set_value(guardia).run()
+    return at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ingresos', type=int, default=2000, help="ingresos de hoy en la base")
+    parser.add_argument('--intervalo', type=float, default=30, help="segundos entre actualizaciones")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp()
+    os.environ.setdefault('CONTROL_ACCESO_ADMIN_CLAVE', 'benchmark')
+    db.configurar(os.path.join(carpeta, 'consultas.db'))
+    db._abrir = _abrir_con_traza(db._abrir)
+    datos.init_db()
+    guardia = poblar(args.ingresos)
+
+    with mock.patch.object(st, 'fragment', _fragmento_marcado):
+        antes = sesion(app_con_todas_las_pestanas(carpeta), guardia)
+        ahora = sesion(os.path.join(RAIZ, 'app.py'), guardia)
+        filas = []
+        for vaciar_cache in (False, True):
+            todas, ms_todas, _, _ = contar(antes, vaciar_cache)
+            completa, ms_completa, fragmentos, ms_fragmentos = contar(ahora, vaciar_cache)
+            filas.append(("caché vencida" if vaciar_cache else "con caché", todas, ms_todas, completa, ms_completa,
+                          fragmentos, ms_fragmentos))
+
+    vueltas = 60 / args.intervalo
+    print(f"{args.ingresos} ingresos hoy; sentencias SQL y ms por ejecución\n")
+    print(f"{'':<15}{'antes: todo':>20}{'ahora: completa':>20}{'ahora: fragmentos':>20}")
+    for nombre, todas, ms_todas, completa, ms_completa, fragmentos, ms_fragmentos in filas:
+        print(f"{nombre:<15}{todas:>10}{ms_todas:>8.0f} ms{completa:>10}{ms_completa:>8.0f} ms"
+              f"{fragmentos:>10}{ms_fragmentos:>8.0f} ms")
+    print("\nAntes, cada vuelta del refresco era una ejecución completa con todas las pestañas; ahora es la "
+          "vuelta de los fragmentos y la ejecución completa solo ocurre al interactuar.")
+    print(f"Sentencias por minuto y sesión sin interacción, refrescando cada {args.intervalo:g} s:")
+    for nombre, todas, _, _, _, fragmentos, _ in filas:
+        print(f"  {nombre:<15} antes {todas * vueltas:>6.0f}   ahora {fragmentos * vueltas:>6.0f}")
+
+
+if __name__ == '__main__':
+    main()
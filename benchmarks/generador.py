@@ -0,0 +1,194 @@
+"""Datos sintéticos realistas sobre el esquema real de la aplicación.
+
+Crea la base con datos.init_db() (mismas tablas, índices, FTS y triggers que
+en producción) y la llena con:
+
+- personas con RUT válido (dígito verificador módulo 11, incluida la K),
+  guardados como los guarda la aplicación (sin puntos, con el cuerpo entero
+  y el verificador en rut_numero y rut_dv);
+- vehículos con patentes de los tres formatos que acepta validar_patente
+  (nueva BCDF12, antigua AB1234 y antigua con guiones AB-12-34), guardadas
+  normalizadas;
+- meses de registro_ingresos en ambos turnos, con más tráfico en las horas
+  punta, con su instante UTC y las estadísticas diarias calculados a partir
+  de ellos.
+
+Con la misma semilla y los mismos tamaños genera exactamente los mismos
+datos, así que dos corridas del benchmark son comparables.
+
+Uso:
+    python benchmarks/generador.py /tmp/grande.db --vehiculos 20000 --personas 50000 --ingresos 2000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import datos  # noqa: E402
+import estadisticas  # noqa: E402
+import horario  # noqa: E402
+from validacion import digito_verificador  # noqa: E402
+
+SEMILLA = 2024
+# Último día con ingresos; fijo para que los datos no dependan de cuándo se generan
+FIN = datetime(2026, 1, 1)
+LOTE = 50000
+
+# Las patentes nuevas no usan vocales ni M, N, Ñ, Q
+LETRAS_NUEVAS = "BCDFGHJKLPRSTVWXYZ"
+LETRAS_ANTIGUAS = "ABCDEFGHIJKLNPRSTUVXYZ"
+FORMATOS_PATENTE = ('nueva', 'antigua', 'guiones')
+
+NOMBRES = ("JUAN", "MARÍA", "JOSÉ", "ANA", "LUIS", "CAROLINA", "PEDRO", "CONSTANZA", "DIEGO", "FRANCISCA",
+           "MATÍAS", "VALENTINA", "CRISTÓBAL", "CATALINA", "IGNACIO", "JAVIERA", "SEBASTIÁN", "ÑUSTA")
+APELLIDOS = ("GONZÁLEZ", "MUÑOZ", "ROJAS", "DÍAZ", "PÉREZ", "SOTO", "CONTRERAS", "SILVA", "MARTÍNEZ",
+             "SEPÚLVEDA", "MORALES", "RODRÍGUEZ", "LÓPEZ", "FUENTES", "HERNÁNDEZ", "TORRES", "ARAYA", "NÚÑEZ")
+MARCAS = (("TOYOTA", "YARIS"), ("KIA", "RIO"), ("HYUNDAI", "ACCENT"), ("CHEVROLET", "SAIL"), ("SUZUKI", "SWIFT"),
+          ("NISSAN", "VERSA"), ("MAZDA", "3"), ("PEUGEOT", "208"), ("MG", "ZS"), ("CHERY", "TIGGO 2"))
+COLORES = ("BLANCO", "GRIS", "NEGRO", "ROJO", "AZUL", "PLATEADO")
+TIPOS_PERSONA = ("Residente", "Residente", "Residente", "Visita frecuente", "Personal de servicio")
+TIPOS_INGRESO = ("Residente", "Residente", "Residente", "Visita", "Delivery", "Servicio técnico")
+
+# Peso relativo de cada hora del día en los ingresos (punta de mañana y tarde)
+PESO_HORA = (1, 1, 1, 1, 1, 2, 4, 8, 10, 7, 5, 5, 6, 6, 5, 5, 6, 8, 10, 9, 6, 4, 2, 1)
+
+
+def rut(numero, puntos=False):
+    """RUT con guion y dígito verificador: '12345678-5' o '12.345.678-5'."""
+    texto = f"{numero:,}".replace(",", ".") if puntos else str(numero)
+    return f"{texto}-{digito_verificador(numero)}"
+
+
+def patente(rnd, formato):
+    if formato == 'nueva':
+        return "".join(rnd.choice(LETRAS_NUEVAS) for _ in range(4)) + f"{rnd.randrange(10, 100)}"
+    letras = rnd.choice(LETRAS_ANTIGUAS) + rnd.choice(LETRAS_ANTIGUAS)
+    numero = rnd.randrange(1000, 10000)
+    if formato == 'antigua':
+        return f"{letras}{numero}"
+    return f"{letras}-{numero // 100}-{numero % 100:02d}"
+
+
+def _nombre(rnd):
+    return f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+
+
+def _depto(rnd):
+    return f"{rnd.randrange(1, 21)}{rnd.randrange(1, 13):02d}"
+
+
+def _telefono(rnd):
+    return f"+569{rnd.randrange(10000000, 100000000)}"
+
+
+def generar_personas(rnd, cantidad):
+    """Filas de personas con RUT únicos y válidos."""
+    numeros = rnd.sample(range(5_000_000, 26_000_000), cantidad)
+    fecha = (FIN - timedelta(days=400)).strftime('%Y-%m-%d %H:%M:%S')
+    return [(rut(numero), _nombre(rnd), _depto(rnd), _telefono(rnd), rnd.choice(TIPOS_PERSONA), fecha,
+             "RESTRINGIDO" if rnd.random() < 0.02 else "AUTORIZADO", "", numero, digito_verificador(numero))
+            for numero in numeros]
+
+
+def generar_vehiculos(rnd, cantidad, ruts):
+    """Filas de vehículos con patentes únicas (sin contar los guiones) en los tres formatos."""
+    filas, vistas = [], set()
+    inicio = FIN - timedelta(days=400)
+    while len(filas) < cantidad:
+        valor = patente(rnd, rnd.choice(FORMATOS_PATENTE))
+        clave = datos.normalizar_patente(valor)
+        if clave in vistas:
+            continue
+        vistas.add(clave)
+        marca, modelo = rnd.choice(MARCAS)
+        registro = inicio + timedelta(seconds=rnd.randrange(400 * 86400))
+        filas.append((clave, _nombre(rnd), rnd.choice(ruts) if ruts else "", _depto(rnd), marca, modelo,
+                      rnd.choice(COLORES), _telefono(rnd), registro.strftime('%Y-%m-%d %H:%M:%S'),
+                      "RESTRINGIDO" if rnd.random() < 0.02 else "AUTORIZADO", ""))
+    return filas
+
+
+def _instantes(rnd, cantidad, dias):
+    """`cantidad` instantes en orden cronológico repartidos en `dias` días hasta FIN."""
+    inicio = FIN - timedelta(days=dias)
+    horas = rnd.choices(range(24), weights=PESO_HORA, k=cantidad)
+    segundos = sorted(rnd.randrange(dias) * 86400 + hora * 3600 + rnd.randrange(3600) for hora in horas)
+    return (inicio + timedelta(seconds=s) for s in segundos)
+
+
+def generar_ingresos(rnd, cantidad, dias, vehiculos, personas, guardias):
+    """Lotes de filas de registro_ingresos, en orden cronológico como en producción."""
+    lote = []
+    for instante in _instantes(rnd, cantidad, dias):
+        if rnd.random() < 0.55 and vehiculos:
+            placa, propietario, _, depto = rnd.choice(vehiculos)[:4]
+            registro = ("VEHICULO", placa, propietario, depto)
+        else:
+            rut_persona, nombre, depto = rnd.choice(personas)[:3]
+            registro = ("PERSONA", rut_persona, nombre, depto)
+        turno = "Día (8:00-20:00)" if 8 <= instante.hour < 20 else "Noche (20:00-8:00)"
+        lote.append(registro + (instante.strftime('%Y-%m-%d %H:%M:%S'), rnd.choice(guardias), turno,
+                                rnd.choice(TIPOS_INGRESO), ""))
+        if len(lote) == LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def poblar(vehiculos=2000, personas=5000, ingresos=100000, dias=180, semilla=SEMILLA):
+    """Llena la base configurada en db; retorna {tabla: filas insertadas}."""
+    rnd = random.Random(semilla)
+    datos.init_db()
+    guardias = datos.obtener_guardias_activos()
+
+    filas_personas = generar_personas(rnd, personas)
+    filas_vehiculos = generar_vehiculos(rnd, vehiculos, [fila[0] for fila in filas_personas])
+    with db.transaccion() as conn:
+        conn.executemany('''INSERT INTO personas (rut, nombre, depto, telefono, tipo, fecha_registro,
+                            estado_autorizacion, observaciones, rut_numero, rut_dv)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', filas_personas)
+        conn.executemany('''INSERT INTO vehiculos (patente, propietario, rut, depto, marca, modelo, color, telefono,
+                            fecha_registro, estado_autorizacion, observaciones)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', filas_vehiculos)
+    for lote in generar_ingresos(rnd, ingresos, dias, filas_vehiculos, filas_personas, guardias):
+        with db.transaccion() as conn:
+            conn.executemany('''INSERT INTO registro_ingresos (tipo_registro, identificador, nombre_persona, depto,
+                                fecha_hora, guardia, turno, tipo_ingreso, observaciones)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', lote)
+    with db.transaccion() as conn:
+        horario.completar_instantes(conn)
+    estadisticas.reconstruir()
+    db.conexion().execute("ANALYZE")
+    datos.invalidar_cache()
+    return {'personas': len(filas_personas), 'vehiculos': len(filas_vehiculos), 'registro_ingresos': ingresos}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('db', help="ruta de la base a crear (no debe existir)")
+    parser.add_argument('--vehiculos', type=int, default=2000)
+    parser.add_argument('--personas', type=int, default=5000)
+    parser.add_argument('--ingresos', type=int, default=100000)
+    parser.add_argument('--dias', type=int, default=180, help="días cubiertos por los ingresos, hasta el 2025-12-31")
+    parser.add_argument('--semilla', type=int, default=SEMILLA)
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} ya existe")
+    db.configurar(args.db)
+    inicio = time.perf_counter()
+    for tabla, filas in poblar(args.vehiculos, args.personas, args.ingresos, args.dias, args.semilla).items():
+        print(f"{tabla}: {filas} filas")
+    print(f"listo en {time.perf_counter() - inicio:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Tiempo de un rerun de app.py con la vista Validar Entrada abierta.
+
+Cada interacción del guardia en la portería (buscar una patente, confirmar
+un ingreso) re-ejecuta app.py. Antes se ejecutaban las seis pestañas en
+cada rerun; ahora solo la vista seleccionada. El script genera una base
+sintética con benchmarks/generador.py, abre la app con AppTest de
+Streamlit, selecciona un guardia y mide N reruns: mediana y p95 del tiempo
+y sentencias SQL por rerun.
+
+Uso:
+    python benchmarks/rerun_por_vista.py --reruns 30
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import db  # noqa: E402
+import datos  # noqa: E402
+import generador  # noqa: E402
+
+# Sentencias ejecutadas en todas las conexiones del proceso
+_sentencias = []
+
+
+def _abrir_con_traza(abrir):
+    def envoltura(ruta):
+        conn = abrir(ruta)
+        # Las líneas "-- TRIGGER" son pasos internos de otra sentencia
+        conn.set_trace_callback(lambda sql: sql.startswith('--') or _sentencias.append(sql))
+        return conn
+    return envoltura
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=30)
+    parser.add_argument('--vehiculos', type=int, default=5000)
+    parser.add_argument('--personas', type=int, default=15000)
+    parser.add_argument('--ingresos', type=int, default=300000)
+    parser.add_argument('--dias', type=int, default=30, help="días que cubren los ingresos")
+    args = parser.parse_args()
+
+    db.configurar(os.path.join(tempfile.mkdtemp(prefix='rerun_vista_'), 'rerun.db'))
+    generador.poblar(args.vehiculos, args.personas, args.ingresos, dias=args.dias)
+    guardia = datos.obtener_guardias_activos()[0]
+    db.cerrar_conexiones()
+    db._abrir = _abrir_con_traza(db._abrir)
+
+    at = AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=120)
+    at.run()
+    at.selectbox(key="guardia_select_main").set_value(guardia).run()
+    if at.exception:
+        sys.exit(f"La app falló: {at.exception[0].value}")
+
+    tiempos, sentencias = [], []
+    for _ in range(args.reruns):
+        del _sentencias[:]
+        inicio = time.perf_counter()
+        at.run()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        sentencias.append(len(_sentencias))
+    if at.exception:
+        sys.exit(f"La app falló: {at.exception[0].value}")
+
+    tiempos.sort()
+    print(f"{args.vehiculos} vehículos, {args.personas} personas, {args.ingresos} ingresos en {args.dias} días")
+    print(f"{args.reruns} reruns en Validar Entrada: mediana {statistics.median(tiempos):.0f} ms, "
+          f"p95 {tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]:.0f} ms, "
+          f"{statistics.median(sentencias):.0f} sentencias SQL por rerun")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Prueba de estrés: varios guardias registrando ingresos mientras se consulta Registros.
+
+Simula N sesiones de guardia (un hilo cada una, igual que Streamlit ejecuta
+cada sesión en su propio hilo) que llaman a registrar_ingreso, y M lectores
+que consultan la pestaña Registros en paralelo. Informa ingresos por segundo,
+latencias y cualquier error "database is locked".
+
+Uso:
+    python benchmarks/stress_concurrencia.py --guardias 8 --ingresos 200
+    python benchmarks/stress_concurrencia.py --modo rollback   # comparar
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import datos  # noqa: E402
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guardias', type=int, default=8, help="sesiones de guardia escribiendo")
+    parser.add_argument('--lectores', type=int, default=4, help="sesiones consultando Registros")
+    parser.add_argument('--ingresos', type=int, default=200, help="ingresos por guardia")
+    parser.add_argument('--modo', choices=db.MODOS_VALIDOS, default=db.MODO_CONCURRENCIA)
+    parser.add_argument('--synchronous', default=db.SYNCHRONOUS)
+    parser.add_argument('--busy-timeout-ms', type=int, default=db.BUSY_TIMEOUT_MS)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='stress_acceso_')
+    db.configurar(os.path.join(directorio, 'stress.db'), modo=args.modo,
+                  synchronous=args.synchronous, busy_timeout_ms=args.busy_timeout_ms)
+    datos.init_db()
+
+    hoy = datetime.now(datos.CHILE_TZ)
+    desde = (hoy - timedelta(days=7)).strftime('%Y-%m-%d')
+    hasta = hoy.strftime('%Y-%m-%d')
+
+    latencias_escritura, latencias_lectura, errores = [], [], []
+    lock = threading.Lock()
+    escritores_activos = threading.Event()
+    escritores_activos.set()
+
+    def guardia(n):
+        nombre = datos.GUARDIAS_INICIALES[n % len(datos.GUARDIAS_INICIALES)]
+        propias = []
+        for i in range(args.ingresos):
+            inicio = time.perf_counter()
+            try:
+                datos.registrar_ingreso("VEHICULO", f"GG{n:02d}{i % 100:02d}", "PRUEBA", str(n),
+                                        nombre, datos.determinar_turno(), "Residente")
+            except Exception as e:
+                with lock:
+                    errores.append(f"escritura: {e}")
+                continue
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias_escritura.extend(propias)
+
+    def lector():
+        propias = []
+        while escritores_activos.is_set():
+            inicio = time.perf_counter()
+            try:
+                datos.obtener_registros_hoy()
+                datos.obtener_registros_rango_fechas(desde, hasta)
+            except Exception as e:
+                with lock:
+                    errores.append(f"lectura: {e}")
+                continue
+            propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias_lectura.extend(propias)
+
+    escritores = [threading.Thread(target=guardia, args=(n,)) for n in range(args.guardias)]
+    lectores = [threading.Thread(target=lector) for _ in range(args.lectores)]
+
+    inicio = time.perf_counter()
+    for t in lectores + escritores:
+        t.start()
+    for t in escritores:
+        t.join()
+    duracion = time.perf_counter() - inicio
+    escritores_activos.clear()
+    for t in lectores:
+        t.join()
+
+    total = len(latencias_escritura)
+    print(f"modo={args.modo} synchronous={args.synchronous} busy_timeout={args.busy_timeout_ms}ms")
+    print(f"guardias={args.guardias} lectores={args.lectores} ingresos/guardia={args.ingresos}")
+    print(f"ingresos registrados: {total} en {duracion:.2f}s ({total / duracion:.0f}/s)")
+    print(f"escritura p50={percentil(latencias_escritura, 50) * 1000:.1f}ms "
+          f"p95={percentil(latencias_escritura, 95) * 1000:.1f}ms "
+          f"max={max(latencias_escritura, default=0) * 1000:.1f}ms")
+    print(f"consultas Registros: {len(latencias_lectura)} "
+          f"p50={percentil(latencias_lectura, 50) * 1000:.1f}ms "
+          f"p95={percentil(latencias_lectura, 95) * 1000:.1f}ms")
+    print(f"errores: {len(errores)}")
+    for error in sorted(set(errores))[:10]:
+        print(f"  {error}")
+
+    db.cerrar_conexiones()
+    return 1 if errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
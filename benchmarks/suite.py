@@ -0,0 +1,167 @@
+"""Suite de benchmarks de las operaciones de portería a varios tamaños de base.
+
+Para cada tamaño crea una base temporal con benchmarks/generador.py (misma
+semilla, mismos datos) y mide sin interfaz las operaciones del día a día:
+búsqueda de vehículo y persona (con y sin el padrón en memoria), registro
+de ingresos, consultas de Registros por rango y los filtros de los
+listados. Informa mediana y p95 de cada operación y, con --json, guarda el
+informe para compararlo después con --comparar.
+
+Uso:
+    python benchmarks/suite.py                                  # tamaños chico, mediano y grande
+    python benchmarks/suite.py --tamanos chico --json antes.json
+    python benchmarks/suite.py --tamanos chico --comparar antes.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import datos  # noqa: E402
+import generador  # noqa: E402
+
+# nombre -> (vehículos, personas, ingresos, días)
+TAMANOS = {
+    'chico': (500, 1000, 20000, 60),
+    'mediano': (5000, 15000, 300000, 180),
+    'grande': (20000, 50000, 2000000, 365),
+}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir(funcion, argumentos, preparar=None):
+    """Milisegundos de cada llamada a `funcion` con cada tupla de `argumentos`.
+
+    `preparar` se ejecuta antes de cada llamada, fuera del tiempo medido.
+    """
+    tiempos = []
+    for args in argumentos:
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcion(*args)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def operaciones(rnd, repeticiones):
+    """[(nombre, función, argumentos, preparar)] sobre la base ya poblada."""
+    conn = db.conexion()
+    patentes = [fila[0] for fila in conn.execute("SELECT patente FROM vehiculos WHERE activo = 1")]
+    ruts = [fila[0] for fila in conn.execute("SELECT rut FROM personas WHERE activo = 1")]
+    guardia = datos.obtener_guardias_activos()[0]
+    fin = generador.FIN - timedelta(days=1)
+
+    def rango(dias):
+        return [((fin - timedelta(days=dias - 1)).strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'))]
+
+    def muestra(valores):
+        return [rnd.choice(valores) for _ in range(repeticiones)]
+
+    # Lo que escribe el guardia: sin guiones, o con puntos en el RUT
+    busquedas_vehiculo = [(datos.normalizar_patente(p),) for p in muestra(patentes)]
+    busquedas_persona = [(datos.formatear_rut(r),) for r in muestra(ruts)]
+    inexistentes = [(generador.patente(rnd, 'nueva') + "9",) for _ in range(repeticiones)]
+    return [
+        ("buscar_vehiculo (padrón en memoria)", datos.buscar_vehiculo, busquedas_vehiculo, None),
+        ("buscar_vehiculo (padrón recién vaciado)", datos.buscar_vehiculo, busquedas_vehiculo[:5],
+         datos.invalidar_cache),
+        ("buscar_vehiculo inexistente", datos.buscar_vehiculo, inexistentes, None),
+        ("buscar_persona (padrón en memoria)", datos.buscar_persona, busquedas_persona, None),
+        ("registrar_ingreso", datos.registrar_ingreso,
+         [("VEHICULO", p, "BENCHMARK", "101", guardia, datos.determinar_turno(), "Residente")
+          for (p,) in busquedas_vehiculo], None),
+        ("obtener_registros_rango_fechas 1 día", datos.obtener_registros_rango_fechas, rango(1) * 5, None),
+        ("obtener_registros_rango_fechas 30 días (1000 filas)",
+         lambda desde, hasta: datos.obtener_registros_rango_fechas(desde, hasta, 1000), rango(30) * 5, None),
+        ("resumen_registros 30 días", datos.resumen_registros, rango(30) * 5, None),
+        ("listar_vehiculos página 1", datos.listar_vehiculos, [()] * 5, datos.invalidar_cache),
+        ("listar_vehiculos patente comienza con", lambda p: datos.listar_vehiculos(patente=p[:2]),
+         busquedas_vehiculo[:5], datos.invalidar_cache),
+        ("listar_vehiculos por depto", lambda d: datos.listar_vehiculos(depto=d),
+         [(generador._depto(rnd),) for _ in range(5)], datos.invalidar_cache),
+        ("listar_personas búsqueda libre", lambda texto: datos.listar_personas(busqueda=texto),
+         [(rnd.choice(generador.APELLIDOS)[:4],) for _ in range(5)], datos.invalidar_cache),
+        ("listar_personas RUT comienza con", lambda r: datos.listar_personas(rut=r[:4]),
+         busquedas_persona[:5], datos.invalidar_cache),
+    ]
+
+
+def correr(tamano, repeticiones, semilla, carpeta):
+    vehiculos, personas, ingresos, dias = TAMANOS[tamano]
+    db.configurar(os.path.join(carpeta, f"{tamano}.db"))
+    inicio = time.perf_counter()
+    generador.poblar(vehiculos, personas, ingresos, dias, semilla)
+    print(f"\n== {tamano}: {vehiculos} vehículos, {personas} personas, {ingresos} ingresos en {dias} días "
+          f"(generado en {time.perf_counter() - inicio:.1f}s)")
+    print(f"{'operación':<52}{'mediana':>10}{'p95':>10}")
+
+    rnd = random.Random(semilla)
+    resultados = {}
+    for nombre, funcion, argumentos, preparar in operaciones(rnd, repeticiones):
+        tiempos = medir(funcion, argumentos, preparar)
+        resultados[nombre] = {'mediana': percentil(tiempos, 50), 'p95': percentil(tiempos, 95),
+                              'llamadas': len(tiempos)}
+        print(f"{nombre:<52}{resultados[nombre]['mediana']:>8.2f}ms{resultados[nombre]['p95']:>8.2f}ms")
+    db.cerrar_conexiones()
+    return resultados
+
+
+def comparar(informe, anterior):
+    print(f"\nComparación con {anterior['fecha']} ({anterior['entorno']['python']}, "
+          f"SQLite {anterior['entorno']['sqlite']}); mediana anterior → actual:")
+    for tamano, resultados in informe['tamanos'].items():
+        for nombre, actual in resultados.items():
+            previo = anterior['tamanos'].get(tamano, {}).get(nombre)
+            if previo:
+                print(f"  {tamano:<8}{nombre:<52}{previo['mediana']:>8.2f} → {actual['mediana']:>8.2f} ms"
+                      f"{previo['mediana'] / max(actual['mediana'], 1e-6):>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', default=",".join(TAMANOS), help=f"separados por coma: {', '.join(TAMANOS)}")
+    parser.add_argument('--repeticiones', type=int, default=200, help="llamadas por operación rápida")
+    parser.add_argument('--semilla', type=int, default=generador.SEMILLA)
+    parser.add_argument('--json', help="guarda el informe en este archivo")
+    parser.add_argument('--comparar', help="informe JSON de una corrida anterior")
+    args = parser.parse_args()
+
+    tamanos = [t.strip() for t in args.tamanos.split(",") if t.strip()]
+    for tamano in tamanos:
+        if tamano not in TAMANOS:
+            parser.error(f"tamaño desconocido: {tamano}")
+
+    carpeta = tempfile.mkdtemp(prefix='suite_acceso_')
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                    'plataforma': platform.platform(), 'procesador': platform.processor()},
+        'semilla': args.semilla, 'repeticiones': args.repeticiones,
+        'tamanos': {tamano: correr(tamano, args.repeticiones, args.semilla, carpeta) for tamano in tamanos},
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\nInforme guardado en {args.json}")
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(informe, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""Cola de escritura diferida para registrar_ingreso (opcional).
+
+Con ``CONTROL_ACCESO_COLA_INGRESOS=1``, registrar_ingreso no escribe en la
+base desde el hilo del guardia: agrega el ingreso al final de un diario
+propio del proceso (``<base>_cola/<pid>-<id>.jsonl``) y retorna. Un hilo
+escritor junta los ingresos que llegan en ``ESPERA_MS`` (hasta ``LOTE``) y
+los inserta en una sola transacción, junto con las estadísticas diarias y
+las visitas abiertas (ocupacion.py).
+
+Garantía: cuando registrar_ingreso retorna, el ingreso está en el diario.
+Sobrevive a una caída de la aplicación igual que un COMMIT con
+``synchronous=NORMAL``; con ``CONTROL_ACCESO_SYNCHRONOUS=FULL`` el diario
+también se sincroniza a disco en cada ingreso. Cada transacción del
+escritor guarda en ``cola_ingresos`` la última secuencia aplicada, así que
+al recuperar un diario no se duplican ingresos. Los diarios de procesos que
+terminaron sin vaciar su cola se aplican al iniciar la siguiente cola sobre
+la misma base (el diario de un proceso vivo está bloqueado con flock).
+
+Si un lote falla ``INTENTOS_LOTE`` veces seguidas, se reintenta fila por
+fila: las que la base rechaza (por ejemplo, un NOT NULL sin valor) pasan a
+``ingresos_rechazados`` con el error y las demás se escriben, así que una
+fila mala no bloquea la cola. Los errores de la base que no son de la fila
+(base bloqueada, disco lleno) se siguen reintentando. Las consultas esperan
+la cola a lo sumo ``ESPERA_CONSULTAS_S``; ``viva()`` informa si el hilo
+escritor murió.
+
+Al salir, el proceso vacía la cola antes de terminar.
+"""
+
+import atexit
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+import db
+import estadisticas
+import horario
+import metricas
+import migraciones
+import ocupacion
+
+ACTIVA = os.environ.get('CONTROL_ACCESO_COLA_INGRESOS', '0').lower() in ('1', 'si', 'true')
+
+# Tiempo máximo que un ingreso espera a otros para ir en el mismo lote
+ESPERA_MS = float(os.environ.get('CONTROL_ACCESO_COLA_ESPERA_MS', '20'))
+LOTE = 200
+# Fallos seguidos de un lote antes de reintentarlo fila por fila
+INTENTOS_LOTE = 3
+# Tiempo máximo que una consulta espera a que la cola del proceso se vacíe
+ESPERA_CONSULTAS_S = float(os.environ.get('CONTROL_ACCESO_COLA_ESPERA_CONSULTAS_S', '2'))
+
+_COLUMNAS = ('tipo_registro, identificador, nombre_persona, depto, fecha_hora, '
+             'guardia, turno, tipo_ingreso, observaciones, instante')
+
+_lock = threading.Lock()
+_colas = {}  # ruta -> _Cola
+_revisadas = set()  # rutas cuyos diarios huérfanos ya se buscaron
+
+
+def carpeta_cola(ruta=None):
+    return os.path.splitext(os.path.abspath(ruta or db.obtener_ruta()))[0] + '_cola'
+
+
+def _fcntl():
+    try:
+        import fcntl
+    except ImportError:
+        raise RuntimeError("La cola de ingresos necesita fcntl (Linux o macOS); "
+                           "usar CONTROL_ACCESO_COLA_INGRESOS=0")
+    return fcntl
+
+
+def _insertar_filas(conn, filas):
+    conn.executemany(f"INSERT INTO registro_ingresos ({_COLUMNAS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     [fila for _, fila in filas])
+    for _, (tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso, _,
+            instante) in filas:
+        estadisticas.sumar_ingreso(conn, fecha_hora, turno, tipo_registro, tipo_ingreso, guardia)
+        ocupacion.entrar(conn, tipo_registro, identificador, nombre_persona, depto, fecha_hora, instante, guardia)
+
+
+def _marcar(conn, diario, secuencia):
+    conn.execute('''INSERT INTO cola_ingresos (diario, secuencia) VALUES (?, ?)
+                    ON CONFLICT (diario) DO UPDATE SET secuencia = excluded.secuencia''',
+                 (diario, secuencia))
+
+
+def _insertar(conn, diario, filas):
+    """Inserta [(secuencia, fila)] y guarda la última secuencia aplicada del diario."""
+    _insertar_filas(conn, filas)
+    _marcar(conn, diario, filas[-1][0])
+
+
+def _insertar_por_fila(conn, diario, filas):
+    """Como _insertar, pero cada fila que falla pasa a ingresos_rechazados; retorna cuántas.
+
+    Un OperationalError (base bloqueada, disco lleno) no es culpa de la fila:
+    se propaga y el lote completo se reintenta después.
+    """
+    rechazadas = []
+    for secuencia, fila in filas:
+        conn.execute("SAVEPOINT fila")
+        try:
+            _insertar_filas(conn, [(secuencia, fila)])
+        except sqlite3.OperationalError:
+            raise
+        except Exception as e:
+            conn.execute("ROLLBACK TO fila")
+            rechazadas.append((diario, secuencia, json.dumps(fila, ensure_ascii=False, default=str),
+                               f"{type(e).__name__}: {e}", int(time.time())))
+        conn.execute("RELEASE fila")
+    conn.executemany('''INSERT INTO ingresos_rechazados (diario, secuencia, fila, error, instante)
+                        VALUES (?, ?, ?, ?, ?)''', rechazadas)
+    _marcar(conn, diario, filas[-1][0])
+    for _, secuencia, fila, error, _ in rechazadas:
+        print(f"cola_ingresos: ingreso {diario}#{secuencia} rechazado ({error}): {fila}", file=sys.stderr)
+    return len(rechazadas)
+
+
+def _leer_diario(ruta):
+    """[(secuencia, fila)] del diario; una última línea cortada por una caída se ignora."""
+    filas = []
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                secuencia, *fila = json.loads(linea)
+            except ValueError:
+                break
+            if len(fila) == 9:
+                # Diario de una versión sin instante
+                fila.append(horario.instante(fila[4]))
+            filas.append((secuencia, tuple(fila)))
+    return filas
+
+
+def _recuperar(ruta_base, propio):
+    """Aplica los diarios huérfanos (de procesos que ya no existen); retorna los ingresos recuperados."""
+    fcntl = _fcntl()
+    recuperados = 0
+    for ruta in glob.glob(os.path.join(carpeta_cola(ruta_base), '*.jsonl')):
+        if ruta == propio:
+            continue
+        with open(ruta, 'a+', encoding='utf-8') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue  # el proceso dueño sigue vivo
+            diario = os.path.basename(ruta)
+            conn = db._abrir(ruta_base)
+            try:
+                fila = conn.execute("SELECT secuencia FROM cola_ingresos WHERE diario = ?", (diario,)).fetchone()
+                pendientes = [(s, fila_diario) for s, fila_diario in _leer_diario(ruta) if s > (fila[0] if fila else 0)]
+                db._con_reintentos(lambda: conn.execute("BEGIN IMMEDIATE"))
+                try:
+                    if pendientes:
+                        # Una fila que la base no acepta no debe impedir el inicio
+                        _insertar_por_fila(conn, diario, pendientes)
+                    conn.execute("DELETE FROM cola_ingresos WHERE diario = ?", (diario,))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            finally:
+                conn.close()
+            os.remove(ruta)
+            recuperados += len(pendientes)
+    return recuperados
+
+
+class _Cola:
+    """Diario y hilo escritor de una base."""
+
+    def __init__(self, ruta_base):
+        self.ruta_base = ruta_base
+        carpeta = carpeta_cola(ruta_base)
+        os.makedirs(carpeta, exist_ok=True)
+        self.diario = f"{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"
+        self.ruta_diario = os.path.join(carpeta, self.diario)
+        self.fd = os.open(self.ruta_diario, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        _fcntl().flock(self.fd, _fcntl().LOCK_EX)
+        self.recuperados = _recuperar(ruta_base, self.ruta_diario)
+
+        self.condicion = threading.Condition()
+        self.pendientes = []      # [(secuencia, fila, encolado_en)]
+        self.secuencia = 0        # última encolada
+        self.confirmada = 0       # última con COMMIT
+        self.lock_fsync = threading.Lock()
+        self.sincronizada = 0     # última con fsync del diario
+        self.detenida = False
+        self.rechazadas = 0       # filas que pasaron a ingresos_rechazados
+        self.hilo = threading.Thread(target=self._escribir, name=f"cola-ingresos-{self.diario}", daemon=True)
+        self.hilo.start()
+
+    def encolar(self, fila):
+        with self.condicion:
+            if self.detenida or not self.hilo.is_alive():
+                raise RuntimeError("La cola de ingresos está detenida")
+            self.secuencia += 1
+            secuencia = self.secuencia
+            os.write(self.fd, (json.dumps([secuencia, *fila], ensure_ascii=False) + '\n').encode('utf-8'))
+            self.pendientes.append((secuencia, fila, time.perf_counter()))
+            self.condicion.notify_all()
+        if db.SYNCHRONOUS in ('FULL', 'EXTRA'):
+            self._sincronizar(secuencia)
+        return secuencia
+
+    def _sincronizar(self, secuencia):
+        """fsync del diario hasta `secuencia`; un fsync cubre a todos los que escribieron antes."""
+        with self.lock_fsync:
+            if self.sincronizada >= secuencia:
+                return
+            with self.condicion:
+                hasta = self.secuencia
+            # fdatasync alcanza: el diario solo crece, no importa su fecha de modificación
+            getattr(os, 'fdatasync', os.fsync)(self.fd)
+            self.sincronizada = hasta
+
+    def esperar(self, secuencia=None, timeout=None):
+        """Espera el COMMIT de `secuencia` (por defecto, de todo lo encolado); retorna si se cumplió."""
+        with self.condicion:
+            objetivo = self.secuencia if secuencia is None else secuencia
+            # Si el escritor murió, no hay quién confirme: no se espera en vano
+            self.condicion.wait_for(lambda: self.confirmada >= objetivo or not self.hilo.is_alive(), timeout)
+            return self.confirmada >= objetivo
+
+    def _tomar_lote(self):
+        with self.condicion:
+            self.condicion.wait_for(lambda: self.pendientes or self.detenida)
+            if not self.pendientes:
+                return None
+            # Espera a que se junten más ingresos, salvo que el lote ya esté lleno
+            limite = self.pendientes[0][2] + ESPERA_MS / 1000
+            while len(self.pendientes) < LOTE and not self.detenida and time.perf_counter() < limite:
+                self.condicion.wait(limite - time.perf_counter())
+            lote = self.pendientes[:LOTE]
+            metricas.registrar('cola:profundidad', len(self.pendientes), unidad='ingresos')
+            return lote
+
+    def _escribir(self):
+        try:
+            self._escribir_lotes()
+        finally:
+            # Despierta a quienes esperan un COMMIT que ya no va a llegar
+            with self.condicion:
+                self.condicion.notify_all()
+
+    def _escribir_lotes(self):
+        conn = db._abrir(self.ruta_base)
+        espera_error, fallos = 0.1, 0
+        while True:
+            lote = self._tomar_lote()
+            if lote is None:
+                break
+            filas = [(secuencia, fila) for secuencia, fila, _ in lote]
+            try:
+                db._con_reintentos(lambda: conn.execute("BEGIN IMMEDIATE"))
+                try:
+                    if fallos >= INTENTOS_LOTE:
+                        rechazadas = _insertar_por_fila(conn, self.diario, filas)
+                    else:
+                        _insertar(conn, self.diario, filas)
+                        rechazadas = 0
+                    db._con_reintentos(conn.commit)
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    raise
+            except Exception as e:
+                # Los ingresos siguen en el diario y en la cola: se reintenta
+                fallos += 1
+                metricas.registrar('cola:errores', 1, unidad='errores')
+                print(f"cola_ingresos: no se pudo escribir un lote de {len(lote)} (intento {fallos}): {e}",
+                      file=sys.stderr)
+                if self.detenida:
+                    break
+                time.sleep(espera_error)
+                espera_error = min(espera_error * 2, 5)
+                continue
+            espera_error, fallos = 0.1, 0
+            if rechazadas:
+                metricas.registrar('cola:rechazados', rechazadas, unidad='ingresos')
+
+            ahora = time.perf_counter()
+            for _, _, encolado_en in lote:
+                metricas.registrar('cola:espera', (ahora - encolado_en) * 1000)
+            metricas.registrar('cola:lote', len(lote), unidad='ingresos')
+            with self.condicion:
+                del self.pendientes[:len(lote)]
+                self.confirmada = lote[-1][0]
+                self.rechazadas += rechazadas
+                if not self.pendientes:
+                    # Todo lo escrito en el diario ya está en la base
+                    os.ftruncate(self.fd, 0)
+                self.condicion.notify_all()
+        conn.close()
+
+    def detener(self):
+        with self.condicion:
+            self.detenida = True
+            self.condicion.notify_all()
+        self.hilo.join()
+        if self.pendientes:
+            return  # la base no aceptó el último lote: el diario queda para recuperarse
+        conn = db._abrir(self.ruta_base)
+        try:
+            db._con_reintentos(lambda: conn.execute("DELETE FROM cola_ingresos WHERE diario = ?", (self.diario,)))
+        finally:
+            conn.close()
+        os.close(self.fd)
+        os.remove(self.ruta_diario)
+
+# ==================== API DEL MÓDULO ====================
+
+def _cola(crear=True):
+    ruta = os.path.abspath(db.obtener_ruta())
+    cola = _colas.get(ruta)
+    if cola is None and crear:
+        with _lock:
+            cola = _colas.get(ruta)
+            if cola is None:
+                migraciones.migrar()
+                cola = _colas[ruta] = _Cola(ruta)
+                _revisadas.add(ruta)
+    return cola
+
+
+def recuperar():
+    """Aplica una vez por proceso los diarios huérfanos de la base actual.
+
+    Cubre el caso de una cola que se desactivó después de una caída:
+    init_db() lo llama aunque la cola esté apagada.
+    """
+    ruta = os.path.abspath(db.obtener_ruta())
+    if ruta in _revisadas:
+        return 0
+    with _lock:
+        if ruta in _revisadas:
+            return 0
+        recuperados = _recuperar(ruta, None) if os.path.isdir(carpeta_cola(ruta)) else 0
+        _revisadas.add(ruta)
+    return recuperados
+
+
+def encolar(fila):
+    """Agrega un ingreso (tupla en el orden de las columnas) al diario; retorna su secuencia."""
+    return _cola().encolar(fila)
+
+
+def esperar(timeout=ESPERA_CONSULTAS_S):
+    """Espera a que lo encolado por este proceso en la base actual esté en la base.
+
+    Sin cola o con la cola vacía retorna de inmediato; las consultas de
+    Registros lo llaman para ver los ingresos recién registrados. Retorna
+    False si venció `timeout` (la consulta sigue sin los ingresos en cola).
+    """
+    cola = _cola(crear=False)
+    if cola is None or cola.esperar(timeout=timeout):
+        return True
+    metricas.registrar('cola:esperas_vencidas', 1, unidad='esperas')
+    return False
+
+
+def viva():
+    """False si el hilo escritor de la base actual murió: sus ingresos quedan en el diario."""
+    cola = _cola(crear=False)
+    return cola is None or cola.detenida or cola.hilo.is_alive()
+
+
+def rechazadas():
+    """Ingresos de este proceso que la base rechazó y pasaron a ingresos_rechazados."""
+    cola = _cola(crear=False)
+    return cola.rechazadas if cola else 0
+
+
+def profundidad():
+    """Ingresos encolados que todavía no están en la base actual."""
+    cola = _cola(crear=False)
+    return len(cola.pendientes) if cola else 0
+
+
+def detener():
+    """Vacía y detiene todas las colas del proceso (se llama también al salir)."""
+    with _lock:
+        colas = list(_colas.values())
+        _colas.clear()
+    for cola in colas:
+        cola.detener()
+
+
+atexit.register(detener)
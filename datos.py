@@ -0,0 +1,471 @@
+"""Funciones de datos y validación del control de acceso.
+
+Todas las consultas pasan por la capa de conexión de ``db``; este módulo no
+depende de Streamlit, así que puede usarse desde scripts y pruebas de carga.
+"""
+
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from datetime import datetime
+import re
+
+import pandas as pd
+
+import antipassback
+import archivado
+import cola_ingresos
+import db
+import estadisticas
+import horario
+import metricas
+import migraciones
+import ocupacion
+from modelos import Guardia, Ingreso, Persona, Vehiculo
+from migraciones import GUARDIAS_INICIALES  # noqa: F401
+# Reexportadas: la interfaz, la API y la importación las toman de acá
+from validacion import (descomponer_rut, formatear_rut, normalizar_patente, normalizar_rut,  # noqa: F401
+                        rut_canonico, validar_patente, validar_rut)
+
+# Zona horaria de Chile (la interfaz y la importación la toman de acá)
+CHILE_TZ = horario.CHILE_TZ
+
+# ==================== INSTRUMENTACIÓN ====================
+# Las funciones que tocan la base se marcan con @medido y registran su
+# duración en metricas (panel de Administración), también cuando las llama
+# otra función de este módulo o cuando responde el caché.
+
+def medido(funcion):
+    return metricas.cronometrar(funcion, f"datos.{funcion.__name__}")
+
+# ==================== FUNCIONES DE BASE DE DATOS ====================
+
+@medido
+def init_db():
+    """Crea o actualiza el esquema; después de la primera llamada no hace consultas."""
+    migraciones.migrar()
+    cola_ingresos.recuperar()
+
+def determinar_turno():
+    return "Día (8:00-20:00)" if 8 <= datetime.now(CHILE_TZ).hour < 20 else "Noche (20:00-8:00)"
+
+# ==================== CACHÉ DE LECTURAS ====================
+# Guardias, vehículos y personas cambian solo cuando alguien los edita, pero
+# se leen en cada rerun de cada sesión. Las lecturas marcadas con
+# @cache_lectura(tabla) se guardan en memoria, compartidas por todas las
+# sesiones del proceso. Cada alta, baja o reactivación llama a
+# invalidar_cache(tabla), que sube la generación de esa tabla y descarta
+# solo las lecturas que salen de ella; el TTL cubre escrituras hechas por
+# otros procesos sobre la misma base.
+
+CACHE_TTL = float(os.environ.get('CONTROL_ACCESO_CACHE_TTL', '60'))
+CACHE_MAXIMO = int(os.environ.get('CONTROL_ACCESO_CACHE_MAXIMO', '256'))
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()   # (tabla, función, ruta, args) -> (guardado_en, valor), de más antigua a más reciente
+_generaciones = {}       # tabla -> invalidaciones
+_contadores = {}         # función -> [aciertos, fallos]
+
+def invalidar_cache(tabla=None, clave=None):
+    """Descarta las lecturas cacheadas de `tabla` (de todas, si es None).
+
+    Con `clave` (patente normalizada o rut_numero), del padrón de
+    autorización de 'vehiculos' o 'personas' se descarta solo esa clave.
+    """
+    with _cache_lock:
+        tablas = [tabla] if tabla is not None else ['guardias', 'vehiculos', 'personas']
+        for nombre in tablas:
+            _generaciones[nombre] = _generaciones.get(nombre, 0) + 1
+        for llave in [llave for llave in _cache if llave[0] in tablas]:
+            del _cache[llave]
+        if clave is not None:
+            _padron.pop((db.obtener_ruta(), tabla, clave), None)
+        else:
+            for llave in [llave for llave in _padron if llave[1] in tablas]:
+                del _padron[llave]
+
+def _contar(nombre, acierto):
+    contador = _contadores.setdefault(nombre, [0, 0])
+    contador[0 if acierto else 1] += 1
+
+def cache_lectura(tabla):
+    """Cachea el resultado por argumentos hasta la próxima escritura en `tabla`. El valor se comparte: no modificarlo."""
+    def decorador(funcion):
+        nombre = funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            clave = (tabla, nombre, db.obtener_ruta(), args, tuple(sorted(kwargs.items())))
+            with _cache_lock:
+                entrada = _cache.get(clave)
+                if entrada is not None and time.monotonic() - entrada[0] < CACHE_TTL:
+                    _cache.move_to_end(clave)
+                    _contar(nombre, True)
+                    return entrada[1]
+                _contar(nombre, False)
+                generacion = _generaciones.get(tabla, 0)
+
+            valor = funcion(*args, **kwargs)
+            with _cache_lock:
+                # Si hubo una escritura mientras se leía, este valor ya está viejo
+                if generacion == _generaciones.get(tabla, 0):
+                    _cache[clave] = (time.monotonic(), valor)
+                    _cache.move_to_end(clave)
+                    while len(_cache) > CACHE_MAXIMO:
+                        _cache.popitem(last=False)
+            return valor
+        return envoltura
+    return decorador
+
+def estadisticas_cache():
+    """Aciertos y fallos por función, y ocupación del caché."""
+    with _cache_lock:
+        return {
+            'generacion': sum(_generaciones.values()),
+            'entradas': len(_cache),
+            'padron': len(_padron),
+            'maximo': CACHE_MAXIMO,
+            'ttl': CACHE_TTL,
+            'funciones': {nombre: tuple(contador) for nombre, contador in sorted(_contadores.items())},
+        }
+
+# Padrón de autorización: cada búsqueda de portería guarda el Vehiculo o la
+# Persona activos (o None) por clave, patente normalizada o cuerpo entero
+# del RUT, y las siguientes búsquedas de esa clave son un acceso a un dict.
+# Un fallo es un SELECT por el índice único de la clave. Las altas, bajas y
+# reactivaciones descartan solo la clave que cambió; el TTL cubre las
+# escrituras hechas por otros procesos.
+
+PADRON_MAXIMO = int(os.environ.get('CONTROL_ACCESO_PADRON_MAXIMO', '20000'))
+
+_padron = OrderedDict()   # (ruta, tabla, clave) -> (guardado_en, registro o None), de más antigua a más reciente
+
+def _buscar_en_padron(tabla, clave, leer):
+    """Registro de `tabla` con esa clave, desde el padrón o con `leer()` si no está."""
+    llave = (db.obtener_ruta(), tabla, clave)
+    with _cache_lock:
+        entrada = _padron.get(llave)
+        if entrada is not None and time.monotonic() - entrada[0] < CACHE_TTL:
+            _padron.move_to_end(llave)
+            _contar(f'padron_{tabla}', True)
+            return entrada[1]
+        _contar(f'padron_{tabla}', False)
+        generacion = _generaciones.get(tabla, 0)
+
+    registro = leer()
+    with _cache_lock:
+        # Si la clave cambió mientras se leía, este valor ya está viejo
+        if generacion == _generaciones.get(tabla, 0):
+            _padron[llave] = (time.monotonic(), registro)
+            _padron.move_to_end(llave)
+            while len(_padron) > PADRON_MAXIMO:
+                _padron.popitem(last=False)
+    return registro
+
+# ==================== GUARDIAS ====================
+
+@medido
+def agregar_guardia(nombre, telefono=""):
+    try:
+        with db.transaccion() as conn:
+            conn.execute('INSERT INTO guardias (nombre, telefono) VALUES (?, ?)', (nombre.strip().upper(), telefono.strip()))
+        invalidar_cache('guardias')
+        return True, f"Guardia {nombre} agregado correctamente"
+    except sqlite3.IntegrityError:
+        return False, f"El guardia {nombre} ya existe"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
+@medido
+@cache_lectura('guardias')
+def obtener_guardias(solo_activos=True):
+    filtro = 'WHERE activo = 1' if solo_activos else ''
+    cursor = db.conexion().execute(f'SELECT {Guardia.select()} FROM guardias {filtro} ORDER BY nombre')
+    return [Guardia.desde_fila(fila) for fila in cursor]
+
+@medido
+@cache_lectura('guardias')
+def obtener_guardias_activos():
+    return [fila[0] for fila in db.conexion().execute('SELECT nombre FROM guardias WHERE activo = 1 ORDER BY nombre')]
+
+@medido
+def desactivar_guardia(guardia_id):
+    with db.transaccion() as conn:
+        conn.execute('UPDATE guardias SET activo = 0 WHERE id = ?', (guardia_id,))
+    invalidar_cache('guardias')
+
+@medido
+def reactivar_guardia(guardia_id):
+    with db.transaccion() as conn:
+        conn.execute('UPDATE guardias SET activo = 1 WHERE id = ?', (guardia_id,))
+    invalidar_cache('guardias')
+
+# ==================== PERSONAS ====================
+
+@medido
+def agregar_persona(rut, nombre, depto, telefono, tipo, estado_autorizacion="AUTORIZADO", observaciones=""):
+    try:
+        fecha_registro_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d %H:%M:%S')
+        partes = descomponer_rut(rut)
+        if partes is None:
+            return False, f"RUT inválido: {rut}"
+        rut_numero, rut_dv = partes
+        with db.transaccion() as conn:
+            conn.execute('''INSERT INTO personas (rut, rut_numero, rut_dv, nombre, depto, telefono, tipo, fecha_registro, estado_autorizacion, observaciones)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (rut_canonico(rut), rut_numero, rut_dv, nombre.upper(), depto, telefono, tipo, fecha_registro_chile, estado_autorizacion, observaciones))
+        invalidar_cache('personas', rut_numero)
+        return True, f"Persona {nombre} agregada correctamente"
+    except sqlite3.IntegrityError:
+        return False, f"El RUT {rut} ya está registrado"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
+@medido
+def buscar_persona(rut):
+    """Persona activa con ese RUT (en cualquier formato), o None."""
+    partes = descomponer_rut(rut)
+    if partes is None:
+        return None
+    rut_numero, rut_dv = partes
+
+    def leer():
+        fila = db.conexion().execute(f'''SELECT rut_dv, {Persona.select()} FROM personas
+                                         WHERE rut_numero = ? AND activo = 1''', (rut_numero,)).fetchone()
+        return (fila[0], Persona.desde_fila(fila[1:])) if fila else None
+    encontrada = _buscar_en_padron('personas', rut_numero, leer)
+    return encontrada[1] if encontrada is not None and encontrada[0] == rut_dv else None
+
+@medido
+def desactivar_persona(persona_id):
+    with db.transaccion() as conn:
+        conn.execute('UPDATE personas SET activo = 0 WHERE id = ?', (persona_id,))
+        fila = conn.execute('SELECT rut_numero FROM personas WHERE id = ?', (persona_id,)).fetchone()
+    invalidar_cache('personas', fila[0] if fila else None)
+
+@medido
+def reactivar_persona(persona_id):
+    with db.transaccion() as conn:
+        conn.execute('UPDATE personas SET activo = 1 WHERE id = ?', (persona_id,))
+        fila = conn.execute('SELECT rut_numero FROM personas WHERE id = ?', (persona_id,)).fetchone()
+    invalidar_cache('personas', fila[0] if fila else None)
+
+# ==================== VEHÍCULOS ====================
+
+@medido
+def agregar_vehiculo(patente, propietario, rut="", depto="", marca="", modelo="", color="", telefono="", estado_autorizacion="AUTORIZADO", observaciones=""):
+    try:
+        fecha_registro_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d %H:%M:%S')
+        patente = normalizar_patente(patente)
+        with db.transaccion() as conn:
+            conn.execute('''INSERT INTO vehiculos (patente, propietario, rut, depto, marca, modelo, color, telefono, fecha_registro, estado_autorizacion, observaciones)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (patente, propietario.upper(), rut_canonico(rut) if rut else "", depto, marca, modelo, color, telefono, fecha_registro_chile, estado_autorizacion, observaciones))
+        invalidar_cache('vehiculos', patente)
+        return True, f"Vehículo {patente} agregado correctamente"
+    except sqlite3.IntegrityError:
+        return False, f"La patente {patente} ya está registrada"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+
+@medido
+def buscar_vehiculo(patente):
+    """Vehículo activo con esa patente (con o sin guion), o None."""
+    patente = normalizar_patente(patente)
+
+    def leer():
+        fila = db.conexion().execute(f"SELECT {Vehiculo.select()} FROM vehiculos WHERE patente = ? AND activo = 1",
+                                     (patente,)).fetchone()
+        return Vehiculo.desde_fila(fila) if fila else None
+    return _buscar_en_padron('vehiculos', patente, leer)
+
+@medido
+def desactivar_vehiculo(vehiculo_id):
+    with db.transaccion() as conn:
+        conn.execute('UPDATE vehiculos SET activo = 0 WHERE id = ?', (vehiculo_id,))
+        fila = conn.execute('SELECT patente FROM vehiculos WHERE id = ?', (vehiculo_id,)).fetchone()
+    invalidar_cache('vehiculos', fila[0] if fila else None)
+
+@medido
+def reactivar_vehiculo(vehiculo_id):
+    with db.transaccion() as conn:
+        conn.execute('UPDATE vehiculos SET activo = 1 WHERE id = ?', (vehiculo_id,))
+        fila = conn.execute('SELECT patente FROM vehiculos WHERE id = ?', (vehiculo_id,)).fetchone()
+    invalidar_cache('vehiculos', fila[0] if fila else None)
+
+# ==================== LISTADOS PAGINADOS ====================
+# Los filtros de las pestañas Vehículos y Personas se resuelven en SQL por
+# prefijo (LIKE 'texto%', que aprovecha los índices NOCASE) y solo se trae la
+# página visible. El cuadro de búsqueda libre usa los índices FTS5
+# vehiculos_fts / personas_fts, que los triggers mantienen al día.
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def consulta_fts(texto):
+    """Convierte lo escrito por el guardia en una consulta FTS5.
+
+    Cada palabra se busca como prefijo y todas deben aparecer:
+    "perez 30" -> '"perez"* "30"*'.
+    """
+    return " ".join(f'"{termino}"*' for termino in re.findall(r"\w+", texto or ""))
+
+def _where_listado(solo_activos, prefijos, tabla_fts=None, busqueda=""):
+    condiciones, params = [], []
+    if solo_activos:
+        condiciones.append('activo = 1')
+    consulta = consulta_fts(busqueda)
+    if consulta:
+        condiciones.append(f"id IN (SELECT rowid FROM {tabla_fts} WHERE {tabla_fts} MATCH ?)")
+        params.append(consulta)
+    for columna, texto in prefijos:
+        texto = (texto or "").strip()
+        if texto:
+            condiciones.append(f"{columna} LIKE ? ESCAPE '\\'")
+            params.append(_escapar_like(texto) + '%')
+    return (f"WHERE {' AND '.join(condiciones)}" if condiciones else ""), params
+
+def _prefijos_vehiculo(patente, depto, propietario):
+    # propietario y nombre se guardan en mayúsculas; LIKE solo ignora
+    # mayúsculas en ASCII, así que la Ñ y los acentos se pasan ya convertidos
+    return [('patente', normalizar_patente(patente or "")), ('depto', depto), ('propietario', (propietario or "").upper())]
+
+def _prefijos_persona(rut, depto, nombre):
+    return [('rut', (rut or "").replace(".", "").upper()), ('depto', depto), ('nombre', (nombre or "").upper())]
+
+@medido
+@cache_lectura('vehiculos')
+def listar_vehiculos(solo_activos=True, patente="", depto="", propietario="", busqueda="", limite=50, desplazamiento=0):
+    """Página de vehículos que cumplen los filtros y total de coincidencias."""
+    where, params = _where_listado(solo_activos, _prefijos_vehiculo(patente, depto, propietario), 'vehiculos_fts', busqueda)
+    conn = db.conexion()
+    total = conn.execute(f"SELECT COUNT(*) FROM vehiculos {where}", params).fetchone()[0]
+    cursor = conn.execute(f'''SELECT {Vehiculo.select()} FROM vehiculos {where}
+                             ORDER BY activo DESC, fecha_registro DESC LIMIT ? OFFSET ?''',
+                          params + [limite, desplazamiento])
+    return [Vehiculo.desde_fila(fila) for fila in cursor], total
+
+@medido
+@cache_lectura('personas')
+def listar_personas(solo_activos=True, rut="", depto="", nombre="", busqueda="", limite=50, desplazamiento=0):
+    """Página de personas que cumplen los filtros y total de coincidencias."""
+    where, params = _where_listado(solo_activos, _prefijos_persona(rut, depto, nombre), 'personas_fts', busqueda)
+    conn = db.conexion()
+    total = conn.execute(f"SELECT COUNT(*) FROM personas {where}", params).fetchone()[0]
+    cursor = conn.execute(f'''SELECT {Persona.select()} FROM personas {where}
+                             ORDER BY activo DESC, nombre LIMIT ? OFFSET ?''',
+                          params + [limite, desplazamiento])
+    return [Persona.desde_fila(fila) for fila in cursor], total
+
+def consulta_vehiculos_filtrados(solo_activos=True, patente="", depto="", propietario="", busqueda=""):
+    """(sql, params) con todas las coincidencias del listado, para exportar a CSV."""
+    where, params = _where_listado(solo_activos, _prefijos_vehiculo(patente, depto, propietario), 'vehiculos_fts', busqueda)
+    return f'''SELECT patente, propietario, rut, depto, marca, modelo FROM vehiculos {where}
+               ORDER BY activo DESC, fecha_registro DESC''', params
+
+def consulta_personas_filtradas(solo_activos=True, rut="", depto="", nombre="", busqueda=""):
+    """(sql, params) con todas las coincidencias del listado, para exportar a CSV."""
+    where, params = _where_listado(solo_activos, _prefijos_persona(rut, depto, nombre), 'personas_fts', busqueda)
+    return f'''SELECT rut, nombre, depto, telefono, tipo FROM personas {where}
+               ORDER BY activo DESC, nombre''', params
+
+# ==================== REGISTROS ====================
+
+@medido
+def registrar_ingreso(tipo_registro, identificador, nombre_persona, depto, guardia, turno, tipo_ingreso="", observaciones=""):
+    """Guarda el ingreso y retorna el Ingreso creado.
+
+    Con la cola de ingresos activa, el ingreso queda en el diario de la cola
+    y se escribe en la base en el próximo lote: el Ingreso retornado no
+    tiene id todavía.
+    """
+    fecha_hora_chile, instante = horario.ahora()
+    # Si el hilo escritor murió, el ingreso se escribe directo (viva() lo informa)
+    if cola_ingresos.ACTIVA and cola_ingresos.viva():
+        cola_ingresos.encolar((tipo_registro, identificador, nombre_persona, depto, fecha_hora_chile,
+                               guardia, turno, tipo_ingreso, observaciones, instante))
+        antipassback.anotar(tipo_registro, identificador, instante)
+        return Ingreso(None, tipo_registro, identificador, nombre_persona, depto, fecha_hora_chile,
+                       guardia, turno, tipo_ingreso, observaciones, instante)
+    with db.transaccion() as conn:
+        cursor = conn.execute('''INSERT INTO registro_ingresos (tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso, observaciones, instante)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                              (tipo_registro, identificador, nombre_persona, depto, fecha_hora_chile, guardia, turno, tipo_ingreso, observaciones, instante))
+        estadisticas.sumar_ingreso(conn, fecha_hora_chile, turno, tipo_registro, tipo_ingreso, guardia)
+        ocupacion.entrar(conn, tipo_registro, identificador, nombre_persona, depto, fecha_hora_chile, instante, guardia)
+    antipassback.anotar(tipo_registro, identificador, instante)
+    return Ingreso(cursor.lastrowid, tipo_registro, identificador, nombre_persona, depto, fecha_hora_chile,
+                   guardia, turno, tipo_ingreso, observaciones, instante)
+
+@medido
+def ingreso_reciente(tipo_registro, identificador):
+    """Instante del ingreso del mismo vehículo o persona dentro de la ventana anti-passback, o None."""
+    return antipassback.ingreso_reciente(tipo_registro, identificador)
+
+@medido
+def registrar_salida(tipo_registro, identificador, guardia):
+    """Registra la salida de quien está dentro; retorna la Salida, o None si no tenía un ingreso abierto."""
+    # Su ingreso puede estar todavía en la cola
+    cola_ingresos.esperar(cola_ingresos.ESPERA_CONSULTAS_S)
+    fecha_hora_chile, instante = horario.ahora()
+    with db.transaccion() as conn:
+        return ocupacion.salir(conn, tipo_registro, identificador, fecha_hora_chile, instante, guardia)
+
+@medido
+def obtener_presentes():
+    """[Visita] de los vehículos y personas que están dentro."""
+    cola_ingresos.esperar(cola_ingresos.ESPERA_CONSULTAS_S)
+    return ocupacion.presentes(db.conexion())
+
+# Los filtros por fecha comparan instante (entero UTC, idx_registro_instante)
+# con los límites de los días de Chile: un día completo es el rango
+# [00:00 del día, 00:00 del día siguiente). fecha_hora se muestra tal cual.
+
+def consulta_registros_rango(fecha_inicio, fecha_fin, limite=None):
+    """(sql, params) de los ingresos entre dos fechas 'YYYY-MM-DD', ambas incluidas."""
+    sql = '''SELECT tipo_registro, identificador, nombre_persona, depto, fecha_hora, guardia, turno, tipo_ingreso
+             FROM registro_ingresos WHERE instante >= ? AND instante < ? ORDER BY instante DESC'''
+    params = list(horario.rango_dias(fecha_inicio, fecha_fin))
+    if limite is not None:
+        sql += ' LIMIT ?'
+        params.append(limite)
+    return sql, params
+
+@medido
+def obtener_registros_hoy():
+    cola_ingresos.esperar(cola_ingresos.ESPERA_CONSULTAS_S)
+    fecha_hoy_chile = datetime.now(CHILE_TZ).strftime('%Y-%m-%d')
+    sql, params = consulta_registros_rango(fecha_hoy_chile, fecha_hoy_chile)
+    return pd.read_sql_query(sql, db.conexion(), params=params)
+
+def fuentes_registros(fecha_inicio, fecha_fin):
+    """Conexiones donde buscar los ingresos del rango: la base y los meses archivados que lo tocan."""
+    return archivado.fuentes(fecha_inicio, fecha_fin)
+
+@medido
+def obtener_registros_rango_fechas(fecha_inicio, fecha_fin, limite=None):
+    # Los ingresos que este proceso tiene en cola aparecen en la consulta
+    cola_ingresos.esperar(cola_ingresos.ESPERA_CONSULTAS_S)
+    sql, params = consulta_registros_rango(fecha_inicio, fecha_fin, limite)
+    partes = []
+    with closing(fuentes_registros(fecha_inicio, fecha_fin)) as conexiones:
+        for conn in conexiones:
+            partes.append(pd.read_sql_query(sql, conn, params=params))
+            if limite is not None:
+                # Las fuentes vienen de la más reciente a la más antigua
+                params[-1] -= len(partes[-1])
+                if params[-1] <= 0:
+                    break
+    # Un DataFrame vacío en concat cambia los tipos de las columnas
+    partes = [parte for parte in partes if len(parte)] or partes[:1]
+    return pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+@medido
+def resumen_registros(fecha_inicio, fecha_fin):
+    """Métricas del panel de Registros entre dos fechas, ambas incluidas."""
+    cola_ingresos.esperar(cola_ingresos.ESPERA_CONSULTAS_S)
+    return estadisticas.resumen(fecha_inicio, fecha_fin)
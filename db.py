@@ -0,0 +1,197 @@
+"""Capa de conexión SQLite compartida por todo el proceso.
+
+Streamlit vuelve a ejecutar ``app.py`` en cada interacción, por lo que el
+estado que deba sobrevivir entre ejecuciones vive en este módulo, que Python
+importa una sola vez por proceso.
+
+Cada hilo obtiene su propia conexión (``sqlite3`` no permite compartir una
+conexión entre hilos en uso simultáneo). Cuando el hilo termina, la conexión
+vuelve a un pool y la reutiliza el siguiente hilo, de modo que una ejecución
+del script abre como máximo una conexión y normalmente ninguna.
+
+Para porterías con varios terminales la base funciona por defecto en modo
+WAL: los lectores (pestaña Registros) no bloquean a los escritores
+(registrar_ingreso) y viceversa. Las escrituras toman el candado al inicio
+(``BEGIN IMMEDIATE``), esperan hasta ``BUSY_TIMEOUT_MS`` y, si la base sigue
+ocupada, reintentan un número acotado de veces antes de fallar.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metricas
+
+# Ruta de la base de datos; se puede cambiar con la variable de entorno
+# CONTROL_ACCESO_DB o llamando a configurar() antes del primer uso.
+DB_PATH = os.environ.get('CONTROL_ACCESO_DB', 'control_acceso.db')
+
+# Modo de concurrencia: 'wal' (lectores y escritor en paralelo) o
+# 'rollback' (journal clásico de SQLite)
+MODO_CONCURRENCIA = os.environ.get('CONTROL_ACCESO_MODO', 'wal').lower()
+
+# Nivel PRAGMA synchronous; NORMAL es seguro ante caídas de la aplicación en WAL
+SYNCHRONOUS = os.environ.get('CONTROL_ACCESO_SYNCHRONOUS', 'NORMAL').upper()
+
+# Espera máxima por el candado antes de que SQLite devuelva "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get('CONTROL_ACCESO_BUSY_TIMEOUT_MS', '5000'))
+
+# Reintentos adicionales, con espera exponencial, tras agotar el busy timeout
+REINTENTOS = int(os.environ.get('CONTROL_ACCESO_REINTENTOS', '3'))
+
+# Máximo de conexiones ociosas que se mantienen abiertas por archivo
+POOL_MAXIMO = 8
+
+# PRAGMA aplicados una vez al abrir cada conexión
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+)
+
+MODOS_VALIDOS = ('wal', 'rollback')
+SYNCHRONOUS_VALIDOS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+_lock = threading.Lock()
+_pool = {}  # ruta -> [conexiones ociosas]
+_local = threading.local()
+
+
+class _Prestamo:
+    """Conexión asignada a un hilo; al liberarse vuelve al pool."""
+
+    __slots__ = ('ruta', 'conn')
+
+    def __init__(self, ruta, conn):
+        self.ruta = ruta
+        self.conn = conn
+
+    def __del__(self):
+        # threading.local libera este objeto cuando el hilo termina
+        if self.conn is None:
+            return
+        try:
+            _devolver(self.ruta, self.conn)
+        except Exception:
+            pass
+
+
+def configurar(ruta=None, modo=None, synchronous=None, busy_timeout_ms=None, reintentos=None):
+    """Cambia la configuración del proceso y cierra el pool anterior.
+
+    Los parámetros omitidos conservan su valor actual.
+    """
+    global DB_PATH, MODO_CONCURRENCIA, SYNCHRONOUS, BUSY_TIMEOUT_MS, REINTENTOS
+    if modo is not None and modo.lower() not in MODOS_VALIDOS:
+        raise ValueError(f"Modo de concurrencia inválido: {modo}")
+    if synchronous is not None and synchronous.upper() not in SYNCHRONOUS_VALIDOS:
+        raise ValueError(f"Nivel synchronous inválido: {synchronous}")
+    with _lock:
+        if ruta is not None:
+            DB_PATH = ruta
+        if modo is not None:
+            MODO_CONCURRENCIA = modo.lower()
+        if synchronous is not None:
+            SYNCHRONOUS = synchronous.upper()
+        if busy_timeout_ms is not None:
+            BUSY_TIMEOUT_MS = int(busy_timeout_ms)
+        if reintentos is not None:
+            REINTENTOS = int(reintentos)
+    cerrar_conexiones()
+
+
+def obtener_ruta():
+    return DB_PATH
+
+
+def _abrir(ruta):
+    # isolation_level=None: las transacciones las abre transaccion() con
+    # BEGIN IMMEDIATE en vez del BEGIN implícito del módulo sqlite3
+    conn = sqlite3.connect(ruta, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           check_same_thread=False)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    journal = 'WAL' if MODO_CONCURRENCIA == 'wal' else 'DELETE'
+    _con_reintentos(lambda: conn.execute(f"PRAGMA journal_mode = {journal}"))
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.set_trace_callback(metricas.contar_sentencia)
+    return conn
+
+
+def _es_bloqueo(error):
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'busy' in mensaje
+
+
+def _con_reintentos(operacion):
+    """Ejecuta operacion() reintentando si la base está bloqueada."""
+    for intento in range(REINTENTOS + 1):
+        try:
+            return operacion()
+        except sqlite3.OperationalError as e:
+            if intento == REINTENTOS or not _es_bloqueo(e):
+                raise
+            time.sleep(min(0.05 * 2 ** intento, 1.0) * random.uniform(0.5, 1.5))
+
+
+def _devolver(ruta, conn):
+    with _lock:
+        libres = _pool.setdefault(ruta, [])
+        if ruta == DB_PATH and len(libres) < POOL_MAXIMO and not conn.in_transaction:
+            libres.append(conn)
+            return
+    conn.close()
+
+
+def conexion():
+    """Conexión del hilo actual para la base configurada."""
+    prestamo = getattr(_local, 'prestamo', None)
+    if prestamo is not None and prestamo.ruta == DB_PATH:
+        return prestamo.conn
+
+    ruta = DB_PATH
+    with _lock:
+        libres = _pool.get(ruta)
+        conn = libres.pop() if libres else None
+    if conn is None:
+        conn = _abrir(ruta)
+    _local.prestamo = _Prestamo(ruta, conn)
+    return conn
+
+
+@contextmanager
+def transaccion():
+    """Ejecuta un bloque en una transacción: commit al salir, rollback si falla.
+
+    Si el hilo ya está dentro de una transacción, el bloque se une a ella.
+    """
+    conn = conexion()
+    if conn.in_transaction:
+        yield conn
+        return
+
+    _con_reintentos(lambda: conn.execute("BEGIN IMMEDIATE"))
+    try:
+        yield conn
+        _con_reintentos(conn.commit)
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
+def cerrar_conexiones():
+    """Cierra las conexiones ociosas del pool y la del hilo actual."""
+    prestamo = getattr(_local, 'prestamo', None)
+    if prestamo is not None:
+        _local.prestamo = None
+        prestamo.conn.close()
+        prestamo.conn = None
+    with _lock:
+        ociosas = [conn for libres in _pool.values() for conn in libres]
+        _pool.clear()
+    for conn in ociosas:
+        conn.close()
@@ -0,0 +1,117 @@
+"""Conteos diarios de ingresos, mantenidos a medida que se registran.
+
+``estadisticas_ingresos`` guarda una fila por (fecha, turno, tipo_registro,
+tipo_ingreso, guardia) con la cantidad de ingresos. ``registrar_ingreso`` la
+incrementa en la misma transacción del INSERT, así que las métricas del
+panel de Registros se leen de unas pocas filas por día en vez de recorrer
+todos los ingresos.
+
+Para recalcular el historial (por ejemplo tras cargar ingresos directo en
+la base; también completa el ``instante`` de las filas que no lo tengan):
+    python estadisticas.py
+    python estadisticas.py --desde 2024-01-01 --hasta 2024-12-31 --db /datos/porteria.db
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import archivado
+import db
+import horario
+import migraciones
+
+_SQL_SUMAR = '''INSERT INTO estadisticas_ingresos (fecha, turno, tipo_registro, tipo_ingreso, guardia, cantidad)
+    VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT (fecha, turno, tipo_registro, tipo_ingreso, guardia) DO UPDATE SET cantidad = cantidad + 1'''
+
+
+def sumar_ingreso(conn, fecha_hora, turno, tipo_registro, tipo_ingreso, guardia):
+    """Cuenta un ingreso; se llama dentro de la transacción que lo inserta."""
+    conn.execute(_SQL_SUMAR, (fecha_hora[:10], turno, tipo_registro, tipo_ingreso or "", guardia))
+
+
+def _dia_siguiente(fecha):
+    return (datetime.strptime(fecha, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def resumen(fecha_inicio, fecha_fin):
+    """Totales entre dos fechas 'YYYY-MM-DD', ambas incluidas.
+
+    Retorna un dict con 'total', 'VEHICULO', 'PERSONA' y 'turno_dia'.
+    """
+    total, vehiculos, personas, turno_dia = db.conexion().execute('''SELECT
+            COALESCE(SUM(cantidad), 0),
+            COALESCE(SUM(CASE WHEN tipo_registro = 'VEHICULO' THEN cantidad END), 0),
+            COALESCE(SUM(CASE WHEN tipo_registro = 'PERSONA' THEN cantidad END), 0),
+            COALESCE(SUM(CASE WHEN turno LIKE 'Día%' THEN cantidad END), 0)
+        FROM estadisticas_ingresos WHERE fecha >= ? AND fecha <= ?''', (fecha_inicio, fecha_fin)).fetchone()
+    return {'total': total, 'VEHICULO': vehiculos, 'PERSONA': personas, 'turno_dia': turno_dia}
+
+
+def reconstruir(desde=None, hasta=None):
+    """Recalcula los conteos desde registro_ingresos y los meses archivados.
+
+    Sin fechas recalcula todo el historial. Retorna las filas generadas.
+    """
+    condicion, params = [], []
+    if desde:
+        condicion.append("fecha >= ?")
+        params.append(desde)
+    if hasta:
+        condicion.append("fecha <= ?")
+        params.append(hasta)
+    where_estadisticas = f"WHERE {' AND '.join(condicion)}" if condicion else ""
+
+    # Mismo rango sobre instante, como rango semiabierto para usar idx_registro_instante
+    condicion, params_registros = [], []
+    if desde:
+        condicion.append("instante >= ?")
+        params_registros.append(horario.instante(desde))
+    if hasta:
+        condicion.append("instante < ?")
+        params_registros.append(horario.instante(_dia_siguiente(hasta)))
+    where_registros = f"WHERE {' AND '.join(condicion)}" if condicion else ""
+
+    generadas = 0
+    with db.transaccion() as conn:
+        horario.completar_instantes(conn)
+        conn.execute(f"DELETE FROM estadisticas_ingresos {where_estadisticas}", params)
+        # Los meses archivados también cuentan; cada fuente tiene días distintos
+        for fuente in archivado.fuentes(desde, hasta):
+            filas = fuente.execute(f'''SELECT substr(fecha_hora, 1, 10), turno, tipo_registro,
+                    COALESCE(tipo_ingreso, ''), guardia, COUNT(*)
+                FROM registro_ingresos {where_registros}
+                GROUP BY 1, 2, 3, 4, 5''', params_registros).fetchall()
+            conn.executemany('''INSERT INTO estadisticas_ingresos (fecha, turno, tipo_registro, tipo_ingreso, guardia, cantidad)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (fecha, turno, tipo_registro, tipo_ingreso, guardia)
+                DO UPDATE SET cantidad = cantidad + excluded.cantidad''', filas)
+            generadas += len(filas)
+    return generadas
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalcula las estadísticas de ingresos desde registro_ingresos.")
+    parser.add_argument('--desde', help="primera fecha YYYY-MM-DD (por defecto, todo el historial)")
+    parser.add_argument('--hasta', help="última fecha YYYY-MM-DD, incluida")
+    parser.add_argument('--db', help="ruta de la base de datos (por defecto CONTROL_ACCESO_DB)")
+    args = parser.parse_args(argv)
+
+    for fecha in (args.desde, args.hasta):
+        if fecha:
+            try:
+                datetime.strptime(fecha, '%Y-%m-%d')
+            except ValueError:
+                parser.error(f"fecha inválida: {fecha}")
+
+    if args.db:
+        db.configurar(args.db)
+    migraciones.migrar()
+    print(f"{reconstruir(args.desde, args.hasta)} filas de estadísticas generadas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
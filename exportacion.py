@@ -0,0 +1,247 @@
+"""Exportación por lotes (CSV y Parquet), con memoria acotada.
+
+Las filas se leen del cursor de a ``LOTE`` y se escriben directo al destino
+(opcionalmente comprimido con gzip), sin armar un DataFrame ni el CSV
+completo como string. Escribiendo a un archivo en disco la memoria usada no
+depende del tamaño del rango.
+
+Para descargas desde la interfaz, Streamlit necesita el contenido como
+bytes, así que ``archivo_csv`` lo deja en un BytesIO: se guarda una sola
+copia del resultado (comprimido, si se pidió gzip) y se genera recién
+cuando el guardia presiona el botón, no en cada rerun.
+
+La exportación Parquet guarda columnas con tipo (fecha_hora como timestamp,
+id como entero, activo como booleano) comprimidas con zstd. Para auditoría,
+``exportar_parquet`` escribe registro_ingresos particionado por mes
+(``registro_ingresos/mes=AAAA-MM/parte-<id>.parquet``) y solo agrega los
+ingresos nuevos desde la exportación anterior; las tablas maestras se
+reescriben completas en cada corrida:
+    python exportacion.py /auditoria/porteria
+"""
+
+import argparse
+import csv
+import glob
+import gzip
+import io
+import json
+import os
+import sys
+
+import archivado
+import db
+import migraciones
+
+# Filas leídas del cursor por iteración
+LOTE = 5000
+
+
+def bloques_csv(sql, params=(), fuentes=None):
+    """Genera el CSV de la consulta en bloques de texto, encabezado incluido.
+
+    Con `fuentes` (conexiones, p. ej. de archivado.fuentes) la consulta se
+    ejecuta en cada una y los resultados se escriben uno tras otro.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    encabezado = False
+    for conn in (fuentes if fuentes is not None else [db.conexion()]):
+        cursor = conn.execute(sql, params)
+        if not encabezado:
+            escritor.writerow([columna[0] for columna in cursor.description])
+            encabezado = True
+        while True:
+            filas = cursor.fetchmany(LOTE)
+            if filas:
+                escritor.writerows(filas)
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if not filas:
+                break
+
+
+def escribir_csv(destino, sql, params=(), comprimir=False, fuentes=None):
+    """Escribe el CSV de la consulta en `destino` (binario); retorna bytes escritos."""
+    salida = gzip.GzipFile(fileobj=destino, mode='wb') if comprimir else destino
+    try:
+        for bloque in bloques_csv(sql, params, fuentes):
+            salida.write(bloque.encode('utf-8'))
+    finally:
+        if comprimir:
+            salida.close()  # cierra solo el gzip, no `destino`
+    return destino.tell()
+
+
+def archivo_csv(sql, params=(), comprimir=False, fuentes=None):
+    """BytesIO con el CSV (o CSV gzip) listo para st.download_button."""
+    archivo = io.BytesIO()
+    escribir_csv(archivo, sql, params, comprimir, fuentes)
+    archivo.seek(0)
+    return archivo
+
+# ==================== PARQUET ====================
+
+# Columnas que no se guardan como texto
+TIPOS_PARQUET = {'id': 'entero', 'activo': 'booleano', 'fecha_hora': 'fecha', 'fecha_registro': 'fecha'}
+COMPRESION_PARQUET = 'zstd'
+TABLAS_MAESTRAS = ('vehiculos', 'personas', 'guardias')
+
+_COLUMNAS_INGRESO = ('id, tipo_registro, identificador, nombre_persona, depto, fecha_hora, '
+                     'guardia, turno, tipo_ingreso, observaciones')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Para exportar Parquet se necesita el paquete pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _esquema(pa, columnas):
+    tipos = {'entero': pa.int64(), 'booleano': pa.bool_(), 'fecha': pa.timestamp('s')}
+    return pa.schema([(nombre, tipos.get(TIPOS_PARQUET.get(nombre), pa.string())) for nombre in columnas])
+
+
+def _lotes_arrow(pa, cursor):
+    """RecordBatches tipados a partir del cursor, de a LOTE filas."""
+    esquema = _esquema(pa, [columna[0] for columna in cursor.description])
+    while True:
+        filas = cursor.fetchmany(LOTE)
+        if not filas:
+            return
+        columnas = []
+        for campo, valores in zip(esquema, zip(*filas)):
+            if campo.type == pa.timestamp('s'):
+                # Hora local de Chile, tal como se guarda en la base
+                columnas.append(pa.compute.strptime(pa.array(valores, pa.string()), format='%Y-%m-%d %H:%M:%S',
+                                                    unit='s', error_is_null=True))
+            elif campo.type == pa.bool_():
+                columnas.append(pa.array(valores, pa.int64()).cast(pa.bool_()))
+            elif campo.type == pa.int64():
+                columnas.append(pa.array(valores, pa.int64()))
+            else:
+                try:
+                    columnas.append(pa.array(valores, pa.string()))
+                except (pa.ArrowTypeError, pa.ArrowInvalid):
+                    # Columnas TEXT con algún número guardado como entero (teléfonos, deptos)
+                    columnas.append(pa.array([None if v is None else str(v) for v in valores], pa.string()))
+        yield pa.RecordBatch.from_arrays(columnas, schema=esquema)
+
+
+def escribir_parquet(destino, sql, params=(), fuentes=None):
+    """Escribe el resultado de la consulta como un archivo Parquet; retorna las filas."""
+    pa = _pyarrow()
+    escritor = None
+    filas = 0
+    try:
+        for conn in (fuentes if fuentes is not None else [db.conexion()]):
+            cursor = conn.execute(sql, params)
+            if escritor is None:
+                esquema = _esquema(pa, [columna[0] for columna in cursor.description])
+                escritor = pa.parquet.ParquetWriter(destino, esquema, compression=COMPRESION_PARQUET)
+            for lote in _lotes_arrow(pa, cursor):
+                escritor.write_batch(lote)
+                filas += lote.num_rows
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+
+def archivo_parquet(sql, params=(), fuentes=None):
+    """BytesIO con el Parquet listo para st.download_button."""
+    archivo = io.BytesIO()
+    escribir_parquet(archivo, sql, params, fuentes)
+    archivo.seek(0)
+    return archivo
+
+
+def _leer_estado(carpeta):
+    try:
+        with open(os.path.join(carpeta, '_estado.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _guardar_estado(carpeta, estado):
+    ruta = os.path.join(carpeta, '_estado.json')
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+    os.replace(ruta + '.tmp', ruta)
+
+
+def exportar_parquet(carpeta):
+    """Exportación incremental para auditoría; retorna {tabla: filas escritas}.
+
+    Los ingresos se exportan por id: cada corrida escribe solo los que tienen
+    un id mayor al último exportado (también los de meses ya archivados) y
+    los reparte en un archivo nuevo por mes. El estado queda en
+    ``_estado.json`` y se actualiza después de escribir todos los archivos,
+    así que una corrida interrumpida se repite completa la próxima vez.
+    """
+    pa = _pyarrow()
+    os.makedirs(carpeta, exist_ok=True)
+    for sobrante in glob.glob(os.path.join(carpeta, '**', '*.tmp'), recursive=True):
+        os.remove(sobrante)  # restos de una corrida interrumpida
+    estado = _leer_estado(carpeta)
+    desde_id = ultimo_id = estado.get('registro_ingresos_ultimo_id', 0)
+
+    escritores = {}   # mes -> (ruta temporal, ParquetWriter)
+    escritas = {'registro_ingresos': 0}
+    try:
+        for conn in archivado.fuentes():
+            cursor = conn.execute(f"SELECT {_COLUMNAS_INGRESO} FROM registro_ingresos WHERE id > ? ORDER BY id",
+                                  (desde_id,))
+            for lote in _lotes_arrow(pa, cursor):
+                meses = pa.compute.strftime(lote.column('fecha_hora'), format='%Y-%m')
+                for mes in pa.compute.unique(meses).to_pylist():
+                    parte = lote.filter(pa.compute.equal(meses, mes))
+                    if mes not in escritores:
+                        particion = os.path.join(carpeta, 'registro_ingresos', f"mes={mes}")
+                        os.makedirs(particion, exist_ok=True)
+                        ruta = os.path.join(particion, f"parte-{parte.column('id')[0].as_py():012d}.parquet.tmp")
+                        escritor = pa.parquet.ParquetWriter(ruta, lote.schema, compression=COMPRESION_PARQUET)
+                        escritores[mes] = (ruta, escritor)
+                    escritores[mes][1].write_batch(parte)
+                escritas['registro_ingresos'] += lote.num_rows
+                ultimo_id = max(ultimo_id, pa.compute.max(lote.column('id')).as_py())
+    finally:
+        for _, escritor in escritores.values():
+            escritor.close()
+
+    # Las tablas maestras cambian en el lugar (activo, teléfonos): van completas
+    for tabla in TABLAS_MAESTRAS:
+        ruta = os.path.join(carpeta, f"{tabla}.parquet")
+        escritas[tabla] = escribir_parquet(ruta + '.tmp', f"SELECT * FROM {tabla} ORDER BY id")
+        os.replace(ruta + '.tmp', ruta)
+
+    for ruta, _ in escritores.values():
+        os.replace(ruta, ruta[:-len('.tmp')])
+    estado['registro_ingresos_ultimo_id'] = ultimo_id
+    _guardar_estado(carpeta, estado)
+    return escritas
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta ingresos y tablas maestras a Parquet para auditoría.")
+    parser.add_argument('carpeta', help="carpeta de destino; las corridas siguientes solo agregan ingresos nuevos")
+    parser.add_argument('--db', help="ruta de la base de datos (por defecto CONTROL_ACCESO_DB)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.configurar(args.db)
+    migraciones.migrar()
+    for tabla, filas in exportar_parquet(args.carpeta).items():
+        print(f"{tabla}: {filas} filas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
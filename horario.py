@@ -0,0 +1,101 @@
+"""Hora de Chile e instantes UTC de los ingresos.
+
+registro_ingresos guarda cada ingreso con ``fecha_hora``, el texto en hora
+de Chile que ve el guardia ('AAAA-MM-DD HH:MM:SS', sin desfase), y con
+``instante``, los segundos UTC desde 1970. Los filtros por fecha y el orden
+usan ``instante``: el texto no distingue las dos 23:xx de la noche en que
+termina el horario de verano y se compara como cadena.
+
+Chile cambia la hora a medianoche, así que un día local siempre empieza en
+las 00:00 de invierno (o en la 01:00 de verano cuando las 00:00 no existen,
+que es el mismo instante).
+"""
+
+from datetime import datetime, timedelta
+
+import pytz
+
+CHILE_TZ = pytz.timezone('America/Santiago')
+FORMATO = '%Y-%m-%d %H:%M:%S'
+
+
+def ahora():
+    """(fecha_hora en hora de Chile, instante UTC) del momento actual."""
+    momento = datetime.now(CHILE_TZ)
+    return momento.strftime(FORMATO), int(momento.timestamp())
+
+
+def instante(fecha_hora, verano=False):
+    """Instante UTC de un texto 'AAAA-MM-DD HH:MM:SS' o 'AAAA-MM-DD' en hora de Chile.
+
+    En la hora repetida del fin del horario de verano, `verano` elige la
+    primera pasada (True) o la segunda (False).
+    """
+    formato = FORMATO if len(fecha_hora) > 10 else '%Y-%m-%d'
+    return int(CHILE_TZ.localize(datetime.strptime(fecha_hora, formato), is_dst=verano).timestamp())
+
+
+def hora_local(segundos):
+    """Texto 'AAAA-MM-DD HH:MM:SS' en hora de Chile de un instante UTC."""
+    return datetime.fromtimestamp(segundos, CHILE_TZ).strftime(FORMATO)
+
+
+def rango_dias(fecha_inicio, fecha_fin):
+    """[desde, hasta) en instantes UTC de los días de Chile entre dos fechas 'AAAA-MM-DD', ambas incluidas."""
+    siguiente = (datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return instante(fecha_inicio), instante(siguiente)
+
+# ==================== HISTORIAL ====================
+
+def _desfases(hora):
+    """Desfases UTC posibles (en segundos) de una hora local 'AAAA-MM-DD HH'."""
+    local = datetime.strptime(hora, '%Y-%m-%d %H')
+    desfases = []
+    for verano in (True, False):
+        momento = CHILE_TZ.localize(local, is_dst=verano)
+        # Una hora que no existe (inicio del verano) no vuelve igual al normalizar
+        if CHILE_TZ.normalize(momento).replace(tzinfo=None) == local:
+            desfases.append(int(momento.utcoffset().total_seconds()))
+    return sorted(set(desfases), reverse=True) or [int(CHILE_TZ.localize(local).utcoffset().total_seconds())]
+
+
+def completar_instantes(conn):
+    """Llena ``instante`` en las filas de registro_ingresos que no lo tienen; retorna cuántas.
+
+    Se calcula desde fecha_hora. Casi todas las horas tienen un solo desfase
+    y se resuelven con un UPDATE; en la hora repetida del cambio de horario
+    se recorren las filas en orden de id (el registro solo crece) y se toma
+    la primera pasada mientras la hora no retroceda.
+    """
+    horas = [fila[0] for fila in conn.execute(
+        "SELECT DISTINCT substr(fecha_hora, 1, 13) FROM registro_ingresos WHERE instante IS NULL")]
+    unicas, repetidas = [], {}
+    for hora in horas:
+        desfases = _desfases(hora)
+        if len(desfases) == 1:
+            unicas.append((hora, desfases[0]))
+        else:
+            repetidas[hora] = desfases
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS desfases_horas (hora TEXT PRIMARY KEY, desfase INTEGER NOT NULL)")
+    conn.execute("DELETE FROM temp.desfases_horas")
+    conn.executemany("INSERT INTO temp.desfases_horas (hora, desfase) VALUES (?, ?)", unicas)
+    completadas = conn.execute('''UPDATE registro_ingresos
+        SET instante = CAST(strftime('%s', fecha_hora) AS INTEGER)
+            - (SELECT desfase FROM temp.desfases_horas WHERE hora = substr(fecha_hora, 1, 13))
+        WHERE instante IS NULL AND substr(fecha_hora, 1, 13) IN (SELECT hora FROM temp.desfases_horas)''').rowcount
+    conn.execute("DROP TABLE temp.desfases_horas")
+
+    anterior = None
+    for id_, fecha_hora in conn.execute('''SELECT id, fecha_hora FROM registro_ingresos
+            WHERE instante IS NULL ORDER BY id''').fetchall():
+        desfases = repetidas.get(fecha_hora[:13])
+        if desfases is None:
+            continue  # fecha_hora sin el formato esperado: queda sin instante
+        local = int((datetime.strptime(fecha_hora, FORMATO) - datetime(1970, 1, 1)).total_seconds())
+        candidatos = [local - desfase for desfase in desfases]
+        elegido = next((c for c in candidatos if anterior is None or c >= anterior), candidatos[-1])
+        conn.execute("UPDATE registro_ingresos SET instante = ? WHERE id = ?", (elegido, id_))
+        anterior = elegido
+        completadas += 1
+    return completadas
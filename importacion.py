@@ -0,0 +1,251 @@
+"""Importación masiva de vehículos, personas y guardias desde CSV o Excel.
+
+El archivo se lee fila a fila (csv.reader / openpyxl en modo read_only), cada
+fila se valida igual que en los formularios y las válidas se guardan por
+lotes con ``executemany`` dentro de una transacción. Si un lote falla, se
+reintenta fila por fila para aislar el error sin perder el resto.
+
+Uso desde la línea de comandos:
+    python importacion.py vehiculos edificio_norte.xlsx
+    python importacion.py personas residentes.csv --db /datos/porteria.db
+"""
+
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+import unicodedata
+from datetime import datetime
+
+import db
+import datos
+
+# Filas por transacción
+LOTE = 500
+
+ESTADOS_AUTORIZACION = ("AUTORIZADO", "NO AUTORIZADO", "RESTRINGIDO")
+
+# Nombres alternativos de columnas que aparecen en las planillas
+ALIAS_COLUMNAS = {
+    'departamento': 'depto', 'unidad': 'depto', 'dpto': 'depto',
+    'dueno': 'propietario', 'nombre_propietario': 'propietario',
+    'rut_propietario': 'rut', 'fono': 'telefono', 'celular': 'telefono',
+    'estado': 'estado_autorizacion', 'autorizacion': 'estado_autorizacion',
+    'observacion': 'observaciones', 'obs': 'observaciones',
+    'nombre_completo': 'nombre',
+}
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+class ResultadoImportacion:
+    __slots__ = ('tipo', 'leidas', 'importadas', 'errores')
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.leidas = 0
+        self.importadas = 0
+        self.errores = []  # [(número de fila, mensaje)]
+
+    def __repr__(self):
+        return (f"ResultadoImportacion({self.tipo}: {self.importadas}/{self.leidas} importadas, "
+                f"{len(self.errores)} errores)")
+
+# ==================== LECTURA ====================
+
+def _normalizar_columna(nombre):
+    nombre = unicodedata.normalize('NFKD', str(nombre or "")).encode('ascii', 'ignore').decode()
+    nombre = "_".join(nombre.strip().lower().replace(".", " ").split())
+    return ALIAS_COLUMNAS.get(nombre, nombre)
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # Excel entrega los teléfonos y deptos como 101.0
+    return str(valor).strip()
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    yield from csv.reader(texto, dialecto)
+
+
+def _filas_excel(archivo, hoja=None):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para importar Excel se necesita el paquete openpyxl (pip install openpyxl)")
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        for fila in (libro[hoja] if hoja else libro.active).iter_rows(values_only=True):
+            yield fila
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre_archivo, hoja=None):
+    """Genera (número de fila, dict columna -> texto) sin cargar todo el archivo."""
+    if nombre_archivo.lower().endswith(('.xlsx', '.xlsm')):
+        filas = _filas_excel(archivo, hoja)
+    else:
+        filas = _filas_csv(archivo)
+
+    encabezado = None
+    for numero, fila in enumerate(filas, start=1):
+        valores = [_texto(v) for v in fila]
+        if not any(valores):
+            continue
+        if encabezado is None:
+            encabezado = [_normalizar_columna(v) for v in valores]
+            continue
+        yield numero, dict(zip(encabezado, valores))
+
+# ==================== VALIDACIÓN ====================
+
+def _estado(fila):
+    estado = (fila.get('estado_autorizacion') or "AUTORIZADO").upper()
+    if estado not in ESTADOS_AUTORIZACION:
+        raise FilaInvalida(f"Estado de autorización inválido: {estado}")
+    observaciones = fila.get('observaciones', "")
+    if estado != "AUTORIZADO" and not observaciones:
+        raise FilaInvalida(f"Estado {estado} requiere observaciones")
+    return estado, observaciones
+
+
+def _preparar_vehiculo(fila, fecha_registro):
+    patente = datos.normalizar_patente(fila.get('patente', ""))
+    propietario = fila.get('propietario', "").upper()
+    if not patente or not propietario:
+        raise FilaInvalida("Faltan patente o propietario")
+    if not datos.validar_patente(patente):
+        raise FilaInvalida(f"Patente inválida: {fila.get('patente')}")
+    rut = fila.get('rut', "")
+    if rut:
+        if not datos.validar_rut(rut):
+            raise FilaInvalida(f"RUT inválido: {rut}")
+        rut = datos.rut_canonico(rut)
+    estado, observaciones = _estado(fila)
+    return (patente, propietario, rut, fila.get('depto', ""), fila.get('marca', ""), fila.get('modelo', ""),
+            fila.get('color', ""), fila.get('telefono', ""), fecha_registro, estado, observaciones)
+
+
+def _preparar_persona(fila, fecha_registro):
+    rut = fila.get('rut', "")
+    nombre = fila.get('nombre', "").upper()
+    if not rut or not nombre:
+        raise FilaInvalida("Faltan RUT o nombre")
+    if not datos.validar_rut(rut):
+        raise FilaInvalida(f"RUT inválido: {rut}")
+    estado, observaciones = _estado(fila)
+    return (datos.rut_canonico(rut), *datos.descomponer_rut(rut), nombre, fila.get('depto', ""), fila.get('telefono', ""),
+            fila.get('tipo') or "Residente", fecha_registro, estado, observaciones)
+
+
+def _preparar_guardia(fila, fecha_registro):
+    nombre = fila.get('nombre', "").strip().upper()
+    if not nombre:
+        raise FilaInvalida("Falta el nombre del guardia")
+    return (nombre, fila.get('telefono', ""))
+
+# ==================== ESCRITURA ====================
+
+# Un registro ya existente (misma patente, cuerpo de RUT o nombre) se actualiza y se
+# reactiva; fecha_registro conserva la fecha del alta original.
+TIPOS = {
+    'vehiculos': (_preparar_vehiculo, '''INSERT INTO vehiculos (patente, propietario, rut, depto, marca, modelo, color, telefono, fecha_registro, estado_autorizacion, observaciones)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (patente) DO UPDATE SET propietario = excluded.propietario, rut = excluded.rut,
+            depto = excluded.depto, marca = excluded.marca, modelo = excluded.modelo, color = excluded.color,
+            telefono = excluded.telefono, estado_autorizacion = excluded.estado_autorizacion,
+            observaciones = excluded.observaciones, activo = 1'''),
+    'personas': (_preparar_persona, '''INSERT INTO personas (rut, rut_numero, rut_dv, nombre, depto, telefono, tipo, fecha_registro, estado_autorizacion, observaciones)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (rut_numero) DO UPDATE SET nombre = excluded.nombre, depto = excluded.depto,
+            telefono = excluded.telefono, tipo = excluded.tipo,
+            estado_autorizacion = excluded.estado_autorizacion, observaciones = excluded.observaciones, activo = 1'''),
+    'guardias': (_preparar_guardia, '''INSERT INTO guardias (nombre, telefono) VALUES (?, ?)
+        ON CONFLICT (nombre) DO UPDATE SET telefono = excluded.telefono, activo = 1'''),
+}
+
+
+def _guardar_lote(sql, lote, resultado):
+    try:
+        with db.transaccion() as conn:
+            conn.executemany(sql, [valores for _, valores in lote])
+        resultado.importadas += len(lote)
+        return
+    except sqlite3.Error:
+        pass
+    # Algo del lote falló: se guarda fila por fila para reportar cuál
+    for numero, valores in lote:
+        try:
+            with db.transaccion() as conn:
+                conn.execute(sql, valores)
+            resultado.importadas += 1
+        except sqlite3.Error as e:
+            resultado.errores.append((numero, f"Error de base de datos: {e}"))
+
+
+def importar(tipo, archivo, nombre_archivo, hoja=None, lote=LOTE):
+    """Importa `archivo` (binario) como `tipo` y retorna un ResultadoImportacion."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de importación desconocido: {tipo}")
+    preparar, sql = TIPOS[tipo]
+    datos.init_db()
+
+    resultado = ResultadoImportacion(tipo)
+    fecha_registro = datetime.now(datos.CHILE_TZ).strftime('%Y-%m-%d %H:%M:%S')
+    pendientes = []
+    try:
+        for numero, fila in leer_filas(archivo, nombre_archivo, hoja):
+            resultado.leidas += 1
+            try:
+                pendientes.append((numero, preparar(fila, fecha_registro)))
+            except FilaInvalida as e:
+                resultado.errores.append((numero, str(e)))
+                continue
+            if len(pendientes) >= lote:
+                _guardar_lote(sql, pendientes, resultado)
+                pendientes = []
+        if pendientes:
+            _guardar_lote(sql, pendientes, resultado)
+    finally:
+        if resultado.importadas:
+            datos.invalidar_cache(tipo)
+    return resultado
+
+# ==================== LÍNEA DE COMANDOS ====================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa vehículos, personas o guardias desde CSV o Excel.")
+    parser.add_argument('tipo', choices=sorted(TIPOS))
+    parser.add_argument('archivo', help="archivo .csv o .xlsx")
+    parser.add_argument('--hoja', help="hoja del Excel (por defecto la activa)")
+    parser.add_argument('--db', help="ruta de la base de datos (por defecto CONTROL_ACCESO_DB)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.configurar(args.db)
+    with open(args.archivo, 'rb') as archivo:
+        resultado = importar(args.tipo, archivo, os.path.basename(args.archivo), args.hoja)
+
+    print(f"{resultado.importadas} de {resultado.leidas} filas importadas en {args.tipo}")
+    for numero, mensaje in resultado.errores:
+        print(f"  fila {numero}: {mensaje}", file=sys.stderr)
+    return 1 if resultado.errores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Latencias del camino caliente en memoria.
+
+Cada métrica guarda sus últimas ``MUESTRAS`` mediciones en un buffer
+circular (deque con maxlen), así que la memoria queda acotada aunque el
+proceso corra semanas. ``resumen()`` calcula p50/p95/p99 sobre esas
+muestras y ``exportar_json()`` las entrega completas para análisis.
+
+Medir cuesta una llamada a perf_counter y un append bajo candado (~1 µs).
+Las sentencias SQL se cuentan por hilo con el trace callback de las
+conexiones; como Streamlit corre cada rerun en el hilo de su sesión, el
+contador de un rerun no se mezcla con el de otras sesiones.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+MUESTRAS = int(os.environ.get('CONTROL_ACCESO_METRICAS_MUESTRAS', '1000'))
+
+_lock = threading.Lock()
+_metricas = {}       # nombre -> [unidad, total de mediciones, deque de valores]
+_hilo = threading.local()
+_inicio = datetime.now()
+
+
+def registrar(nombre, valor, unidad='ms'):
+    with _lock:
+        metrica = _metricas.get(nombre)
+        if metrica is None:
+            metrica = _metricas[nombre] = [unidad, 0, deque(maxlen=MUESTRAS)]
+        metrica[1] += 1
+        metrica[2].append(valor)
+
+
+@contextmanager
+def medir(nombre):
+    """Registra en `nombre` los milisegundos que tarda el bloque."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nombre, (time.perf_counter() - inicio) * 1000)
+
+
+def cronometrar(funcion, nombre=None):
+    """Envuelve `funcion` para registrar su duración con el nombre dado (o el suyo)."""
+    nombre = nombre or funcion.__name__
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            registrar(nombre, (time.perf_counter() - inicio) * 1000)
+    return envoltura
+
+# ==================== SENTENCIAS POR RERUN ====================
+
+def contar_sentencia(sql):
+    """Trace callback de sqlite3; las líneas '-- TRIGGER' no son sentencias nuevas."""
+    if not sql.startswith('--'):
+        _hilo.sentencias = getattr(_hilo, 'sentencias', 0) + 1
+
+
+def iniciar_rerun():
+    _hilo.sentencias = 0
+    _hilo.inicio_rerun = time.perf_counter()
+
+
+def registrar_desde_rerun(nombre):
+    """Registra el tiempo transcurrido desde que empezó el rerun en curso."""
+    inicio = getattr(_hilo, 'inicio_rerun', None)
+    if inicio is not None:
+        registrar(nombre, (time.perf_counter() - inicio) * 1000)
+
+
+def terminar_rerun():
+    inicio = getattr(_hilo, 'inicio_rerun', None)
+    if inicio is None:
+        return
+    registrar('rerun', (time.perf_counter() - inicio) * 1000)
+    registrar('rerun:sentencias_sql', getattr(_hilo, 'sentencias', 0), unidad='sentencias')
+    _hilo.inicio_rerun = None
+
+# ==================== RESUMEN ====================
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def resumen():
+    """{nombre: {unidad, total, muestras, p50, p95, p99, max}} sobre el buffer de cada métrica."""
+    with _lock:
+        copia = {nombre: (unidad, total, sorted(valores)) for nombre, (unidad, total, valores) in _metricas.items()}
+    return {
+        nombre: {
+            'unidad': unidad, 'total': total, 'muestras': len(valores),
+            'p50': _percentil(valores, 50), 'p95': _percentil(valores, 95),
+            'p99': _percentil(valores, 99), 'max': valores[-1],
+        }
+        for nombre, (unidad, total, valores) in sorted(copia.items()) if valores
+    }
+
+
+def exportar_json():
+    """Resumen y muestras crudas, como texto JSON."""
+    with _lock:
+        muestras = {nombre: list(valores) for nombre, (_, _, valores) in _metricas.items()}
+    return json.dumps({
+        'desde': _inicio.isoformat(timespec='seconds'),
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'resumen': resumen(),
+        'muestras': muestras,
+    }, indent=2)
+
+
+def reiniciar():
+    with _lock:
+        _metricas.clear()
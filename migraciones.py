@@ -0,0 +1,301 @@
+"""Esquema de la base de datos y migraciones numeradas.
+
+La versión aplicada se guarda en ``PRAGMA user_version``. ``migrar()`` se
+ejecuta una sola vez por proceso y por archivo de base de datos: las
+siguientes llamadas (una por cada rerun de Streamlit) solo consultan un
+conjunto en memoria.
+
+Para cambiar el esquema se agrega una función al final de MIGRACIONES; nunca
+se modifica ni se reordena una migración ya publicada.
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+import archivado
+import db
+import horario
+import validacion
+
+# Lista de guardias iniciales
+GUARDIAS_INICIALES = [
+    "BECERRA VALDIVIA MARTHA CECILIA", "BRIZUELA MATURANA CAROLINA MAGDALENA",
+    "CARO CATILLO CAROLINA ALEJANDRA", "CASTILLO ARAYA CAMILA JAVIERA",
+    "CEBALLOS VELASQUEZ FRANCESCA PILAR", "DE LA CRUZ NUÑEZ CAROLINE",
+    "FERREIRA VARGAS LAUDENI", "LOPEZ ALCOCER MARIA NEIDY",
+    "LOPEZ LADINO LINA MARCELA", "PEREZ LOPEZ LAURA",
+    "RAMIREZ MORALES RODRIGO ALEJANDRO", "SALINAS MORA ALEJANDRA JAVIERA",
+    "BRIZUELA VERONICA", "OLAVE CATALINA"
+]
+
+_lock = threading.Lock()
+_migradas = set()  # rutas absolutas ya migradas en este proceso
+
+
+def _agregar_columna(conn, tabla, columna, definicion):
+    """ALTER TABLE ADD COLUMN solo si la columna no existe.
+
+    Las bases creadas antes de numerar las migraciones están en la versión 0
+    pero pueden tener ya algunas columnas.
+    """
+    columnas = {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+    if columna not in columnas:
+        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+def _crear_indice_fts(conn, tabla, columnas):
+    """Tabla FTS5 de contenido externo sobre `tabla`, sincronizada por triggers."""
+    fts = f"{tabla}_fts"
+    lista = ', '.join(columnas)
+    nuevos = ', '.join(f"new.{c}" for c in columnas)
+    viejos = ', '.join(f"old.{c}" for c in columnas)
+    conn.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+        {lista}, content='{tabla}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN
+        INSERT INTO {fts} (rowid, {lista}) VALUES (new.id, {nuevos});
+    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos});
+    END""")
+    # Solo cambios en columnas indexadas; activar/desactivar no reindexa
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabla} BEGIN
+        INSERT INTO {fts} ({fts}, rowid, {lista}) VALUES ('delete', old.id, {viejos});
+        INSERT INTO {fts} (rowid, {lista}) VALUES (new.id, {nuevos});
+    END""")
+    conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+# ==================== MIGRACIONES ====================
+
+def _m001_tablas_base(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS vehiculos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, patente TEXT UNIQUE NOT NULL,
+        propietario TEXT NOT NULL, rut TEXT, depto TEXT, marca TEXT, modelo TEXT, color TEXT,
+        telefono TEXT, fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        activo INTEGER DEFAULT 1, observaciones TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS personas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, rut TEXT UNIQUE NOT NULL,
+        nombre TEXT NOT NULL, depto TEXT, telefono TEXT, tipo TEXT,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        activo INTEGER DEFAULT 1, observaciones TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS guardias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT UNIQUE NOT NULL,
+        telefono TEXT, activo INTEGER DEFAULT 1)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS registro_ingresos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, tipo_registro TEXT NOT NULL,
+        identificador TEXT NOT NULL, nombre_persona TEXT, depto TEXT,
+        fecha_hora TEXT NOT NULL, guardia TEXT NOT NULL, turno TEXT NOT NULL,
+        tipo_ingreso TEXT, observaciones TEXT)''')
+
+def _m002_rut_vehiculos(conn):
+    _agregar_columna(conn, 'vehiculos', 'rut', 'TEXT')
+
+def _m003_estado_autorizacion_vehiculos(conn):
+    _agregar_columna(conn, 'vehiculos', 'estado_autorizacion', "TEXT DEFAULT 'AUTORIZADO'")
+
+def _m004_estado_autorizacion_personas(conn):
+    _agregar_columna(conn, 'personas', 'estado_autorizacion', "TEXT DEFAULT 'AUTORIZADO'")
+
+def _m005_guardias_iniciales(conn):
+    conn.executemany('INSERT OR IGNORE INTO guardias (nombre, telefono) VALUES (?, ?)',
+                     [(nombre, "") for nombre in GUARDIAS_INICIALES])
+
+def _m006_indices_registro_ingresos(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_fecha ON registro_ingresos (fecha_hora)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_tipo_fecha ON registro_ingresos (tipo_registro, fecha_hora)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_identificador ON registro_ingresos (identificador)")
+
+def _m007_indices_listados(conn):
+    # Orden de los listados de administración (LIMIT sin ordenar toda la tabla)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vehiculos_activo_fecha ON vehiculos (activo, fecha_registro)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_personas_activo_nombre ON personas (activo, nombre)")
+    # Filtros por prefijo: LIKE 'texto%' solo usa índices con COLLATE NOCASE
+    for tabla, columna in (('vehiculos', 'patente'), ('vehiculos', 'propietario'), ('vehiculos', 'depto'),
+                           ('personas', 'rut'), ('personas', 'nombre'), ('personas', 'depto')):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_{columna}_nocase ON {tabla} ({columna} COLLATE NOCASE)")
+
+def _m008_busqueda_texto(conn):
+    _crear_indice_fts(conn, 'vehiculos', ('patente', 'propietario', 'rut', 'depto', 'marca', 'modelo',
+                                          'color', 'observaciones'))
+    _crear_indice_fts(conn, 'personas', ('rut', 'nombre', 'depto', 'tipo', 'observaciones'))
+
+def _m009_estadisticas_ingresos(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS estadisticas_ingresos (
+        fecha TEXT NOT NULL, turno TEXT NOT NULL, tipo_registro TEXT NOT NULL,
+        tipo_ingreso TEXT NOT NULL, guardia TEXT NOT NULL, cantidad INTEGER NOT NULL,
+        PRIMARY KEY (fecha, turno, tipo_registro, tipo_ingreso, guardia)) WITHOUT ROWID''')
+    conn.execute('''INSERT OR REPLACE INTO estadisticas_ingresos (fecha, turno, tipo_registro, tipo_ingreso, guardia, cantidad)
+        SELECT substr(fecha_hora, 1, 10), turno, tipo_registro, COALESCE(tipo_ingreso, ''), guardia, COUNT(*)
+        FROM registro_ingresos GROUP BY 1, 2, 3, 4, 5''')
+
+def _m010_cola_ingresos(conn):
+    # Última secuencia de cada diario de cola_ingresos.py ya escrita en registro_ingresos
+    conn.execute('''CREATE TABLE IF NOT EXISTS cola_ingresos (
+        diario TEXT PRIMARY KEY, secuencia INTEGER NOT NULL) WITHOUT ROWID''')
+
+def _m011_claves_canonicas(conn):
+    # RUT de personas como cuerpo entero + dígito verificador (índice único
+    # sobre el entero) y patentes sin guiones ni espacios. Si varias filas
+    # comparten la clave, la recibe la activa (o la más antigua); las demás y
+    # los RUT que no se pueden descomponer quedan sin clave, se listan al
+    # migrar y con python validacion.py.
+    claves, canonicas, avisos = set(), [], []
+    for id_, rut in conn.execute("SELECT id, rut FROM personas ORDER BY activo DESC, id"):
+        partes = validacion.descomponer_rut(rut)
+        if partes is None:
+            avisos.append(f"persona {id_}: RUT {rut!r} inválido, sin rut_numero")
+            continue
+        if partes[0] in claves:
+            avisos.append(f"persona {id_}: RUT {rut!r} duplicado, sin rut_numero")
+            continue
+        claves.add(partes[0])
+        canonicas.append((validacion.rut_canonico(rut), *partes, id_))
+    # Se reconstruye personas para quitar el UNIQUE del texto: la única
+    # restricción de unicidad queda en rut_numero (un índice en vez de dos)
+    columnas = ('id, rut, nombre, depto, telefono, tipo, fecha_registro, activo, observaciones, '
+                'estado_autorizacion')
+    conn.execute('''CREATE TABLE personas_nueva (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, rut TEXT NOT NULL,
+        nombre TEXT NOT NULL, depto TEXT, telefono TEXT, tipo TEXT,
+        fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        activo INTEGER DEFAULT 1, observaciones TEXT,
+        estado_autorizacion TEXT DEFAULT 'AUTORIZADO', rut_numero INTEGER, rut_dv TEXT)''')
+    conn.execute(f"INSERT INTO personas_nueva ({columnas}) SELECT {columnas} FROM personas")
+    conn.executemany("UPDATE personas_nueva SET rut = ?, rut_numero = ?, rut_dv = ? WHERE id = ?", canonicas)
+    secuencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'personas'").fetchone()
+    # DROP TABLE se lleva los índices y los disparadores de personas_fts
+    conn.execute("DROP TABLE personas")
+    conn.execute("ALTER TABLE personas_nueva RENAME TO personas")
+    if secuencia:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'personas'", secuencia)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_personas_rut_numero ON personas (rut_numero)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_personas_activo_nombre ON personas (activo, nombre)")
+    for columna in ('rut', 'nombre', 'depto'):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_personas_{columna}_nocase ON personas ({columna} COLLATE NOCASE)")
+    _crear_indice_fts(conn, 'personas', ('rut', 'nombre', 'depto', 'tipo', 'observaciones'))
+
+    claves, patentes, apartadas, ruts = set(), [], [], []
+    filas = conn.execute("SELECT id, patente, rut FROM vehiculos ORDER BY activo DESC, id").fetchall()
+    for id_, patente, rut in filas:
+        clave = validacion.normalizar_patente(patente)
+        if clave not in claves:
+            claves.add(clave)
+            if clave != patente:
+                patentes.append((clave, id_))
+        elif patente == clave:
+            # El duplicado ocupa el texto canónico: se aparta para que lo reciba la fila que lo conserva
+            apartada = f"{patente} DUPLICADA {id_}"
+            apartadas.append((apartada, id_))
+            avisos.append(f"vehículo {id_}: patente {patente!r} duplicada, renombrada {apartada!r}")
+        else:
+            avisos.append(f"vehículo {id_}: patente {patente!r} duplicada, sin normalizar")
+        if rut and validacion.descomponer_rut(rut):
+            ruts.append((validacion.rut_canonico(rut), id_))
+    conn.executemany("UPDATE vehiculos SET patente = ? WHERE id = ?", apartadas)
+    conn.executemany("UPDATE vehiculos SET patente = ? WHERE id = ?", patentes)
+    conn.executemany("UPDATE vehiculos SET rut = ? WHERE id = ?", ruts)
+    if avisos:
+        print(f"migración 11: {len(avisos)} RUT o patente(s) quedaron sin clave canónica; corregirlos o darlos "
+              f"de baja (python validacion.py los lista):", file=sys.stderr)
+        for aviso in avisos:
+            print(f"  {aviso}", file=sys.stderr)
+
+def _m012_instante_ingresos(conn):
+    # Segundos UTC desde 1970; fecha_hora queda como texto en hora de Chile
+    # para mostrar y agrupar por día. Los filtros por fecha usan el entero.
+    _agregar_columna(conn, 'registro_ingresos', 'instante', 'INTEGER')
+    horario.completar_instantes(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_registro_instante ON registro_ingresos (instante)")
+    # Ninguna consulta filtra ya por fecha_hora: estos índices solo encarecían cada INSERT
+    conn.execute("DROP INDEX IF EXISTS idx_registro_fecha")
+    conn.execute("DROP INDEX IF EXISTS idx_registro_tipo_fecha")
+    # Los meses ya archivados se consultan con la misma sentencia. Repetir
+    # esto sobre un archivo ya actualizado no cambia nada.
+    for mes in archivado.meses_archivados():
+        archivo = sqlite3.connect(archivado.ruta_mes(mes))
+        try:
+            with archivo:
+                _agregar_columna(archivo, 'registro_ingresos', 'instante', 'INTEGER')
+                horario.completar_instantes(archivo)
+                archivo.execute("CREATE INDEX IF NOT EXISTS idx_registro_instante ON registro_ingresos (instante)")
+                archivo.execute("DROP INDEX IF EXISTS idx_registro_fecha")
+        finally:
+            archivo.close()
+
+def _m013_presentes_y_salidas(conn):
+    # Visitas abiertas (ver ocupacion.py) y el registro de salidas. presentes
+    # empieza vacía: los ingresos anteriores no tienen salida registrada.
+    conn.execute('''CREATE TABLE IF NOT EXISTS presentes (
+        tipo_registro TEXT NOT NULL, identificador TEXT NOT NULL, nombre_persona TEXT, depto TEXT,
+        fecha_hora TEXT NOT NULL, instante INTEGER NOT NULL, guardia TEXT NOT NULL,
+        PRIMARY KEY (tipo_registro, identificador)) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS registro_salidas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, tipo_registro TEXT NOT NULL, identificador TEXT NOT NULL,
+        nombre_persona TEXT, depto TEXT, fecha_hora TEXT NOT NULL, instante INTEGER NOT NULL,
+        guardia TEXT NOT NULL, instante_ingreso INTEGER)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_salidas_instante ON registro_salidas (instante)")
+
+def _m014_ingresos_rechazados(conn):
+    # Ingresos de la cola que la base no aceptó (ver cola_ingresos.py). La
+    # fila se guarda como JSON porque puede no cumplir el esquema de
+    # registro_ingresos.
+    conn.execute('''CREATE TABLE IF NOT EXISTS ingresos_rechazados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, diario TEXT NOT NULL, secuencia INTEGER NOT NULL,
+        fila TEXT NOT NULL, error TEXT NOT NULL, instante INTEGER NOT NULL)''')
+
+# La versión de cada migración es su posición en la lista (1, 2, ...)
+MIGRACIONES = [
+    _m001_tablas_base,
+    _m002_rut_vehiculos,
+    _m003_estado_autorizacion_vehiculos,
+    _m004_estado_autorizacion_personas,
+    _m005_guardias_iniciales,
+    _m006_indices_registro_ingresos,
+    _m007_indices_listados,
+    _m008_busqueda_texto,
+    _m009_estadisticas_ingresos,
+    _m010_cola_ingresos,
+    _m011_claves_canonicas,
+    _m012_instante_ingresos,
+    _m013_presentes_y_salidas,
+    _m014_ingresos_rechazados,
+]
+
+VERSION_ACTUAL = len(MIGRACIONES)
+
+# ==================== EJECUCIÓN ====================
+
+def version_esquema():
+    return db.conexion().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar():
+    """Aplica las migraciones pendientes; retorna las versiones aplicadas.
+
+    Cada migración corre en su propia transacción junto con el cambio de
+    user_version, así que un fallo deja la base en la última versión completa.
+    """
+    ruta = os.path.abspath(db.obtener_ruta())
+    if ruta in _migradas:
+        return []
+
+    with _lock:
+        if ruta in _migradas:
+            return []
+        aplicadas = []
+        for version, migracion in enumerate(MIGRACIONES, start=1):
+            if version <= version_esquema():
+                continue
+            with db.transaccion() as conn:
+                # Otro proceso pudo aplicarla mientras esperábamos el candado
+                if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                    continue
+                migracion(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            aplicadas.append(version)
+        _migradas.add(ruta)
+    return aplicadas
@@ -0,0 +1,77 @@
+"""Registros livianos para consultas de una fila.
+
+Las búsquedas de portería devuelven estos objetos en vez de un DataFrame de
+pandas: usan ``__slots__`` (sin ``__dict__`` por instancia) y se construyen
+directamente desde la tupla del cursor. Los DataFrames quedan para las
+vistas de tabla y las exportaciones.
+"""
+
+
+class _Registro:
+    __slots__ = ()
+
+    # Columnas en el orden del SELECT; cada subclase las repite en __slots__
+    COLUMNAS = ()
+
+    def __init__(self, *valores, **campos):
+        for nombre, valor in zip(self.COLUMNAS, valores):
+            setattr(self, nombre, valor)
+        for nombre in self.COLUMNAS[len(valores):]:
+            setattr(self, nombre, campos.pop(nombre, None))
+        if campos:
+            raise TypeError(f"{type(self).__name__}: campos desconocidos {sorted(campos)}")
+
+    @classmethod
+    def desde_fila(cls, fila):
+        return cls(*fila)
+
+    @classmethod
+    def select(cls):
+        return ', '.join(cls.COLUMNAS)
+
+    def como_dict(self):
+        return {nombre: getattr(self, nombre) for nombre in self.COLUMNAS}
+
+    def __eq__(self, otro):
+        return type(self) is type(otro) and all(
+            getattr(self, nombre) == getattr(otro, nombre) for nombre in self.COLUMNAS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        campos = ', '.join(f"{nombre}={getattr(self, nombre)!r}" for nombre in self.COLUMNAS)
+        return f"{type(self).__name__}({campos})"
+
+
+class Vehiculo(_Registro):
+    COLUMNAS = ('id', 'patente', 'propietario', 'rut', 'depto', 'marca', 'modelo', 'color',
+                'telefono', 'estado_autorizacion', 'observaciones', 'activo')
+    __slots__ = COLUMNAS
+
+
+class Persona(_Registro):
+    COLUMNAS = ('id', 'rut', 'nombre', 'depto', 'telefono', 'tipo',
+                'estado_autorizacion', 'observaciones', 'activo')
+    __slots__ = COLUMNAS
+
+
+class Guardia(_Registro):
+    COLUMNAS = ('id', 'nombre', 'telefono', 'activo')
+    __slots__ = COLUMNAS
+
+
+class Ingreso(_Registro):
+    COLUMNAS = ('id', 'tipo_registro', 'identificador', 'nombre_persona', 'depto', 'fecha_hora',
+                'guardia', 'turno', 'tipo_ingreso', 'observaciones', 'instante')
+    __slots__ = COLUMNAS
+
+
+class Visita(_Registro):
+    COLUMNAS = ('tipo_registro', 'identificador', 'nombre_persona', 'depto', 'fecha_hora', 'instante', 'guardia')
+    __slots__ = COLUMNAS
+
+
+class Salida(_Registro):
+    COLUMNAS = ('id', 'tipo_registro', 'identificador', 'nombre_persona', 'depto', 'fecha_hora', 'instante',
+                'guardia', 'instante_ingreso')
+    __slots__ = COLUMNAS
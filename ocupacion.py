@@ -0,0 +1,60 @@
+"""Quién está dentro: visitas abiertas, mantenidas con cada ingreso y salida.
+
+``presentes`` tiene una fila por vehículo o persona que entró y todavía no
+registró su salida, con clave (tipo_registro, identificador canónico).
+``registrar_ingreso`` la agrega (o la renueva, si ya estaba dentro) en la
+misma transacción del INSERT y ``registrar_salida`` la borra al anotar la
+salida en ``registro_salidas``. Cada evento toca una sola fila por su clave
+primaria, y la ocupación y la lista de visitas abiertas se leen de esta
+tabla, que crece con la gente que está dentro y no con el registro.
+
+La tabla empieza vacía con la migración 13: los ingresos anteriores no
+tienen salida y no se cuentan como dentro.
+"""
+
+import validacion
+from modelos import Salida, Visita
+
+_SQL_ENTRAR = '''INSERT INTO presentes (tipo_registro, identificador, nombre_persona, depto, fecha_hora, instante, guardia)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (tipo_registro, identificador) DO UPDATE SET
+        nombre_persona = excluded.nombre_persona, depto = excluded.depto, fecha_hora = excluded.fecha_hora,
+        instante = excluded.instante, guardia = excluded.guardia'''
+
+
+def clave(tipo_registro, identificador):
+    """Identificador como se guarda en presentes: patente normalizada o RUT canónico."""
+    if tipo_registro == "VEHICULO":
+        return validacion.normalizar_patente(identificador)
+    return validacion.rut_canonico(identificador)
+
+
+def entrar(conn, tipo_registro, identificador, nombre_persona, depto, fecha_hora, instante, guardia):
+    """Abre la visita; se llama dentro de la transacción que inserta el ingreso."""
+    conn.execute(_SQL_ENTRAR, (tipo_registro, clave(tipo_registro, identificador), nombre_persona, depto,
+                               fecha_hora, instante, guardia))
+
+
+def salir(conn, tipo_registro, identificador, fecha_hora, instante, guardia):
+    """Cierra la visita abierta y anota la salida; retorna la Salida, o None si no estaba dentro."""
+    identificador = clave(tipo_registro, identificador)
+    fila = conn.execute('''SELECT nombre_persona, depto, instante FROM presentes
+                           WHERE tipo_registro = ? AND identificador = ?''', (tipo_registro, identificador)).fetchone()
+    if fila is None:
+        return None
+    nombre_persona, depto, instante_ingreso = fila
+    conn.execute("DELETE FROM presentes WHERE tipo_registro = ? AND identificador = ?", (tipo_registro, identificador))
+    cursor = conn.execute('''INSERT INTO registro_salidas (tipo_registro, identificador, nombre_persona, depto,
+                                                           fecha_hora, instante, guardia, instante_ingreso)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                          (tipo_registro, identificador, nombre_persona, depto, fecha_hora, instante, guardia,
+                           instante_ingreso))
+    return Salida(cursor.lastrowid, tipo_registro, identificador, nombre_persona, depto, fecha_hora, instante,
+                  guardia, instante_ingreso)
+
+
+def presentes(conn):
+    """[Visita] de quienes están dentro, de la entrada más antigua a la más reciente."""
+    cursor = conn.execute(f"SELECT {Visita.select()} FROM presentes ORDER BY instante")
+    return [Visita.desde_fila(fila) for fila in cursor]
+
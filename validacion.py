@@ -0,0 +1,219 @@
+"""Validación y normalización de RUT y patentes.
+
+Las funciones por valor (validar_rut, validar_patente, ...) son las que usan
+los formularios, la API y la importación; datos.py las reexporta. Las
+variantes en plural reciben una columna completa (Series de pandas o
+cualquier iterable) y validan o normalizan todos los valores de una vez,
+con operaciones de texto de pandas y aritmética de NumPy en lugar de un
+ciclo de Python por fila: sirven para importaciones grandes y auditorías.
+
+Auditoría de la base (RUT y patentes inválidos o duplicados guardados):
+    python validacion.py --db /datos/porteria.db
+"""
+
+import argparse
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Patente nueva (BCDF12) o antigua (AB1234), ya sin guiones ni espacios
+PATRON_PATENTE = re.compile(r'[A-Z]{4}[0-9]{2}|[A-Z]{2}[0-9]{4}')
+
+# Factores del módulo 11, desde el dígito de las unidades hacia la izquierda
+_FACTORES = (2, 3, 4, 5, 6, 7)
+# Largo máximo del cuerpo del RUT: con 18 dígitos cabe en un int64
+_MAX_DIGITOS = 18
+_CICLO_FACTORES = _FACTORES * (_MAX_DIGITOS // len(_FACTORES))     # un factor por dígito
+# Dígito verificador según 11 - (suma % 11), que va de 1 a 11
+_DV = ('', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'K', '0')
+_DV_ARREGLO = np.array(_DV)
+
+_SIN_SEPARADORES_PATENTE = str.maketrans('', '', '- ')
+_SIN_SEPARADORES_RUT = str.maketrans('', '', '.- ')
+
+# ==================== POR VALOR ====================
+
+def normalizar_patente(patente):
+    """Patente sin guiones ni espacios, en mayúsculas: clave de búsqueda."""
+    return patente.translate(_SIN_SEPARADORES_PATENTE).upper()
+
+
+def validar_patente(patente):
+    return PATRON_PATENTE.fullmatch(normalizar_patente(patente)) is not None
+
+
+def normalizar_rut(rut):
+    """RUT sin puntos, guion ni espacios, en mayúsculas: clave de búsqueda."""
+    return rut.translate(_SIN_SEPARADORES_RUT).upper()
+
+
+def digito_verificador(numero):
+    """Dígito verificador (módulo 11) del cuerpo del RUT, como '0'-'9' o 'K'.
+
+    `numero` es un entero o un texto de dígitos ASCII.
+    """
+    suma = 0
+    for digito, factor in zip(reversed(str(numero)), _CICLO_FACTORES):
+        suma += (ord(digito) - 48) * factor
+    return _DV[11 - suma % 11]
+
+
+def descomponer_rut(rut):
+    """(cuerpo entero, dígito verificador) del RUT en cualquier formato, o None.
+
+    '12.345.678-5' -> (12345678, '5'). Solo revisa la forma (dígitos y un
+    verificador 0-9 o K), no que el verificador sea el correcto.
+    """
+    rut = normalizar_rut(rut)
+    cuerpo, dv = rut[:-1], rut[-1:]
+    if not (cuerpo.isascii() and cuerpo.isdigit()) or len(cuerpo) > _MAX_DIGITOS or dv not in _DV:
+        return None
+    return int(cuerpo), dv
+
+
+def rut_canonico(rut):
+    """RUT como se guarda en la base: sin puntos ni ceros a la izquierda, con guion ('12345678-5')."""
+    partes = descomponer_rut(rut)
+    return f"{partes[0]}-{partes[1]}" if partes else normalizar_rut(rut)
+
+
+def validar_rut(rut):
+    """Valida formato RUT chileno con dígito verificador"""
+    rut = rut.replace(".", "").replace("-", "").upper()
+    if len(rut) < 2:
+        return False
+    cuerpo, dv = rut[:-1], rut[-1]
+    if not (cuerpo.isascii() and cuerpo.isdigit()) or len(cuerpo) > _MAX_DIGITOS:
+        return False
+    return dv == digito_verificador(cuerpo)
+
+
+def formatear_rut(rut):
+    rut = rut.replace(".", "").replace("-", "").upper()
+    if len(rut) < 2:
+        return rut
+    rut_num, dv = rut[:-1], rut[-1]
+    rut_formateado = ""
+    for i, digito in enumerate(reversed(rut_num)):
+        if i > 0 and i % 3 == 0:
+            rut_formateado = "." + rut_formateado
+        rut_formateado = digito + rut_formateado
+    return f"{rut_formateado}-{dv}"
+
+# ==================== POR COLUMNA ====================
+
+def _texto(valores):
+    """Series de texto; los valores faltantes quedan como cadena vacía."""
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(list(valores), dtype=object)
+    return serie.fillna("").astype(str)
+
+
+def normalizar_patentes(valores):
+    return _texto(valores).str.replace('-', '', regex=False).str.replace(' ', '', regex=False).str.upper()
+
+
+def validar_patentes(valores):
+    """Series booleana: True donde la patente es válida."""
+    return normalizar_patentes(valores).str.fullmatch(PATRON_PATENTE.pattern).astype(bool)
+
+
+def normalizar_ruts(valores):
+    texto = _texto(valores)
+    for separador in ('.', '-', ' '):
+        texto = texto.str.replace(separador, '', regex=False)
+    return texto.str.upper()
+
+
+def digitos_verificadores(numeros):
+    """Dígitos verificadores (ndarray de str) de un arreglo de cuerpos de RUT enteros."""
+    restantes = np.asarray(numeros, dtype=np.int64).copy()
+    suma = np.zeros(len(restantes), dtype=np.int64)
+    i = 0
+    while restantes.any():
+        suma += restantes % 10 * _FACTORES[i % 6]
+        restantes //= 10
+        i += 1
+    return _DV_ARREGLO[11 - suma % 11]
+
+
+def validar_ruts(valores):
+    """Series booleana: True donde el RUT tiene formato y dígito verificador correctos.
+
+    Acepta los mismos formatos que validar_rut (con o sin puntos y guion).
+    """
+    serie = _texto(valores)
+    rut = serie.str.replace('.', '', regex=False).str.replace('-', '', regex=False).str.upper()
+    # Hasta _MAX_DIGITOS: el cuerpo cabe en un int64
+    formato = rut.str.fullmatch(f'[0-9]{{1,{_MAX_DIGITOS}}}[0-9K]').astype(bool).to_numpy()
+    validos = np.zeros(len(rut), dtype=bool)
+    if formato.any():
+        con_formato = rut[formato]
+        cuerpos = con_formato.str.slice(0, -1).astype(np.int64).to_numpy()
+        validos[formato] = digitos_verificadores(cuerpos) == con_formato.str.slice(-1).to_numpy(dtype=object)
+    return pd.Series(validos, index=serie.index)
+
+# ==================== AUDITORÍA ====================
+# db y migraciones se importan acá y no al inicio: migraciones usa este
+# módulo, y las funciones de validación no necesitan la base.
+
+def auditar():
+    """{(tabla, columna): DataFrame de filas con RUT o patente inválidos} en la base actual."""
+    import db
+    conn = db.conexion()
+    revisiones = (('personas', 'rut', validar_ruts), ('vehiculos', 'rut', validar_ruts),
+                  ('vehiculos', 'patente', validar_patentes))
+    hallazgos = {}
+    for tabla, columna, validar in revisiones:
+        filas = pd.read_sql_query(f"SELECT id, {columna}, activo FROM {tabla} WHERE {columna} <> ''", conn)
+        hallazgos[(tabla, columna)] = filas[~validar(filas[columna]).to_numpy()]
+    return hallazgos
+
+
+def duplicados():
+    """{(tabla, columna): DataFrame de filas cuya clave canónica se repite en otra fila}.
+
+    La clave es el cuerpo del RUT (sin ceros a la izquierda) o la patente
+    normalizada. La migración 11 deja la clave canónica en una fila de cada
+    grupo (la activa o, entre iguales, la más antigua); las demás hay que
+    corregirlas o darlas de baja a mano.
+    """
+    import db
+    conn = db.conexion()
+    personas = pd.read_sql_query("SELECT id, rut, activo FROM personas", conn)
+    ruts = normalizar_ruts(personas['rut'])
+    formato = ruts.str.fullmatch(f'[0-9]{{1,{_MAX_DIGITOS}}}[0-9K]').astype(bool)
+    personas['clave'] = ruts.str.slice(0, -1).str.lstrip('0').where(formato)
+    vehiculos = pd.read_sql_query("SELECT id, patente, activo FROM vehiculos", conn)
+    vehiculos['clave'] = normalizar_patentes(vehiculos['patente'])
+    hallazgos = {}
+    for tabla, columna, filas in (('personas', 'rut', personas), ('vehiculos', 'patente', vehiculos)):
+        repetidas = filas['clave'].notna() & filas['clave'].duplicated(keep=False)
+        hallazgos[(tabla, columna)] = filas[repetidas].sort_values(['clave', 'id'])
+    return hallazgos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Busca RUT y patentes inválidos o duplicados guardados en la base.")
+    parser.add_argument('--mostrar', type=int, default=20, help="filas a listar por columna")
+    parser.add_argument('--db', help="ruta de la base de datos (por defecto CONTROL_ACCESO_DB)")
+    args = parser.parse_args(argv)
+
+    import db
+    import migraciones
+    if args.db:
+        db.configurar(args.db)
+    migraciones.migrar()
+    hallazgos = 0
+    for tipo, revision in (("inválido(s)", auditar()), ("duplicado(s)", duplicados())):
+        for (tabla, columna), filas in revision.items():
+            hallazgos += len(filas)
+            print(f"{tabla}.{columna}: {len(filas)} {tipo}")
+            for fila in filas.head(args.mostrar).itertuples(index=False):
+                print(f"  id {fila.id}: {getattr(fila, columna)!r}{'' if fila.activo else ' (inactivo)'}")
+    return 1 if hallazgos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())